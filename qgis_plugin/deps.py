@@ -5,10 +5,17 @@ Installerar nödvändiga paket vid första körning om de saknas.
 Kompatibel med Python 3.9+ (QGIS LTR).
 """
 
+import functools
+import hashlib
+import importlib.util
+import json
 import os
 import subprocess
 import sys
-from typing import Callable, List, Optional
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
 
 # Paket som krävs för G-ETL core
 REQUIRED_PACKAGES = {
@@ -17,12 +24,26 @@ REQUIRED_PACKAGES = {
     "yaml": "pyyaml",
     "jinja2": "jinja2",
     "requests": "requests",
+    "urllib3": "urllib3",
     "dotenv": "python-dotenv",
     "pyogrio": "pyogrio",
     "shapely": "shapely",
     "pyarrow": "pyarrow",
 }
 
+# Hur länge ett sparat resultat från check_dependencies gäller (sekunder)
+DEPS_CACHE_TTL = 24 * 60 * 60
+
+# Max tid för ett pip-anrop (sekunder)
+PIP_TIMEOUT = 300
+
+# Flaggor till pip install: ingen versionskontroll eller interaktiva frågor,
+# och hellre en äldre wheel än att bygga t.ex. h3/duckdb från källkod
+PIP_INSTALL_FLAGS = ["--disable-pip-version-check", "--no-input", "--prefer-binary"]
+
+# DuckDB extensions som installeras runtime
+DUCKDB_EXTENSIONS = ["spatial", "h3", "parquet", "httpfs", "json"]
+
 
 def _get_qgis_python_path() -> Optional[str]:
     """Hitta Python-executable i QGIS-installationen.
@@ -125,19 +146,107 @@ def get_install_command(packages: List[str]) -> str:
     return f"pip3 install --user {pkg_str}"
 
 
+def _has_module(import_name: str) -> bool:
+    """Kontrollera om en modul finns utan att importera (köra) den."""
+    try:
+        return importlib.util.find_spec(import_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _cache_path() -> Optional[Path]:
+    """Sökväg till cachefilen i QGIS-profilen, eller None utanför QGIS."""
+    try:
+        from qgis.core import QgsApplication
+    except ImportError:
+        return None
+    return Path(QgsApplication.qgisSettingsDirPath()) / "g_etl_deps.json"
+
+
+def _cache_key() -> str:
+    """Nyckel som ändras om Python-miljön eller paketlistan ändras."""
+    packages = json.dumps(REQUIRED_PACKAGES, sort_keys=True).encode("utf-8")
+    raw = "\n".join([sys.executable, sys.version, hashlib.sha256(packages).hexdigest()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _read_cached_missing() -> Optional[Tuple[str, ...]]:
+    """Läs sparat resultat om nyckeln stämmer och det är färskare än DEPS_CACHE_TTL.
+
+    Bara resultatet "inget saknas" litas på. En sparad lista med saknade
+    paket (från äldre versioner) ignoreras, så att paket som installerats
+    utanför pluginen (t.ex. med get_install_command) syns efter omstart.
+    """
+    path = _cache_path()
+    if path is None:
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data["key"] != _cache_key() or time.time() - data["ts"] >= DEPS_CACHE_TTL:
+            return None
+        if data["missing"]:
+            return None
+        return ()
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_cached_missing(missing: Tuple[str, ...]) -> None:
+    """Spara resultatet till cachefilen (fel ignoreras, cachen är bara en genväg).
+
+    Bara "inget saknas" sparas; saknas något slås paketen upp igen nästa gång.
+    """
+    path = _cache_path()
+    if path is None or missing:
+        return
+    data = {"key": _cache_key(), "ts": time.time(), "missing": list(missing)}
+    try:
+        path.write_text(json.dumps(data), encoding="utf-8")
+    except OSError:
+        pass
+
+
+def _clear_cache() -> None:
+    """Töm både minnes- och diskcachen för check_dependencies."""
+    _missing_packages.cache_clear()
+    path = _cache_path()
+    if path is not None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+@functools.cache
+def _missing_packages() -> Tuple[str, ...]:
+    """Returnera de paket som saknas (cachad i minnet och på disk).
+
+    Finns ett färskt sparat "inget saknas" för samma Python-miljö används
+    det direkt. Annars slås varje paket upp med find_spec, som bara går
+    igenom import-systemets finders och inte kör paketens init-kod.
+    """
+    cached = _read_cached_missing()
+    if cached is not None:
+        return cached
+    missing = tuple(
+        pip_name
+        for import_name, pip_name in REQUIRED_PACKAGES.items()
+        if not _has_module(import_name)
+    )
+    _write_cached_missing(missing)
+    return missing
+
+
 def check_dependencies() -> List[str]:
     """Kontrollera vilka dependencies som saknas.
 
+    Resultatet cachas (i minnet och i QGIS-profilen, max DEPS_CACHE_TTL)
+    tills install_dependencies lyckats installera något.
+
     Returns:
         Lista med paketnamn (pip) som behöver installeras.
     """
-    missing = []
-    for import_name, pip_name in REQUIRED_PACKAGES.items():
-        try:
-            __import__(import_name)
-        except ImportError:
-            missing.append(pip_name)
-    return missing
+    return list(_missing_packages())
 
 
 def _try_pip_install(
@@ -147,6 +256,8 @@ def _try_pip_install(
 ) -> bool:
     """Försök köra ett pip-kommando.
 
+    pip:s utskrift strömmas rad för rad till on_progress medan kommandot kör.
+
     Args:
         cmd: Kommando att köra.
         description: Beskrivning för loggning.
@@ -159,11 +270,13 @@ def _try_pip_install(
         on_progress(f"Försöker: {description}")
 
     try:
-        # Bygger kwargs för subprocess.run
+        # Bygger kwargs för subprocess.Popen; stderr slås ihop med stdout
+        # så att pip:s utskrift kan strömmas rad för rad
         kwargs = {
-            "capture_output": True,
+            "stdout": subprocess.PIPE,
+            "stderr": subprocess.STDOUT,
             "text": True,
-            "timeout": 300,
+            "bufsize": 1,
             "stdin": subprocess.DEVNULL,
         }
 
@@ -171,20 +284,43 @@ def _try_pip_install(
         if sys.platform == "win32":
             kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
 
-        result = subprocess.run(cmd, **kwargs)
+        proc = subprocess.Popen(cmd, **kwargs)
+
+        # Läsningen nedan blockerar, så timeout sköts av en timer som dödar processen
+        timed_out = threading.Event()
 
-        if result.returncode == 0:
+        def _kill() -> None:
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(PIP_TIMEOUT, _kill)
+        timer.start()
+        last_line = ""
+        try:
+            for line in proc.stdout:
+                line = line.rstrip()
+                if line:
+                    last_line = line
+                    if on_progress:
+                        on_progress(line)
+            proc.wait()
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, PIP_TIMEOUT)
+
+        if proc.returncode == 0:
             if on_progress:
                 on_progress("Installation klar!")
             return True
         else:
-            if on_progress:
-                stderr = result.stderr.strip()
-                if stderr:
-                    on_progress(f"Misslyckades: {stderr[:200]}")
+            if on_progress and last_line:
+                on_progress(f"Misslyckades: {last_line[:200]}")
     except subprocess.TimeoutExpired:
         if on_progress:
-            on_progress("Timeout efter 5 minuter")
+            on_progress(f"Timeout efter {PIP_TIMEOUT // 60} minuter")
     except Exception as e:
         if on_progress:
             on_progress(f"Fel: {e}")
@@ -192,9 +328,60 @@ def _try_pip_install(
     return False
 
 
+def get_wheel_cache_dir() -> Path:
+    """Katalog för förhämtade wheels, delad mellan QGIS-profiler.
+
+    Windows: %LOCALAPPDATA%/g_etl/wheels, annars $XDG_CACHE_HOME/g_etl/wheels
+    (standard ~/.cache/g_etl/wheels).
+    """
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        base = Path(os.environ["LOCALAPPDATA"])
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "g_etl" / "wheels"
+
+
+def prefetch_dependencies(
+    cache_dir: Optional[Path] = None,
+    packages: Optional[List[str]] = None,
+    on_progress: Optional[Callable[[str], None]] = None,
+) -> bool:
+    """Ladda ner wheels till cache_dir för senare installation utan nätverk.
+
+    Args:
+        cache_dir: Målkatalog (standard get_wheel_cache_dir()).
+        packages: Pip-paket att hämta (standard alla i REQUIRED_PACKAGES).
+        on_progress: Callback för statusmeddelanden.
+
+    Returns:
+        True om nedladdningen lyckades.
+    """
+    cache_dir = Path(cache_dir) if cache_dir else get_wheel_cache_dir()
+    packages = packages if packages is not None else list(REQUIRED_PACKAGES.values())
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    python_exe = _get_qgis_python_path() or sys.executable
+    return _try_pip_install(
+        [
+            python_exe,
+            "-m",
+            "pip",
+            "download",
+            *PIP_INSTALL_FLAGS,
+            "-d",
+            str(cache_dir),
+            *packages,
+        ],
+        f"pip download till {cache_dir}",
+        on_progress,
+    )
+
+
 def install_dependencies(
     packages: List[str],
     on_progress: Optional[Callable[[str], None]] = None,
+    offline: bool = False,
+    cache_dir: Optional[Path] = None,
 ) -> bool:
     """Installera saknade dependencies.
 
@@ -207,6 +394,9 @@ def install_dependencies(
     Args:
         packages: Lista med pip-paketnamn att installera.
         on_progress: Callback för statusmeddelanden.
+        offline: Installera bara från cache_dir (--no-index), utan PyPI.
+        cache_dir: Katalog med wheels från prefetch_dependencies()
+            (standard get_wheel_cache_dir()). Används bara med offline.
 
     Returns:
         True om installationen lyckades.
@@ -217,12 +407,31 @@ def install_dependencies(
     if on_progress:
         on_progress(f"Installerar {len(packages)} paket: {', '.join(packages)}")
 
+    flags = list(PIP_INSTALL_FLAGS)
+    if offline:
+        wheel_dir = Path(cache_dir) if cache_dir else get_wheel_cache_dir()
+        flags += ["--no-index", "--find-links", str(wheel_dir)]
+
+    success = _install_packages(packages, flags, on_progress)
+    if success:
+        # Nyinstallerade paket ska synas vid nästa check_dependencies()
+        _clear_cache()
+    return success
+
+
+def _install_packages(
+    packages: List[str],
+    flags: List[str],
+    on_progress: Optional[Callable[[str], None]] = None,
+) -> bool:
+    """Prova installationsmetoderna i tur och ordning (se install_dependencies)."""
+
     # Försök 1: QGIS-specifik pip (finns på macOS och Windows)
     qgis_pip = get_qgis_pip_path()
     if qgis_pip:
         # Prova med --user först
         if _try_pip_install(
-            [qgis_pip, "install", "--user", "--quiet", *packages],
+            [qgis_pip, "install", *flags, "--user", *packages],
             "QGIS pip --user",
             on_progress,
         ):
@@ -230,7 +439,7 @@ def install_dependencies(
 
         # Prova utan --user
         if _try_pip_install(
-            [qgis_pip, "install", "--quiet", *packages],
+            [qgis_pip, "install", *flags, *packages],
             "QGIS pip",
             on_progress,
         ):
@@ -244,7 +453,7 @@ def install_dependencies(
 
     # Försök 2: python -m pip med --user
     if _try_pip_install(
-        [python_exe, "-m", "pip", "install", "--user", "--quiet", *packages],
+        [python_exe, "-m", "pip", "install", *flags, "--user", *packages],
         "pip --user",
         on_progress,
     ):
@@ -257,9 +466,9 @@ def install_dependencies(
             "-m",
             "pip",
             "install",
+            *flags,
             "--user",
             "--break-system-packages",
-            "--quiet",
             *packages,
         ],
         "pip --break-system-packages",
@@ -269,7 +478,7 @@ def install_dependencies(
 
     # Försök 4: Standard pip (kan kräva admin-rättigheter)
     if _try_pip_install(
-        [python_exe, "-m", "pip", "install", "--quiet", *packages],
+        [python_exe, "-m", "pip", "install", *flags, *packages],
         "pip standard",
         on_progress,
     ):
@@ -298,10 +507,17 @@ def ensure_dependencies(on_progress: Optional[Callable[[str], None]] = None) ->
     return install_dependencies(missing, on_progress)
 
 
+def _extension_stamp_path() -> Path:
+    """Stämpelfil bredvid DuckDB:s extension-katalog."""
+    return Path.home() / ".duckdb" / "extensions" / ".g_etl_stamp.json"
+
+
 def install_duckdb_extensions(on_progress: Optional[Callable[[str], None]] = None) -> bool:
     """Installera DuckDB extensions (spatial, h3).
 
-    Dessa installeras runtime i DuckDB, inte via pip.
+    Dessa installeras runtime i DuckDB, inte via pip. När alla installerats
+    skrivs en stämpel med DuckDB-version och extensions; matchar den vid
+    nästa anrop hoppas installationen över helt.
 
     Args:
         on_progress: Callback för statusmeddelanden.
@@ -312,20 +528,38 @@ def install_duckdb_extensions(on_progress: Optional[Callable[[str], None]] = Non
     try:
         import duckdb
 
+        stamp = {"duckdb": duckdb.__version__, "ext": sorted(DUCKDB_EXTENSIONS)}
+        stamp_path = _extension_stamp_path()
+        try:
+            if json.loads(stamp_path.read_text(encoding="utf-8")) == stamp:
+                if on_progress:
+                    on_progress("DuckDB extensions redan installerade")
+                return True
+        except (OSError, ValueError):
+            pass
+
         conn = duckdb.connect(":memory:")
 
-        extensions = ["spatial", "h3", "parquet", "httpfs", "json"]
-        for ext in extensions:
+        all_installed = True
+        for ext in DUCKDB_EXTENSIONS:
             if on_progress:
                 on_progress(f"Installerar DuckDB extension: {ext}")
             try:
                 conn.execute(f"INSTALL {ext}")
                 conn.execute(f"LOAD {ext}")
             except Exception as e:
+                all_installed = False
                 if on_progress:
                     on_progress(f"Varning: Kunde inte installera {ext}: {e}")
 
         conn.close()
+
+        if all_installed:
+            try:
+                stamp_path.parent.mkdir(parents=True, exist_ok=True)
+                stamp_path.write_text(json.dumps(stamp), encoding="utf-8")
+            except OSError:
+                pass
         return True
 
     except Exception as e:
@@ -43,10 +43,10 @@ def _ensure_core_imports():
     if runner_path not in sys.path:
         sys.path.insert(0, runner_path)
 
-    global PipelineRunner, PipelineEvent, settings, yaml, export_mart_tables, FileLogger
-
-    import yaml as _yaml
+    global PipelineRunner, PipelineEvent, settings, load_datasets_config, load_dataset_types
+    global export_mart_tables, FileLogger
 
+    from g_etl.config_loader import load_dataset_types, load_datasets_config
     from g_etl.export import export_mart_tables
     from g_etl.services.pipeline_runner import (
         PipelineEvent,
@@ -55,7 +55,6 @@ def _ensure_core_imports():
     from g_etl.settings import settings
     from g_etl.utils.logging import FileLogger
 
-    yaml = _yaml
     core_imported = True
 
 
@@ -78,6 +77,11 @@ class QGISPipelineRunner:
         settings.CONFIG_DIR = self.config_dir
         settings.SQL_DIR = self.sql_dir
 
+        # SQLGenerator-singletonen skapades vid import med tidigare SQL_DIR
+        from g_etl.sql_generator import reset_generator
+
+        reset_generator()
+
         # Använd användarens hem-katalog för data (skrivbar plats)
         user_data_dir = Path.home() / ".g_etl"
         settings.DATA_DIR = user_data_dir / "data"
@@ -99,28 +103,7 @@ class QGISPipelineRunner:
         """
         _ensure_core_imports()
 
-        config_path = self.config_dir / "datasets.yml"
-        if not config_path.exists():
-            return []
-
-        with open(config_path) as f:
-            data = yaml.safe_load(f)
-
-        if not data:
-            return []
-
-        # Nytt format: pipelines-grupperat
-        if "pipelines" in data:
-            result = []
-            for pipeline in data["pipelines"]:
-                pipeline_id = pipeline.get("id", "")
-                for ds in pipeline.get("datasets", []):
-                    ds["pipeline"] = pipeline_id
-                    result.append(ds)
-            return result
-
-        # Gammalt format: platt lista
-        return data.get("datasets", [])
+        return load_datasets_config(self.config_dir / "datasets.yml")
 
     def list_dataset_types(self) -> List[str]:
         """Hämta unika dataset-typer.
@@ -128,12 +111,9 @@ class QGISPipelineRunner:
         Returns:
             Lista med unika typ-värden.
         """
-        datasets = self.list_datasets()
-        types = set()
-        for ds in datasets:
-            if "type" in ds:
-                types.add(ds["type"])
-        return sorted(types)
+        _ensure_core_imports()
+
+        return load_dataset_types(self.config_dir / "datasets.yml")
 
     def run_pipeline(
         self,
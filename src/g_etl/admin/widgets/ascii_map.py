@@ -166,7 +166,7 @@ def load_centroids_from_query(
     schema: str,
     table: str,
     geometry_column: str = "geometry",
-    sample_size: int = 50000,
+    sample_size: int | None = 50000,
 ) -> list[tuple[float, float]]:
     """Ladda geometri-centroids som (x, y) punkter i SWEREF99 TM.
 
@@ -178,7 +178,9 @@ def load_centroids_from_query(
         schema: Databasschema
         table: Tabellnamn
         geometry_column: Namn på geometrikolumnen
-        sample_size: Max antal punkter att ladda
+        sample_size: Max antal punkter att ladda (None = alla). Urvalet görs
+            i DuckDB (reservoir sampling under scan), så bara så många rader
+            lämnar databasen.
 
     Returns:
         Lista med (x, y) koordinater i SWEREF99 TM
@@ -200,36 +202,54 @@ def load_centroids_from_query(
         LIMIT 1
     """
     sample_x = conn.execute(check_query).fetchone()
-    needs_transform = sample_x and sample_x[0] is not None and abs(sample_x[0]) < 180
-
-    if needs_transform:
-        geom = geometry_column
-        query = f"""
-            SELECT
-                ST_X(ST_Centroid(ST_Transform({geom}, 'EPSG:4326', 'EPSG:3006'))) as x,
-                ST_Y(ST_Centroid(ST_Transform({geom}, 'EPSG:4326', 'EPSG:3006'))) as y
-            FROM {schema}.{table}
-            WHERE {geom} IS NOT NULL
-            USING SAMPLE {sample_size}
-        """
-    else:
-        query = f"""
-            SELECT
-                ST_X(ST_Centroid({geometry_column})) as x,
-                ST_Y(ST_Centroid({geometry_column})) as y
-            FROM {schema}.{table}
-            WHERE {geometry_column} IS NOT NULL
-            USING SAMPLE {sample_size}
-        """
+    needs_transform = bool(sample_x and sample_x[0] is not None and abs(sample_x[0]) < 180)
 
+    query = _centroid_query(schema, table, geometry_column, sample_size, needs_transform)
     try:
-        rows = conn.execute(query).fetchall()
-        return [(float(x), float(y)) for x, y in rows if x is not None and y is not None]
+        return _fetch_points(conn, query)
     except Exception:
         # Fallback utan SAMPLE
-        query_simple = query.replace(f"USING SAMPLE {sample_size}", f"LIMIT {sample_size}")
-        rows = conn.execute(query_simple).fetchall()
-        return [(float(x), float(y)) for x, y in rows if x is not None and y is not None]
+        query_simple = _centroid_query(schema, table, geometry_column, None, needs_transform)
+        if sample_size is not None:
+            query_simple += f" LIMIT {sample_size}"
+        return _fetch_points(conn, query_simple)
+
+
+def _centroid_query(
+    schema: str,
+    table: str,
+    geometry_column: str,
+    sample_size: int | None,
+    needs_transform: bool,
+) -> str:
+    """Bygg x/y-query för centroids, med USING SAMPLE om sample_size anges."""
+    geom = geometry_column
+    if needs_transform:
+        geom = f"ST_Transform({geometry_column}, 'EPSG:4326', 'EPSG:3006')"
+    query = f"""
+        SELECT
+            ST_X(ST_Centroid({geom})) as x,
+            ST_Y(ST_Centroid({geom})) as y
+        FROM {schema}.{table}
+        WHERE {geometry_column} IS NOT NULL
+    """
+    if sample_size is not None:
+        query += f"USING SAMPLE {int(sample_size)} ROWS"
+    return query
+
+
+def _fetch_points(conn: duckdb.DuckDBPyConnection, query: str) -> list[tuple[float, float]]:
+    """Kör en x/y-query och returnera punkterna.
+
+    NULL filtreras bort i SQL och kolumnerna hämtas som NumPy-arrayer
+    (fetchnumpy), så att konverteringen till Python-floats sker i C
+    istället för per rad.
+    """
+    cols = conn.execute(
+        f"SELECT x::DOUBLE AS x, y::DOUBLE AS y FROM ({query}) "
+        "WHERE x IS NOT NULL AND y IS NOT NULL"
+    ).fetchnumpy()
+    return list(zip(cols["x"].tolist(), cols["y"].tolist(), strict=True))
 
 
 @dataclass
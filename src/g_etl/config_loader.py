@@ -6,12 +6,140 @@ Returnerar alltid en platt lista av dataset-dicts med 'pipeline' injicerat.
 
 from __future__ import annotations
 
+import json
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any
 
 import yaml
 
 from g_etl.settings import settings
 
+# libyamls C-parser om PyYAML byggts med den, annars ren Python
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Max antal parsade YAML-filer i cachen
+YAML_CACHE_MAX_SIZE = 100
+
+# LRU-cache: absolut sökväg -> (mtime_ns, storlek, fryst data)
+_yaml_cache: OrderedDict[str, tuple[int, int, Any]] = OrderedDict()
+_yaml_cache_lock = threading.Lock()
+
+# Med G_ETL_YAML_CACHE=1 sparas parsad YAML även som JSON bredvid källfilen
+# (<fil>.cache.json) och läses därifrån så länge källan är oförändrad
+YAML_SIDECAR_ENV = "G_ETL_YAML_CACHE"
+_SIDECAR_HEADER = "# src-mtime: "
+_NO_SIDECAR = object()
+
+
+def _freeze_items(items: Any) -> Any:
+    """Frys en lista av dicts till en tuple av MappingProxyType."""
+    if not isinstance(items, list):
+        return items
+    return tuple(MappingProxyType(item) if isinstance(item, dict) else item for item in items)
+
+
+def _freeze_config(data: Any) -> Any:
+    """Frys toppnivån av en parsad datasets.yml för delning via cachen.
+
+    Pipelines och datasets blir MappingProxyType i tuples, så att ingen
+    anropare kan ändra den cachade strukturen. Nästlade värden (t.ex.
+    listor i ett dataset) delas och ska behandlas som read-only.
+    """
+    if not isinstance(data, dict):
+        return data
+    frozen = dict(data)
+    if isinstance(data.get("pipelines"), list):
+        frozen["pipelines"] = tuple(
+            MappingProxyType({**p, "datasets": _freeze_items(p.get("datasets") or [])})
+            if isinstance(p, dict)
+            else p
+            for p in data["pipelines"]
+        )
+    if "datasets" in data:
+        frozen["datasets"] = _freeze_items(data["datasets"])
+    return MappingProxyType(frozen)
+
+
+def _sidecar_path(path: Path) -> Path:
+    return path.with_name(path.name + ".cache.json")
+
+
+def _read_sidecar(path: Path, stamp: tuple[int, int]) -> Any:
+    """Läs JSON-sidecar om den skrevs för samma mtime/storlek, annars _NO_SIDECAR."""
+    try:
+        header, _, body = _sidecar_path(path).read_bytes().partition(b"\n")
+        if header.decode("ascii") != f"{_SIDECAR_HEADER}{stamp[0]} {stamp[1]}":
+            return _NO_SIDECAR
+        return json.loads(body)
+    except (OSError, ValueError):
+        return _NO_SIDECAR
+
+
+def _write_sidecar(path: Path, stamp: tuple[int, int], data: Any) -> None:
+    """Skriv JSON-sidecar atomiskt (tyst om det inte går).
+
+    Data som inte överlever en JSON-rundtur oförändrad (t.ex. datum eller
+    icke-strängnycklar) skrivs inte, så sidecaren ger alltid samma resultat
+    som YAML-parsningen.
+    """
+    sidecar = _sidecar_path(path)
+    tmp = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+    try:
+        body = json.dumps(data, ensure_ascii=False)
+        if json.loads(body) != data:
+            return
+        tmp.write_text(f"{_SIDECAR_HEADER}{stamp[0]} {stamp[1]}\n{body}", encoding="utf-8")
+        os.replace(tmp, sidecar)
+    except (TypeError, ValueError, OSError):
+        tmp.unlink(missing_ok=True)
+
+
+def _parse_yaml(path: Path, stamp: tuple[int, int]) -> Any:
+    """Parsa YAML-filen, via JSON-sidecar om YAML_SIDECAR_ENV är satt."""
+    use_sidecar = os.environ.get(YAML_SIDECAR_ENV) == "1"
+    if use_sidecar:
+        data = _read_sidecar(path, stamp)
+        if data is not _NO_SIDECAR:
+            return data
+
+    # Bytes direkt till parsern: avkodningen (UTF-8/UTF-16 enligt BOM) sker i C
+    # och blir oberoende av systemets locale
+    data = yaml.load(path.read_bytes(), Loader=_Loader)
+    if use_sidecar:
+        _write_sidecar(path, stamp, data)
+    return data
+
+
+def _read_yaml(path: Path) -> Any:
+    """Läs en YAML-fil med _Loader (samma semantik som yaml.safe_load).
+
+    Parsad data cachas per fil i fryst form (se _freeze_config) och
+    återanvänds så länge mtime och storlek är oförändrade. Anroparen
+    bygger egna dicts ur den frysta strukturen, så ingen djupkopia behövs.
+    """
+    st = os.stat(path)
+    key = str(Path(path).resolve())
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _yaml_cache_lock:
+        cached = _yaml_cache.get(key)
+        if cached is not None and cached[:2] == stamp:
+            _yaml_cache.move_to_end(key)
+            return cached[2]
+
+    data = _freeze_config(_parse_yaml(Path(path), stamp))
+
+    with _yaml_cache_lock:
+        _yaml_cache[key] = (*stamp, data)
+        _yaml_cache.move_to_end(key)
+        while len(_yaml_cache) > YAML_CACHE_MAX_SIZE:
+            _yaml_cache.popitem(last=False)
+    return data
+
 
 def load_datasets_config(config_path: Path | str | None = None) -> list[dict]:
     """Ladda datasets.yml och returnera platt lista av dataset-dicts.
@@ -33,8 +161,7 @@ def load_datasets_config(config_path: Path | str | None = None) -> list[dict]:
     if not path.exists():
         return []
 
-    with open(path) as f:
-        data = yaml.safe_load(f)
+    data = _read_yaml(path)
 
     if not data:
         return []
@@ -44,7 +171,7 @@ def load_datasets_config(config_path: Path | str | None = None) -> list[dict]:
         return _flatten_pipelines(data["pipelines"])
 
     # Gammalt format: platt lista (bakåtkompatibilitet)
-    return data.get("datasets", [])
+    return [dict(ds) for ds in data.get("datasets") or []]
 
 
 def load_pipelines_config(config_path: Path | str | None = None) -> list[dict]:
@@ -57,8 +184,7 @@ def load_pipelines_config(config_path: Path | str | None = None) -> list[dict]:
     if not path.exists():
         return []
 
-    with open(path) as f:
-        data = yaml.safe_load(f)
+    data = _read_yaml(path)
 
     if not data or "pipelines" not in data:
         return []
@@ -77,15 +203,35 @@ def load_pipelines_config(config_path: Path | str | None = None) -> list[dict]:
     return result
 
 
+def load_dataset_types(config_path: Path | str | None = None) -> list[str]:
+    """Hämta sorterade unika 'type'-värden ur datasets.yml.
+
+    Läser den cachade strukturen direkt utan att bygga den platta
+    dataset-listan. Stödjer både nytt och gammalt format.
+    """
+    path = Path(config_path) if config_path else settings.datasets_path
+    if not path.exists():
+        return []
+
+    data = _read_yaml(path)
+    if not data:
+        return []
+
+    if "pipelines" in data:
+        datasets = (ds for p in data["pipelines"] for ds in p.get("datasets") or ())
+    else:
+        datasets = iter(data.get("datasets") or ())
+    return sorted({ds["type"] for ds in datasets if "type" in ds})
+
+
 def _flatten_pipelines(pipelines: list[dict]) -> list[dict]:
     """Platta ut pipelines-struktur till flat dataset-lista.
 
-    Injicerar 'pipeline' key i varje dataset-dict.
+    Varje dataset blir en ny (grund) kopia med 'pipeline' injicerat;
+    indata ändras inte, så den kan komma direkt från cachen.
     """
-    result = []
-    for pipeline in pipelines:
-        pipeline_id = pipeline.get("id", "")
-        for ds in pipeline.get("datasets", []):
-            ds["pipeline"] = pipeline_id
-            result.append(ds)
-    return result
+    return [
+        {**ds, "pipeline": pipeline.get("id", "")}
+        for pipeline in pipelines
+        for ds in pipeline.get("datasets") or ()
+    ]
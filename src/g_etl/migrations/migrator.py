@@ -25,6 +25,17 @@ from enum import Enum
 from pathlib import Path
 from typing import Protocol
 
+# Förkompilerade mönster (delas av alla Migrator-instanser)
+_UP_SECTION_RE = re.compile(
+    r"--\s*migrate:up\s*\n(.*?)(?=--\s*migrate:down|\Z)", re.DOTALL | re.IGNORECASE
+)
+_DOWN_SECTION_RE = re.compile(
+    r"--\s*migrate:down\s*\n(.*?)(?=--\s*migrate:up|\Z)", re.DOTALL | re.IGNORECASE
+)
+_FILENAME_RE = re.compile(r"^(\d+)_(.+)$")
+_VERSION_PREFIX_RE = re.compile(r"^(\d+)")
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
 
 class MigrationStatus(str, Enum):
     """Status för en migrering."""
@@ -123,16 +134,8 @@ class Migrator:
         content = path.read_text(encoding="utf-8")
 
         # Hitta up och down sektioner
-        up_match = re.search(
-            r"--\s*migrate:up\s*\n(.*?)(?=--\s*migrate:down|\Z)",
-            content,
-            re.DOTALL | re.IGNORECASE,
-        )
-        down_match = re.search(
-            r"--\s*migrate:down\s*\n(.*?)(?=--\s*migrate:up|\Z)",
-            content,
-            re.DOTALL | re.IGNORECASE,
-        )
+        up_match = _UP_SECTION_RE.search(content)
+        down_match = _DOWN_SECTION_RE.search(content)
 
         up_sql = up_match.group(1).strip() if up_match else content.strip()
         down_sql = down_match.group(1).strip() if down_match else ""
@@ -145,7 +148,7 @@ class Migrator:
         Format: 001_create_schemas.sql -> ("001", "create_schemas")
         """
         stem = path.stem
-        match = re.match(r"^(\d+)_(.+)$", stem)
+        match = _FILENAME_RE.match(stem)
         if match:
             return match.group(1), match.group(2)
         return stem, stem
@@ -636,7 +639,7 @@ class Migrator:
         if existing:
             versions = []
             for f in existing:
-                match = re.match(r"^(\d+)", f.stem)
+                match = _VERSION_PREFIX_RE.match(f.stem)
                 if match:
                     versions.append(int(match.group(1)))
             next_version = max(versions) + 1 if versions else 1
@@ -645,7 +648,7 @@ class Migrator:
 
         # Skapa filnamn
         version_str = f"{next_version:03d}"
-        safe_name = re.sub(r"[^\w]+", "_", name.lower()).strip("_")
+        safe_name = _NON_WORD_RE.sub("_", name.lower()).strip("_")
         filename = f"{version_str}_{safe_name}.sql"
         filepath = self.migrations_dir / filename
 
@@ -1,5 +1,7 @@
 """G-ETL Source Plugins."""
 
+import functools
+
 from g_etl.plugins.base import SourcePlugin
 from g_etl.plugins.geopackage import GeoPackagePlugin
 from g_etl.plugins.geopackage import clear_download_cache as _clear_gpkg_direct_cache
@@ -39,8 +41,12 @@ except ImportError:
     pass  # pyodbc/libodbc saknas
 
 
+@functools.cache
 def get_plugin(plugin_name: str) -> SourcePlugin:
-    """Hämta plugin-instans baserat på namn."""
+    """Hämta plugin-instans baserat på namn.
+
+    Plugins är tillståndslösa, så en instans per namn cachas och delas.
+    """
     plugin_class = PLUGINS.get(plugin_name)
     if not plugin_class:
         raise ValueError(f"Okänd plugin: {plugin_name}. Tillgängliga: {list(PLUGINS.keys())}")
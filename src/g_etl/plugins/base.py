@@ -8,6 +8,15 @@ from pathlib import Path
 import duckdb
 
 
+def quote_identifier(name: str) -> str:
+    """Citera ett SQL-identifierare (t.ex. tabellnamn) för DuckDB.
+
+    Tabellnamn kan inte bindas som parametrar, så de interpoleras
+    citerade istället för råa.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
 @dataclass
 class ExtractResult:
     """Resultat från en extract-operation."""
@@ -52,6 +61,23 @@ class SourcePlugin(ABC):
         """
         pass
 
+    def prefetch(
+        self,
+        config: dict,
+        on_log: Callable[[str], None] | None = None,
+    ) -> None:
+        """Förbered extract, t.ex. ladda ner källfilen i förväg.
+
+        Anropas av pipelinen från en separat I/O-pool så att nedladdningen
+        kan överlappa andra datasets extrahering. Standard gör ingenting.
+        Fel ska inte kastas, extract() får hantera dem.
+
+        Args:
+            config: Dataset-konfiguration med plugin-specifika parametrar
+            on_log: Callback för loggmeddelanden
+        """
+        return None
+
     def extract_to_parquet(
         self,
         config: dict,
@@ -128,6 +154,53 @@ class SourcePlugin(ABC):
         finally:
             temp_conn.close()
 
+    def _load_arrow_to_raw(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        arrow_tbl,
+        table_name: str,
+        geom_col: str,
+    ) -> None:
+        """Ladda en Arrow-tabell med WKB-geometri till raw.{table_name}.
+
+        Tabellen registreras explicit med conn.register (Arrow C Data
+        Interface, utan kopiering) istället för att DuckDB letar upp
+        Python-variabeln via replacement scan.
+        """
+        view_name = f"_arrow_{table_name}"
+        geom_ident = quote_identifier(geom_col)
+        conn.register(view_name, arrow_tbl)
+        try:
+            conn.execute(
+                f"""
+                CREATE OR REPLACE TABLE raw.{quote_identifier(table_name)} AS
+                SELECT
+                    * EXCLUDE ({geom_ident}),
+                    ST_GeomFromWKB({geom_ident}) AS geom
+                FROM {quote_identifier(view_name)}
+            """
+            )
+        finally:
+            conn.unregister(view_name)
+
+    def _create_raw_table(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        table_name: str,
+        select_sql: str,
+        params: list | None = None,
+    ) -> int:
+        """Skapa raw.{table_name} från select_sql och returnera antal rader.
+
+        Värden (sökvägar, URL:er, lager) skickas som ?-parametrar i params,
+        bara tabellnamnet interpoleras. CTAS i DuckDB returnerar alltid en
+        rad med antalet skapade rader, så ingen extra COUNT(*) behövs.
+        """
+        return conn.execute(
+            f"CREATE OR REPLACE TABLE raw.{quote_identifier(table_name)} AS {select_sql}",
+            params,
+        ).fetchone()[0]
+
     def _log(self, message: str, on_log: Callable[[str], None] | None):
         """Hjälpmetod för att logga meddelanden."""
         if on_log:
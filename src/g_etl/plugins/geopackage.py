@@ -93,41 +93,43 @@ class GeoPackagePlugin(SourcePlugin):
                     message=f"GeoPackage file not found: {gpkg_path}",
                 )
 
-            # List available layers
-            try:
-                layers_result = conn.execute(
-                    f"SELECT name FROM st_layers('{gpkg_path}')"
-                ).fetchall()
-                available_layers = [row[0] for row in layers_result]
-                if len(available_layers) > 1:
-                    layers_str = ", ".join(available_layers)
-                    self._log(
-                        f"Multiple layers in {gpkg_path.name}: {layers_str}",
-                        on_log,
-                    )
-                    if not layer:
+            # List available layers (skipped when layer is given in config)
+            if not layer:
+                try:
+                    layers_result = conn.execute(
+                        f"SELECT name FROM st_layers('{gpkg_path}')"
+                    ).fetchall()
+                    available_layers = [row[0] for row in layers_result]
+                    if len(available_layers) > 1:
+                        layers_str = ", ".join(available_layers)
+                        self._log(
+                            f"Multiple layers in {gpkg_path.name}: {layers_str}",
+                            on_log,
+                        )
                         self._log(
                             f"Using first layer: {available_layers[0]} "
                             "(set 'layer' in config for specific layer)",
                             on_log,
                         )
-            except Exception:
-                pass
+                except Exception:
+                    pass
 
             self._log(f"Reading {gpkg_path.name}...", on_log)
             self._progress(0.7, f"Reading {gpkg_path.name}...", on_progress)
 
             # Read with DuckDB ST_Read
+            # Path and layer are bound as parameters, only the table name is interpolated
             try:
                 if layer:
-                    read_expr = f"ST_Read('{gpkg_path}', layer='{layer}')"
+                    read_expr = "ST_Read(?, layer=?)"
+                    params = [str(gpkg_path), layer]
                 else:
-                    read_expr = f"ST_Read('{gpkg_path}')"
+                    read_expr = "ST_Read(?)"
+                    params = [str(gpkg_path)]
 
-                conn.execute(f"""
-                    CREATE OR REPLACE TABLE raw.{table_name} AS
-                    SELECT * FROM {read_expr}
-                """)
+                rows_count = self._create_raw_table(
+                    conn, table_name, f"SELECT * FROM {read_expr}", params
+                )
             except Exception as st_read_error:
                 # Fallback: Use pyogrio for complex geometries
                 if "MULTISURFACE" in str(st_read_error) or "not supported" in str(st_read_error):
@@ -143,11 +145,6 @@ class GeoPackagePlugin(SourcePlugin):
                         )
                 raise
 
-            self._progress(0.9, "Counting rows...", on_progress)
-
-            result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-            rows_count = result[0] if result else 0
-
             self._log(f"Read {rows_count} rows to raw.{table_name}", on_log)
             self._progress(1.0, f"Read {rows_count} rows", on_progress)
 
@@ -238,16 +235,7 @@ class GeoPackagePlugin(SourcePlugin):
                 col_idx, geom_col, pa.array(simplified, type=pa.binary())
             )
 
-            conn.execute(f"DROP TABLE IF EXISTS raw.{table_name}")
-            conn.execute(
-                f"""
-                CREATE TABLE raw.{table_name} AS
-                SELECT
-                    * EXCLUDE ("{geom_col}"),
-                    ST_GeomFromWKB("{geom_col}") AS geom
-                FROM arrow_tbl
-            """
-            )
+            self._load_arrow_to_raw(conn, arrow_tbl, table_name, geom_col)
 
             return arrow_tbl.num_rows
 
@@ -54,15 +54,9 @@ class GeoParquetPlugin(SourcePlugin):
 
         try:
             # DuckDB kan läsa parquet direkt, inklusive via httpfs
-            conn.execute(f"""
-                CREATE OR REPLACE TABLE raw.{table_name} AS
-                SELECT * FROM read_parquet('{file_path}')
-            """)
-
-            self._progress(0.9, "Räknar rader...", on_progress)
-
-            result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-            rows_count = result[0] if result else 0
+            rows_count = self._create_raw_table(
+                conn, table_name, "SELECT * FROM read_parquet(?)", [file_path]
+            )
 
             self._log(f"Läste {rows_count} rader till raw.{table_name}", on_log)
             self._progress(1.0, f"Läste {rows_count} rader", on_progress)
@@ -80,17 +80,12 @@ class LantmaterietPlugin(SourcePlugin):
                 temp_path = f.name
 
             self._progress(0.7, "Laddar till databas...", on_progress)
-            conn.execute(f"""
-                CREATE OR REPLACE TABLE raw.{table_name} AS
-                SELECT * FROM ST_Read('{temp_path}')
-            """)
+            rows_count = self._create_raw_table(
+                conn, table_name, "SELECT * FROM ST_Read(?)", [temp_path]
+            )
 
             os.unlink(temp_path)
 
-            self._progress(0.9, "Räknar rader...", on_progress)
-            result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-            rows_count = result[0] if result else 0
-
             self._log(f"Hämtade {rows_count} rader till raw.{table_name}", on_log)
             self._progress(1.0, f"Hämtade {rows_count} rader", on_progress)
 
@@ -87,16 +87,7 @@ class WfsPlugin(SourcePlugin):
             wfs_url += f"&count={max_features}"
 
         # Använd DuckDB:s spatial extension för att läsa WFS/GeoJSON
-        conn.execute(f"""
-            CREATE OR REPLACE TABLE raw.{table_name} AS
-            SELECT * FROM ST_Read('{wfs_url}')
-        """)
-
-        self._progress(0.9, "Räknar rader...", on_progress)
-
-        # Hämta antal rader
-        result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-        rows_count = result[0] if result else 0
+        rows_count = self._create_raw_table(conn, table_name, "SELECT * FROM ST_Read(?)", [wfs_url])
 
         self._log(f"Hämtade {rows_count} rader till raw.{table_name}", on_log)
         self._progress(1.0, f"Hämtade {rows_count} rader", on_progress)
@@ -1,5 +1,7 @@
 """Plugin för att läsa zippade GeoPackage-filer från URL eller lokal fil."""
 
+import os
+import shutil
 import tempfile
 import threading
 import zipfile
@@ -10,32 +12,43 @@ import duckdb
 import requests
 
 from g_etl.plugins.base import ExtractResult, SourcePlugin
+from g_etl.utils.archive import extract_zip
 from g_etl.utils.downloader import download_file_streaming, is_url
 
 # Modul-nivå cache för nedladdade zip-filer
-# Cache: URL -> zip_path (behåller bara zip-filen, inte extraktionskatalogen)
-# Varje dataset extraherar till sin egen katalog för att undvika race conditions
+# Cache: URL -> zip_path
 # Rensas via clear_download_cache()
 _zip_cache: dict[str, str] = {}
 _url_locks: dict[str, threading.Lock] = {}
 _global_lock = threading.Lock()
 
-# Håll koll på alla extraktionskataloger för städning
-_extract_dirs: list[str] = []
+# Cache för extraktionskataloger
+# Cache: zip-fingeravtryck (sökväg:mtime:storlek) -> extract_dir
+# Samma zip-fil extraheras bara en gång även om flera datasets läser den
+_extract_dir_cache: dict[str, str] = {}
+
+
+def _zip_fingerprint(zip_path: str | Path) -> str:
+    """Billigt fingeravtryck för en zip-fil på disk (sökväg, mtime och storlek)."""
+    stat = os.stat(zip_path)
+    return f"{os.path.abspath(zip_path)}:{stat.st_mtime_ns}:{stat.st_size}"
 
 
 def _get_url_lock(url: str) -> threading.Lock:
-    """Hämta (eller skapa) ett lås för en specifik URL."""
-    with _global_lock:
-        if url not in _url_locks:
-            _url_locks[url] = threading.Lock()
-        return _url_locks[url]
+    """Hämta (eller skapa) ett lås för en specifik URL.
+
+    dict.setdefault är atomisk, så ingen global låsning behövs: trådar som
+    samtidigt missar får alla tillbaka låset som hamnade först i dict:en.
+    """
+    lock = _url_locks.get(url)
+    if lock is None:
+        lock = _url_locks.setdefault(url, threading.Lock())
+    return lock
 
 
 def clear_download_cache() -> None:
     """Rensa nedladdningscachen och ta bort temporära filer."""
-    global _zip_cache, _url_locks, _extract_dirs
-    import shutil
+    global _zip_cache, _url_locks, _extract_dir_cache
 
     with _global_lock:
         # Ta bort cachade zip-filer
@@ -46,14 +59,14 @@ def clear_download_cache() -> None:
                 pass
 
         # Ta bort alla extraktionskataloger
-        for extract_dir in _extract_dirs:
+        for extract_dir in _extract_dir_cache.values():
             try:
                 shutil.rmtree(extract_dir, ignore_errors=True)
             except Exception:
                 pass
 
         _zip_cache.clear()
-        _extract_dirs.clear()
+        _extract_dir_cache.clear()
         _url_locks.clear()
 
 
@@ -117,20 +130,8 @@ class ZipGeoPackagePlugin(SourcePlugin):
                         zip_path = str(downloaded_path)
                         _zip_cache[url] = zip_path
 
-                # Steg 2: Extrahera till UNIK katalog per dataset
-                # Använd URL-lås även för extraktion för att undvika filkonflikt
-                # när flera trådar läser samma cachade zip-fil samtidigt
-                self._log("Extraherar GeoPackage...", on_log)
-                self._progress(0.6, "Extraherar zip-arkiv...", on_progress)
-
-                extract_dir = tempfile.mkdtemp(prefix=f"g-etl-gpkg-{table_name}-")
-                with _global_lock:
-                    _extract_dirs.append(extract_dir)
-
-                # Lås under extraktion för att undvika att flera trådar läser zip samtidigt
-                with url_lock:
-                    with zipfile.ZipFile(zip_path, "r") as zf:
-                        zf.extractall(extract_dir)
+                # Steg 2: Extrahera (en gång per zip-fil, delas mellan datasets)
+                extract_dir = self._extract_cached(zip_path, on_log, on_progress)
 
                 # Hitta .gpkg-fil i extraherad katalog
                 if gpkg_filename:
@@ -157,12 +158,7 @@ class ZipGeoPackagePlugin(SourcePlugin):
                 self._progress(0.5, f"Läser {local_path.name}...", on_progress)
 
                 # Extrahera lokal fil till temp-katalog
-                self._log("Extraherar GeoPackage...", on_log)
-                self._progress(0.6, "Extraherar zip-arkiv...", on_progress)
-
-                extract_dir = tempfile.mkdtemp(prefix="g-etl-gpkg-local-")
-                with zipfile.ZipFile(str(local_path), "r") as zf:
-                    zf.extractall(extract_dir)
+                extract_dir = self._extract_cached(str(local_path), on_log, on_progress)
 
                 # Hitta .gpkg-fil
                 if gpkg_filename:
@@ -184,41 +180,44 @@ class ZipGeoPackagePlugin(SourcePlugin):
                     message=f"GeoPackage-filen finns inte: {gpkg_path}",
                 )
 
-            # Lista tillgängliga lager i GeoPackage
-            try:
-                layers_result = conn.execute(
-                    f"SELECT name FROM st_layers('{gpkg_path}')"
-                ).fetchall()
-                available_layers = [row[0] for row in layers_result]
-                if len(available_layers) > 1:
-                    layers_str = ", ".join(available_layers)
-                    self._log(
-                        f"⚠️  {gpkg_path.name} har {len(available_layers)} lager: {layers_str}",
-                        on_log,
-                    )
-                    if not layer:
+            # Lista tillgängliga lager i GeoPackage (bara när lager inte angetts,
+            # annars behövs inte metadata-frågan)
+            if not layer:
+                try:
+                    layers_result = conn.execute(
+                        f"SELECT name FROM st_layers('{gpkg_path}')"
+                    ).fetchall()
+                    available_layers = [row[0] for row in layers_result]
+                    if len(available_layers) > 1:
+                        layers_str = ", ".join(available_layers)
+                        self._log(
+                            f"⚠️  {gpkg_path.name} har {len(available_layers)} lager: {layers_str}",
+                            on_log,
+                        )
                         self._log(
                             f"   Använder första lagret: {available_layers[0]} "
                             "(sätt 'layer' i config för specifikt lager)",
                             on_log,
                         )
-            except Exception:
-                pass  # st_layers fungerar inte alltid, ignorera
+                except Exception:
+                    pass  # st_layers fungerar inte alltid, ignorera
 
             self._log(f"Läser {gpkg_path.name}...", on_log)
             self._progress(0.7, f"Läser {gpkg_path.name}...", on_progress)
 
             # Försök läsa med DuckDB ST_Read först
+            # Sökväg och lager binds som parametrar, bara tabellnamnet interpoleras
             try:
                 if layer:
-                    read_expr = f"ST_Read('{gpkg_path}', layer='{layer}')"
+                    read_expr = "ST_Read(?, layer=?)"
+                    params = [str(gpkg_path), layer]
                 else:
-                    read_expr = f"ST_Read('{gpkg_path}')"
+                    read_expr = "ST_Read(?)"
+                    params = [str(gpkg_path)]
 
-                conn.execute(f"""
-                    CREATE OR REPLACE TABLE raw.{table_name} AS
-                    SELECT * FROM {read_expr}
-                """)
+                rows_count = self._create_raw_table(
+                    conn, table_name, f"SELECT * FROM {read_expr}", params
+                )
             except Exception as st_read_error:
                 # Fallback: Använd pyogrio för komplexa geometrier (MULTISURFACE etc)
                 if "MULTISURFACE" in str(st_read_error) or "not supported" in str(st_read_error):
@@ -234,11 +233,6 @@ class ZipGeoPackagePlugin(SourcePlugin):
                         )
                 raise  # Kasta vidare om det inte var geometri-problem
 
-            self._progress(0.9, "Räknar rader...", on_progress)
-
-            result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-            rows_count = result[0] if result else 0
-
             self._log(f"Läste {rows_count} rader till raw.{table_name}", on_log)
             self._progress(1.0, f"Läste {rows_count} rader", on_progress)
 
@@ -261,6 +255,43 @@ class ZipGeoPackagePlugin(SourcePlugin):
             self._log(error_msg, on_log)
             return ExtractResult(success=False, message=error_msg)
 
+    def _extract_cached(
+        self,
+        zip_path: str,
+        on_log: Callable[[str], None] | None = None,
+        on_progress: Callable[[float, str], None] | None = None,
+    ) -> str:
+        """Extrahera zip-fil till temp-katalog, eller återanvänd tidigare extraktion.
+
+        Nyckeln är zip-filens fingeravtryck, så en oförändrad fil extraheras
+        bara en gång. Låset per zip-fil gör att parallella datasets som läser
+        samma fil väntar på samma extraktion istället för att skriva i egna kataloger.
+
+        Returns:
+            Sökväg till extraktionskatalogen.
+        """
+        key = _zip_fingerprint(zip_path)
+        with _get_url_lock(key):
+            extract_dir = _extract_dir_cache.get(key)
+            if extract_dir and Path(extract_dir).exists():
+                self._log("Använder tidigare extraherat arkiv", on_log)
+                self._progress(0.6, "Använder extraherat arkiv...", on_progress)
+                return extract_dir
+
+            self._log("Extraherar GeoPackage...", on_log)
+            self._progress(0.6, "Extraherar zip-arkiv...", on_progress)
+
+            extract_dir = tempfile.mkdtemp(prefix="g-etl-gpkg-")
+            try:
+                extract_zip(zip_path, extract_dir)
+            except Exception:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                raise
+
+            with _global_lock:
+                _extract_dir_cache[key] = extract_dir
+            return extract_dir
+
     def _read_with_pyogrio(
         self,
         conn: duckdb.DuckDBPyConnection,
@@ -307,16 +338,7 @@ class ZipGeoPackagePlugin(SourcePlugin):
             )
 
             # Ladda till DuckDB
-            conn.execute(f"DROP TABLE IF EXISTS raw.{table_name}")
-            conn.execute(
-                f"""
-                CREATE TABLE raw.{table_name} AS
-                SELECT
-                    * EXCLUDE ("{geom_col}"),
-                    ST_GeomFromWKB("{geom_col}") AS geom
-                FROM arrow_tbl
-            """
-            )
+            self._load_arrow_to_raw(conn, arrow_tbl, table_name, geom_col)
 
             return arrow_tbl.num_rows
 
@@ -1,50 +1,414 @@
 """Plugin för att ladda ner och läsa zippade Shapefile-filer."""
 
+import hashlib
+import json
+import os
+import shutil
 import tempfile
 import threading
+import time
 import zipfile
+from collections import OrderedDict
 from collections.abc import Callable
-from pathlib import Path
+from enum import StrEnum
+from pathlib import Path, PurePosixPath
 
 import duckdb
 import requests
 
-from g_etl.plugins.base import ExtractResult, SourcePlugin
+from g_etl.plugins.base import ExtractResult, SourcePlugin, quote_identifier
+from g_etl.settings import settings
+from g_etl.utils.archive import extract_zip
 from g_etl.utils.downloader import download_file_streaming, is_url
+from g_etl.utils.shapefile import GEOMETRY_COLUMN, read_shapefile
 
-# Modul-nivå cache för nedladdade och extraherade filer
-# Cache: URL -> (zip_path, extracted_dir_path)
-# Rensas via clear_shapefile_cache()
-_extract_cache: dict[str, tuple[str, str]] = {}
-_url_locks: dict[str, threading.Lock] = {}
+# Nedladdade zip-filer: URL -> temporär sökväg (delas mellan olika shp_filename)
+_download_cache: dict[str, str] = {}
 _global_lock = threading.Lock()
 
+# Senaste lyckade existenskontroll per extraktionskatalog (se _dir_exists)
+EXISTS_CHECK_TTL_SECONDS = 5.0
+_exists_checked: dict[str, float] = {}
+
+# Ett lås per URL (hålls under hela nedladdningen, så URL:er får inte dela lås)
+_url_locks: dict[str, threading.Lock] = {}
+
+# Persistent cache mellan körningar (om settings.SHAPEFILE_CACHE_PERSIST)
+# Manifest: cachenyckel -> {"extract_dir": ..., "validator": {...}}
+# Extraherade kataloger ligger i TEMP_DIR/shapefile_cache/<sha256(nyckel)[:16]>
+CACHE_DIR_NAME = "shapefile_cache"
+MANIFEST_NAME = "shapefile_cache.json"
+
+# RAM-baserat filsystem för temporära extraktioner (Linux)
+RAM_TEMP_DIR = Path("/dev/shm")
+
+# Andel av ledigt utrymme i RAM_TEMP_DIR som en extraktion får använda
+RAM_TEMP_MAX_FRACTION = 0.25
+
+# Under denna okomprimerade storlek extraheras på disk sekventiellt (64 MiB)
+PARALLEL_EXTRACT_MIN_BYTES = 64 * 1024 * 1024
+
+
+class ExtractStrategy(StrEnum):
+    """Hur ett arkiv extraheras, vald utifrån storlek innan något skrivs."""
+
+    RAM = "ram"  # Temp-katalog i RAM_TEMP_DIR
+    DISK = "disk"  # Temp-katalog på disk, sekventiellt
+    DISK_PARALLEL = "disk_parallel"  # På disk, parallella trådar
+
+
+def _cache_root() -> Path:
+    """Katalog för persistenta extraktioner."""
+    return settings.TEMP_DIR / CACHE_DIR_NAME
+
+
+def _manifest_path() -> Path:
+    """Sökväg till manifestet för den persistenta cachen."""
+    return settings.TEMP_DIR / MANIFEST_NAME
+
+
+def _load_manifest() -> dict:
+    """Läs manifestet (tom dict om det saknas eller är trasigt)."""
+    try:
+        data = json.loads(_manifest_path().read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict) -> None:
+    """Skriv manifestet atomiskt (temp-fil + os.replace)."""
+    path = _manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _source_validator(url: str) -> dict[str, str]:
+    """Hämta värden som avgör om en källa ändrats sedan den extraherades.
+
+    URL: ETag/Last-Modified/Content-Length via HEAD-anrop.
+    Lokal fil: mtime och storlek.
+
+    Returns:
+        Dict med valideringsvärden, tom om källan inte kan valideras.
+    """
+    if is_url(url):
+        try:
+            response = requests.head(url, timeout=30, allow_redirects=True)
+            response.raise_for_status()
+        except requests.RequestException:
+            return {}
+        validator = {
+            key: response.headers[header]
+            for key, header in (
+                ("etag", "ETag"),
+                ("last_modified", "Last-Modified"),
+                ("content_length", "Content-Length"),
+            )
+            if header in response.headers
+        }
+        # Utan ETag eller Last-Modified går det inte att lita på cachen
+        if "etag" not in validator and "last_modified" not in validator:
+            return {}
+        return validator
+
+    try:
+        stat = os.stat(url)
+    except OSError:
+        return {}
+    return {"mtime_ns": str(stat.st_mtime_ns), "size": str(stat.st_size)}
+
+
+def _dir_exists(path: str) -> bool:
+    """Kontrollera att en katalog finns, med kortlivad cache av positiva svar.
+
+    Cacheträffar i samma katalog kontrolleras annars med ett stat-anrop
+    varje gång. Borttagna kataloger upptäcks inom EXISTS_CHECK_TTL_SECONDS.
+    """
+    now = time.monotonic()
+    if now - _exists_checked.get(path, float("-inf")) < EXISTS_CHECK_TTL_SECONDS:
+        return True
+    if os.path.isdir(path):
+        _exists_checked[path] = now
+        return True
+    _exists_checked.pop(path, None)
+    return False
+
+
+def _is_persistent(extract_dir: str) -> bool:
+    """Kontrollera om en extraktionskatalog tillhör den persistenta cachen."""
+    return Path(extract_dir).parent == _cache_root()
+
+
+def _member_filter(wanted_basename: str | None) -> Callable[[str], bool] | None:
+    """Filter för zip-medlemmar med samma namnstam som wanted_basename."""
+    if not wanted_basename:
+        return None
+    stem = Path(wanted_basename).stem
+    return lambda name: PurePosixPath(name).stem == stem
+
+
+def _preflight(zip_path: str, member_filter: Callable[[str], bool] | None) -> tuple[int, int]:
+    """Läs arkivets centralkatalog och summera det som ska extraheras.
+
+    Matchar filtret inget räknas hela arkivet (då extraheras allt).
+
+    Returns:
+        Tuple av (okomprimerad storlek i bytes, antal filer).
+    """
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+    if member_filter is not None:
+        wanted = [info for info in infos if member_filter(info.filename)]
+        infos = wanted or infos
+    return sum(info.file_size for info in infos), len(infos)
+
+
+def _fits_in_ram(total_bytes: int) -> bool:
+    """Kontrollera om en extraktion får plats i RAM_TEMP_DIR.
+
+    Kräver att storleken understiger SHAPEFILE_RAM_EXTRACT_MAX_MB och en
+    fjärdedel av det lediga utrymmet där.
+    """
+    max_bytes = settings.SHAPEFILE_RAM_EXTRACT_MAX_MB * 1024 * 1024
+    if not (0 < total_bytes <= max_bytes and RAM_TEMP_DIR.is_dir()):
+        return False
+    try:
+        return total_bytes <= shutil.disk_usage(RAM_TEMP_DIR).free * RAM_TEMP_MAX_FRACTION
+    except OSError:
+        return False
+
+
+def _choose_extract_strategy(
+    total_bytes: int, n_members: int, allow_ram: bool = True
+) -> ExtractStrategy:
+    """Välj extraktionsstrategi utifrån arkivets storlek och antal filer.
+
+    Args:
+        total_bytes: Okomprimerad storlek för filerna som ska extraheras.
+        n_members: Antal filer som ska extraheras.
+        allow_ram: False när målkatalogen redan är bestämd (persistent cache).
+    """
+    if allow_ram and _fits_in_ram(total_bytes):
+        return ExtractStrategy.RAM
+    if n_members > 1 and total_bytes >= PARALLEL_EXTRACT_MIN_BYTES:
+        return ExtractStrategy.DISK_PARALLEL
+    return ExtractStrategy.DISK
+
+
+def _cache_key(url: str, wanted_basename: str | None = None) -> str:
+    """Cachenyckel för en källa, per shapefile när bara en extraheras."""
+    if not wanted_basename:
+        return url
+    return f"{url}#{Path(wanted_basename).stem}"
+
 
 def _get_url_lock(url: str) -> threading.Lock:
-    """Hämta (eller skapa) ett lås för en specifik URL."""
-    with _global_lock:
-        if url not in _url_locks:
-            _url_locks[url] = threading.Lock()
-        return _url_locks[url]
+    """Hämta (eller skapa) låset för en specifik URL.
+
+    Inte en fast pool av hashade lås: låset hålls under hela nedladdningen,
+    så en orelaterad URL som hamnar på samma lås skulle vänta på den.
+    dict.setdefault är atomisk, så ingen global låsning behövs: trådar som
+    samtidigt missar får alla tillbaka låset som hamnade först i dict:en.
+    """
+    lock = _url_locks.get(url)
+    if lock is None:
+        lock = _url_locks.setdefault(url, threading.Lock())
+    return lock
+
+
+def _discard_entries(entries: list[tuple[str, tuple[str, str]]], purge_persistent: bool) -> None:
+    """Ta bort extraktionskataloger för poster som lämnat cachen.
+
+    Temporära kataloger tas alltid bort. Persistenta tas bara bort (och
+    rensas ur manifestet) med purge_persistent, annars valideras de om
+    via manifestet nästa gång de efterfrågas.
+    """
+    purged_keys = []
+    for key, (_zip_path, extract_dir) in entries:
+        _exists_checked.pop(extract_dir, None)
+        if _is_persistent(extract_dir):
+            if not purge_persistent:
+                continue
+            purged_keys.append(key)
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+    if purged_keys:
+        with _global_lock:
+            manifest = _load_manifest()
+            for key in purged_keys:
+                manifest.pop(key, None)
+            _save_manifest(manifest)
+
+
+class _ExtractCache:
+    """LRU-cache för extraktioner: nyckel -> (zip_path, extract_dir).
+
+    Max SHAPEFILE_CACHE_MAX_ENTRIES poster (0 = obegränsat); den minst
+    nyligen använda posten och dess katalog tas bort när gränsen nås.
+    Med SHAPEFILE_CACHE_TTL_SECONDS räknas äldre poster som saknade.
+
+    En post som hämtas eller läggs in med pin=True är låst mot borttagning
+    tills release() anropas. Pinnade poster hoppas över vid LRU-utkastning
+    (cachen kan då tillfälligt överskrida gränsen), och en pinnad katalog
+    som lämnar cachen (TTL, rensning) tas bort först när sista läsaren
+    släppt den.
+    """
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[str, tuple[tuple[str, str], float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # extract_dir -> antal pågående läsningar
+        self._pins: dict[str, int] = {}
+        # extract_dir -> (nyckel, post, purge_persistent) som tas bort vid sista release
+        self._retired: dict[str, tuple[str, tuple[str, str], bool]] = {}
+
+    def _pin(self, entry: tuple[str, str]) -> None:
+        self._pins[entry[1]] = self._pins.get(entry[1], 0) + 1
+
+    def _retire(
+        self, entries: list[tuple[str, tuple[str, str]]], purge_persistent: bool
+    ) -> list[tuple[str, tuple[str, str]]]:
+        """Skjut upp borttagning av pinnade poster, returnera övriga (anropas med låset)."""
+        discard = []
+        for key, entry in entries:
+            if entry[1] in self._pins:
+                self._retired[entry[1]] = (key, entry, purge_persistent)
+            else:
+                discard.append((key, entry))
+        return discard
+
+    def get(self, key: str, pin: bool = False) -> tuple[str, str] | None:
+        """Hämta en post och markera den som senast använd.
+
+        Args:
+            key: Cachenyckel.
+            pin: Lås posten mot borttagning (släpps med release()).
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, added = item
+            ttl = settings.SHAPEFILE_CACHE_TTL_SECONDS
+            if not ttl or time.monotonic() - added <= ttl:
+                self._entries.move_to_end(key)
+                if pin:
+                    self._pin(entry)
+                return entry
+            del self._entries[key]
+            expired = self._retire([(key, entry)], purge_persistent=False)
+        _discard_entries(expired, purge_persistent=False)
+        return None
+
+    def put(self, key: str, entry: tuple[str, str], pin: bool = False) -> None:
+        """Lägg in en post, ev. pinnad, och kasta ut opinnade poster över gränsen."""
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic())
+            self._entries.move_to_end(key)
+            if pin:
+                self._pin(entry)
+            max_entries = settings.SHAPEFILE_CACHE_MAX_ENTRIES
+            excess = len(self._entries) - max_entries if max_entries else 0
+            evicted = []
+            if excess > 0:
+                # Äldst först, hoppa över pinnade poster och den nya posten
+                for old_key, (old_entry, _added) in self._entries.items():
+                    if old_key != key and old_entry[1] not in self._pins:
+                        evicted.append((old_key, old_entry))
+                        if len(evicted) == excess:
+                            break
+                for old_key, _old_entry in evicted:
+                    del self._entries[old_key]
+        # Katalogerna tas bort utanför låset
+        _discard_entries(evicted, purge_persistent=True)
+
+    def __setitem__(self, key: str, entry: tuple[str, str]) -> None:
+        self.put(key, entry)
+
+    def release(self, entry: tuple[str, str]) -> None:
+        """Släpp en pin; tar bort katalogen om posten lämnat cachen under läsningen."""
+        extract_dir = entry[1]
+        with self._lock:
+            count = self._pins.get(extract_dir, 0) - 1
+            if count > 0:
+                self._pins[extract_dir] = count
+                return
+            self._pins.pop(extract_dir, None)
+            retired = self._retired.pop(extract_dir, None)
+        if retired is not None:
+            key, retired_entry, purge_persistent = retired
+            _discard_entries([(key, retired_entry)], purge_persistent)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def values(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return [entry for entry, _added in self._entries.values()]
+
+    def clear(self) -> None:
+        self.pop_all()
+
+    def pop_all(self) -> list[tuple[str, tuple[str, str]]]:
+        """Töm cachen och returnera de poster som kan tas bort direkt.
+
+        Pinnade poster tas bort när de släpps.
+        """
+        with self._lock:
+            entries = [(key, entry) for key, (entry, _added) in self._entries.items()]
+            self._entries.clear()
+            return self._retire(entries, purge_persistent=False)
+
+
+def _usable_entry(key: str, pin: bool = False) -> tuple[str, str] | None:
+    """Cachad post vars katalog finns kvar (pinnad om pin), annars None."""
+    entry = _extract_cache.get(key, pin=pin)
+    if entry is None or _dir_exists(entry[1]):
+        return entry
+    if pin:
+        _extract_cache.release(entry)
+    return None
+
+
+# Modul-nivå cache för extraherade filer
+# Nyckel: URL, ev. med "#<shapefile-namn>" (se _cache_key)
+# zip_path är tom sträng när zip-filen inte finns tillgänglig (persistent träff)
+# Rensas via clear_shapefile_cache()
+_extract_cache = _ExtractCache()
 
 
-def clear_shapefile_cache() -> None:
-    """Rensa nedladdningscachen och ta bort temporära filer."""
-    global _extract_cache, _url_locks
-    import shutil
+def clear_shapefile_cache(include_persistent: bool = False) -> None:
+    """Rensa nedladdningscachen och ta bort temporära filer.
 
+    Persistenta extraktioner (se SHAPEFILE_CACHE_PERSIST) behålls så att
+    nästa körning kan återanvända dem.
+
+    Args:
+        include_persistent: Ta även bort persistenta extraktioner och manifestet.
+    """
+    # Ta en ögonblicksbild och töm cacherna under låset, men gör
+    # filsystemsarbetet efteråt så att andra trådar inte blockeras
     with _global_lock:
-        for url, (zip_path, extract_dir) in _extract_cache.items():
-            try:
-                Path(zip_path).unlink(missing_ok=True)
-            except Exception:
-                pass
-            try:
-                shutil.rmtree(extract_dir, ignore_errors=True)
-            except Exception:
-                pass
-        _extract_cache.clear()
+        downloads = list(_download_cache.values())
+        _download_cache.clear()
         _url_locks.clear()
+        entries = _extract_cache.pop_all()
+        if include_persistent:
+            _manifest_path().unlink(missing_ok=True)
+
+    for zip_path in downloads:
+        try:
+            Path(zip_path).unlink(missing_ok=True)
+        except Exception:
+            pass
+
+    _discard_entries(entries, purge_persistent=False)
+
+    if include_persistent:
+        shutil.rmtree(_cache_root(), ignore_errors=True)
 
 
 class ZipShapefilePlugin(SourcePlugin):
@@ -58,69 +422,193 @@ class ZipShapefilePlugin(SourcePlugin):
     def name(self) -> str:
         return "zip_shapefile"
 
+    def _download(
+        self,
+        url: str,
+        on_log: Callable[[str], None] | None = None,
+        on_progress: Callable[[float, str], None] | None = None,
+    ) -> str:
+        """Ladda ner zip-filen (en gång per URL) eller returnera lokal sökväg.
+
+        Anropas med URL-låset taget.
+        """
+        if not is_url(url):
+            if not Path(url).exists():
+                raise FileNotFoundError(f"Filen finns inte: {url}")
+            return url
+
+        zip_path = _download_cache.get(url)
+        if zip_path and Path(zip_path).exists():
+            return zip_path
+
+        # Använd centraliserad downloader för URL:er
+        downloaded_path = download_file_streaming(
+            url=url,
+            suffix=".zip",
+            timeout=300,
+            on_log=on_log,
+            on_progress=on_progress,
+            progress_weight=0.5,
+        )
+        zip_path = str(downloaded_path)
+        _download_cache[url] = zip_path
+        return zip_path
+
+    def _cached_entry(
+        self,
+        url: str,
+        key: str,
+        on_log: Callable[[str], None] | None = None,
+        pin: bool = False,
+    ) -> tuple[tuple[str, str] | None, dict[str, str]]:
+        """Slå upp en extraktion i minnet eller i den persistenta cachen.
+
+        Anropas med URL-låset taget. Med pin är en hittad post pinnad.
+
+        Returns:
+            Tuple av (cachad post eller None, källans validator).
+        """
+        entry = _usable_entry(key, pin)
+        if entry is not None:
+            self._log("Använder cachad nedladdning", on_log)
+            return entry, {}
+
+        # Kolla persistent cache från tidigare körningar
+        persist = settings.SHAPEFILE_CACHE_PERSIST
+        validator = _source_validator(url) if persist else {}
+        if validator:
+            with _global_lock:
+                stored = _load_manifest().get(key)
+            if (
+                stored
+                and stored.get("validator") == validator
+                and Path(stored["extract_dir"]).exists()
+            ):
+                self._log("Använder extraktion från tidigare körning", on_log)
+                entry = ("", stored["extract_dir"])
+                _extract_cache.put(key, entry, pin=pin)
+                return entry, validator
+
+        return None, validator
+
+    def prefetch(
+        self,
+        config: dict,
+        on_log: Callable[[str], None] | None = None,
+    ) -> None:
+        """Ladda ner zip-filen i förväg om ingen användbar extraktion finns."""
+        url = config.get("url")
+        if not url or not is_url(url):
+            return
+        key = _cache_key(url, config.get("shp_filename"))
+        try:
+            with _get_url_lock(url):
+                entry, _validator = self._cached_entry(url, key)
+                if entry is None:
+                    self._download(url)
+        except Exception:
+            # extract() försöker igen och rapporterar felet
+            pass
+
     def _download_and_extract(
         self,
         url: str,
         on_log: Callable[[str], None] | None = None,
         on_progress: Callable[[float, str], None] | None = None,
+        wanted_basename: str | None = None,
+        pin: bool = False,
     ) -> tuple[str, str]:
         """Ladda ner och extrahera zip-fil (med cache).
 
+        Med wanted_basename extraheras bara filer med samma namnstam
+        (t.ex. lager.shp/.dbf/.shx/.prj/.cpg), inte resten av arkivet.
+        Matchar inget extraheras hela arkivet så att felmeddelandet kan
+        lista tillgängliga shapefiles.
+
+        Med pin är den returnerade posten pinnad i cachen så att katalogen
+        inte tas bort under läsningen; anroparen släpper den med
+        _extract_cache.release().
+
         Returns:
             Tuple av (zip_path, extract_dir)
         """
-        # Kolla om redan cachad
-        if url in _extract_cache:
-            zip_path, extract_dir = _extract_cache[url]
-            if Path(extract_dir).exists():
-                self._log("Använder cachad nedladdning", on_log)
-                return zip_path, extract_dir
-
-        # Skaffa lås för denna URL
-        url_lock = _get_url_lock(url)
-
-        with url_lock:
-            # Dubbelkolla efter att vi fått låset
-            if url in _extract_cache:
-                zip_path, extract_dir = _extract_cache[url]
-                if Path(extract_dir).exists():
-                    self._log("Använder cachad nedladdning", on_log)
-                    return zip_path, extract_dir
+        key = _cache_key(url, wanted_basename)
+
+        # Snabbväg utan URL-låset: _extract_cache.get tar bara cachens eget
+        # korta lås. En post som passerat TTL tas bort (katalogen raderas
+        # först när ingen läsare har den pinnad) och räknas som miss.
+        entry = _usable_entry(key, pin)
+        if entry is not None:
+            self._log("Använder cachad nedladdning", on_log)
+            return entry
+
+        with _get_url_lock(url):
+            # Dubbelkolla efter att vi fått låset (auktoritativ kontroll)
+            entry, validator = self._cached_entry(url, key, on_log, pin)
+            if entry is not None:
+                return entry
 
             # Ladda ner eller använd lokal fil
-            if is_url(url):
-                # Använd centraliserad downloader för URL:er
-                downloaded_path = download_file_streaming(
-                    url=url,
-                    suffix=".zip",
-                    timeout=300,
-                    on_log=on_log,
-                    on_progress=on_progress,
-                    progress_weight=0.5,
-                )
-                zip_path = str(downloaded_path)
-            else:
-                # Lokal fil
-                zip_path = url
-                if not Path(zip_path).exists():
-                    raise FileNotFoundError(f"Filen finns inte: {zip_path}")
+            zip_path = self._download(url, on_log, on_progress)
+            member_filter = _member_filter(wanted_basename)
+
+            # Välj strategi innan något skrivs till disk
+            total_bytes, n_members = _preflight(zip_path, member_filter)
+            strategy = _choose_extract_strategy(total_bytes, n_members, allow_ram=not validator)
+            workers = 1 if strategy == ExtractStrategy.DISK else settings.MAX_CONCURRENT_EXTRACTS
 
             self._log("Extraherar zip-arkiv...", on_log)
             self._progress(0.5, "Extraherar...", on_progress)
 
-            # Extrahera till permanent temp-katalog (behålls tills cache rensas)
-            extract_dir = tempfile.mkdtemp(prefix="g_etl_shp_")
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                zf.extractall(extract_dir)
+            if validator:
+                # Stabil katalog per nyckel så att nästa körning hittar den
+                key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+                extract_dir = str(_cache_root() / key_hash)
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                Path(extract_dir).mkdir(parents=True)
+            elif strategy == ExtractStrategy.RAM:
+                # Temp-katalog i RAM (behålls tills cache rensas)
+                extract_dir = tempfile.mkdtemp(prefix="g_etl_shp_", dir=RAM_TEMP_DIR)
+            else:
+                # Extrahera till temp-katalog (behålls tills cache rensas)
+                extract_dir = tempfile.mkdtemp(prefix="g_etl_shp_")
+
+            extracted = []
+            if member_filter is not None:
+                extracted = extract_zip(
+                    zip_path, extract_dir, max_workers=workers, member_filter=member_filter
+                )
+            if not extracted:
+                extract_zip(zip_path, extract_dir, max_workers=workers)
+
+            if validator:
+                with _global_lock:
+                    manifest = _load_manifest()
+                    manifest[key] = {"extract_dir": extract_dir, "validator": validator}
+                    _save_manifest(manifest)
 
-            # Spara i cache
-            _extract_cache[url] = (zip_path, extract_dir)
+            entry = (zip_path, extract_dir)
+            _extract_cache.put(key, entry, pin=pin)
 
-            return zip_path, extract_dir
+            return entry
 
     def _list_shapefiles(self, extract_dir: str) -> list[Path]:
-        """Lista alla shapefiles i extraherad katalog."""
-        return sorted(Path(extract_dir).rglob("*.shp"))
+        """Lista alla shapefiles i extraherad katalog.
+
+        Går igenom katalogträdet med os.scandir, som använder typinformationen
+        från katalogposterna istället för ett stat-anrop per fil.
+        """
+        found: list[Path] = []
+        stack = [extract_dir]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".shp"):
+                        found.append(Path(entry.path))
+        found.sort()
+        return found
 
     def extract(
         self,
@@ -136,18 +624,25 @@ class ZipShapefilePlugin(SourcePlugin):
             id: Tabellnamn i DuckDB
             shp_filename: Specifik .shp-fil att läsa (krävs om flera finns)
             encoding: Teckenkodning för DBF-filen (default: LATIN1)
+            columns: Attributkolumner att läsa (default: alla), geometrin läses alltid
         """
         url = config.get("url")
         table_name = config.get("id")
         shp_filename = config.get("shp_filename")
         encoding = config.get("encoding", "LATIN1")
+        columns = config.get("columns")
 
         if not url:
             return ExtractResult(success=False, message="Saknar url i config")
 
+        entry = None
         try:
-            # Ladda ner och extrahera (använder cache)
-            zip_path, extract_dir = self._download_and_extract(url, on_log, on_progress)
+            # Ladda ner och extrahera (använder cache). Posten pinnas så att
+            # katalogen inte kastas ut ur cachen medan den läses.
+            entry = self._download_and_extract(
+                url, on_log, on_progress, wanted_basename=shp_filename, pin=True
+            )
+            zip_path, extract_dir = entry
 
             # Lista tillgängliga shapefiles
             available_shapefiles = self._list_shapefiles(extract_dir)
@@ -175,57 +670,70 @@ class ZipShapefilePlugin(SourcePlugin):
 
             # Hitta rätt shapefile
             if shp_filename:
-                # Sök efter specifik fil
-                matching = [shp for shp in available_shapefiles if shp.name == shp_filename]
-                if not matching:
-                    # Prova att söka rekursivt med bara filnamnet
-                    matching = [shp for shp in available_shapefiles if shp.name == shp_filename]
-                if not matching:
-                    available_names = [shp.name for shp in available_shapefiles]
+                # Slå upp på filnamn (första träffen vinner vid dubbletter i underkataloger)
+                shp_by_name: dict[str, Path] = {}
+                for shp in available_shapefiles:
+                    shp_by_name.setdefault(shp.name, shp)
+                # Tillåt även sökväg i shp_filename (matcha på bara filnamnet)
+                shp_path = shp_by_name.get(Path(shp_filename).name)
+                if shp_path is None:
                     return ExtractResult(
                         success=False,
                         message=f"Shapefile '{shp_filename}' finns inte. "
-                        f"Tillgängliga: {', '.join(available_names)}",
+                        f"Tillgängliga: {', '.join(shp_by_name)}",
                     )
-                shp_path = matching[0]
             else:
                 shp_path = available_shapefiles[0]
 
             # Kontrollera kompanjonsfiler
+            # (en katalogläsning istället för ett stat-anrop per fil)
             required_companions = [".dbf", ".shx"]
-            missing = [ext for ext in required_companions if not shp_path.with_suffix(ext).exists()]
+            with os.scandir(shp_path.parent) as entries:
+                sibling_names = {entry.name for entry in entries}
+            missing = [
+                ext for ext in required_companions if f"{shp_path.stem}{ext}" not in sibling_names
+            ]
             if missing:
                 self._log(f"Varning: saknar kompanjonsfiler: {missing}", on_log)
 
             self._log(f"Läser {shp_path.name}...", on_log)
             self._progress(0.6, f"Läser {shp_path.name}...", on_progress)
 
+            # Läs bara valda attributkolumner (plus geometri) om columns angetts
+            if columns:
+                select_list = ", ".join(quote_identifier(c) for c in [*columns, "geom"])
+            else:
+                select_list = "*"
+
             # Försök läsa med DuckDB ST_Read först
             try:
-                conn.execute(f"""
-                    CREATE OR REPLACE TABLE raw.{table_name} AS
-                    SELECT * FROM ST_Read('{shp_path}')
-                """)
+                rows_count = self._create_raw_table(
+                    conn, table_name, f"SELECT {select_list} FROM ST_Read(?)", [str(shp_path)]
+                )
             except Exception as st_read_error:
                 # Fallback: Använd pyogrio för encoding-problem
                 self._log("DuckDB ST_Read misslyckades, testar pyogrio...", on_log)
                 rows_count = self._read_with_pyogrio(
-                    conn, shp_path, table_name, encoding, on_log, on_progress
+                    conn, shp_path, table_name, encoding, on_log, on_progress, columns
                 )
+                reader = "pyogrio"
+                if rows_count is None:
+                    rows_count = self._read_with_builtin_reader(
+                        conn, shp_path, table_name, encoding, on_log, on_progress, columns
+                    )
+                    reader = "inbyggd läsare"
                 if rows_count is not None:
+                    self._create_spatial_index(conn, table_name, on_log)
                     self._log(f"Läste {rows_count} rader till raw.{table_name}", on_log)
                     self._progress(1.0, f"Läste {rows_count} rader", on_progress)
                     return ExtractResult(
                         success=True,
                         rows_count=rows_count,
-                        message=f"Läste {rows_count} rader från {shp_path.name} (pyogrio)",
+                        message=f"Läste {rows_count} rader från {shp_path.name} ({reader})",
                     )
                 raise st_read_error
 
-            self._progress(0.9, "Räknar rader...", on_progress)
-
-            result = conn.execute(f"SELECT COUNT(*) FROM raw.{table_name}").fetchone()
-            rows_count = result[0] if result else 0
+            self._create_spatial_index(conn, table_name, on_log)
 
             self._log(f"Läste {rows_count} rader till raw.{table_name}", on_log)
             self._progress(1.0, f"Läste {rows_count} rader", on_progress)
@@ -248,6 +756,31 @@ class ZipShapefilePlugin(SourcePlugin):
             error_msg = f"Fel vid läsning av Shapefile: {e}"
             self._log(error_msg, on_log)
             return ExtractResult(success=False, message=error_msg)
+        finally:
+            if entry is not None:
+                _extract_cache.release(entry)
+
+    def _create_spatial_index(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        table_name: str,
+        on_log: Callable[[str], None] | None = None,
+    ) -> None:
+        """Skapa R-tree-index på geom-kolumnen (om SHAPEFILE_AUTO_INDEX).
+
+        Kräver en spatial-extension med RTREE-stöd. Misslyckas indexet
+        loggas det bara, tabellen är redan laddad.
+        """
+        if not settings.SHAPEFILE_AUTO_INDEX:
+            return
+        index_name = quote_identifier(f"idx_{table_name}_geom")
+        try:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON raw.{quote_identifier(table_name)} USING RTREE (geom)"
+            )
+        except Exception as e:
+            self._log(f"Kunde inte skapa spatialt index: {e}", on_log)
 
     def _read_with_pyogrio(
         self,
@@ -257,6 +790,7 @@ class ZipShapefilePlugin(SourcePlugin):
         encoding: str,
         on_log: Callable[[str], None] | None = None,
         on_progress: Callable[[float, str], None] | None = None,
+        columns: list[str] | None = None,
     ) -> int | None:
         """Läs Shapefile med pyogrio (fallback för encoding-problem).
 
@@ -269,7 +803,9 @@ class ZipShapefilePlugin(SourcePlugin):
             self._log(f"Läser med pyogrio (encoding={encoding})...", on_log)
             self._progress(0.7, "Läser med pyogrio...", on_progress)
 
-            meta, arrow_tbl = pyogrio.read_arrow(str(shp_path), encoding=encoding)
+            meta, arrow_tbl = pyogrio.read_arrow(
+                str(shp_path), encoding=encoding, columns=columns, read_geometry=True
+            )
 
             # Hitta geometrikolumn
             geom_cols = meta.get("geometry_columns", [])
@@ -278,16 +814,7 @@ class ZipShapefilePlugin(SourcePlugin):
             self._log("Laddar in i DuckDB...", on_log)
             self._progress(0.9, "Laddar in i DuckDB...", on_progress)
 
-            conn.execute(f"DROP TABLE IF EXISTS raw.{table_name}")
-            conn.execute(
-                f"""
-                CREATE TABLE raw.{table_name} AS
-                SELECT
-                    * EXCLUDE ("{geom_col}"),
-                    ST_GeomFromWKB("{geom_col}") AS geom
-                FROM arrow_tbl
-            """
-            )
+            self._load_arrow_to_raw(conn, arrow_tbl, table_name, geom_col)
 
             return arrow_tbl.num_rows
 
@@ -297,3 +824,35 @@ class ZipShapefilePlugin(SourcePlugin):
         except Exception as e:
             self._log(f"Pyogrio-fallback misslyckades: {e}", on_log)
             return None
+
+    def _read_with_builtin_reader(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        shp_path: Path,
+        table_name: str,
+        encoding: str,
+        on_log: Callable[[str], None] | None = None,
+        on_progress: Callable[[float, str], None] | None = None,
+        columns: list[str] | None = None,
+    ) -> int | None:
+        """Läs Shapefile med den inbyggda läsaren (sista fallback utan pyogrio).
+
+        Returns:
+            Antal rader eller None vid fel.
+        """
+        try:
+            self._log(f"Läser med inbyggd läsare (encoding={encoding})...", on_log)
+            self._progress(0.7, "Läser med inbyggd läsare...", on_progress)
+
+            arrow_tbl = read_shapefile(shp_path, encoding=encoding, columns=columns)
+
+            self._log("Laddar in i DuckDB...", on_log)
+            self._progress(0.9, "Laddar in i DuckDB...", on_progress)
+
+            self._load_arrow_to_raw(conn, arrow_tbl, table_name, GEOMETRY_COLUMN)
+
+            return arrow_tbl.num_rows
+
+        except Exception as e:
+            self._log(f"Inbyggd läsare misslyckades: {e}", on_log)
+            return None
@@ -1,7 +1,9 @@
 """Pipeline runner service för Admin TUI."""
 
 import asyncio
+import re
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -10,7 +12,10 @@ import duckdb
 from g_etl.migrations.migrator import Migrator
 from g_etl.plugins import clear_download_cache, get_plugin
 from g_etl.settings import settings
-from g_etl.sql_generator import SQLGenerator
+from g_etl.sql_generator import SQLGenerator, TemplateKind
+
+# Post-pipeline SQL-filer i migrations-roten (x01_..., x02_...)
+_POST_PIPELINE_SQL_RE = re.compile(r"^x\d+")
 
 
 @dataclass
@@ -100,9 +105,10 @@ class PipelineRunner:
         Returns:
             Lista med enskilda SQL-statements
         """
-        # Stoppa vid migrate:down (kör bara "up" migrationer)
-        if "-- migrate:down" in sql_content:
-            sql_content = sql_content.split("-- migrate:down")[0]
+        # Stoppa vid migrate:down (kör bara "up" migrationer) - ett find, ingen split
+        down_idx = sql_content.find("-- migrate:down")
+        if down_idx >= 0:
+            sql_content = sql_content[:down_idx]
 
         statements = []
         current_stmt = []
@@ -403,6 +409,18 @@ class PipelineRunner:
                         )
                     return (dataset_id, None, result.message)
 
+        # Förhämta källfiler i en separat I/O-pool, så att datasets som väntar
+        # på en plats i semaforen laddar ner medan andra extraherar
+        prefetch_pool = ThreadPoolExecutor(
+            max_workers=concurrent, thread_name_prefix="g-etl-prefetch"
+        )
+        for config in dataset_configs:
+            try:
+                plugin = get_plugin(config.get("plugin", ""))
+            except ValueError:
+                continue
+            prefetch_pool.submit(plugin.prefetch, config, on_log)
+
         # Kör alla extraktioner parallellt (med spårade tasks)
         self._tasks = [asyncio.create_task(extract_one(config)) for config in dataset_configs]
 
@@ -419,6 +437,12 @@ class PipelineRunner:
                         pass
         finally:
             self._tasks = []
+            # Förhämtningar som inte hunnit starta behövs inte längre; vänta in
+            # pågående så att cachen nedan inte fylls på efter rensningen
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(
+                None, lambda: prefetch_pool.shutdown(wait=True, cancel_futures=True)
+            )
 
         # Filtrera bort exceptions/cancelled
         valid_results = [r for r in results if isinstance(r, tuple) and len(r) == 3]
@@ -731,11 +755,10 @@ class PipelineRunner:
         run_staging, run_mart = phases if phases else (True, True)
         result = []
         for t in templates:
-            t_lower = t.filename.lower()
-            if "_staging_" in t_lower:
+            if t.kind == TemplateKind.STAGING:
                 if run_staging:
                     result.append(t)
-            elif "_mart_" in t_lower:
+            elif t.kind == TemplateKind.MART:
                 if run_mart:
                     result.append(t)
             else:
@@ -1170,8 +1193,6 @@ GROUP BY h3_cell;
         Returns:
             True om alla kördes framgångsrikt
         """
-        import re
-
         conn = self._get_connection()
         migrations_dir = self.sql_path / "migrations"
 
@@ -1194,7 +1215,7 @@ GROUP BY h3_cell;
 
         # 3. Post-pipeline x*.sql filer
         for f in sorted(migrations_dir.glob("x*.sql")):
-            if f.parent == migrations_dir and re.match(r"^x\d+", f.name):
+            if f.parent == migrations_dir and _POST_PIPELINE_SQL_RE.match(f.name):
                 all_sql_files.append(f)
 
         if not all_sql_files:
@@ -9,14 +9,17 @@ Prioritetsordning:
 3. Standardvärden i denna fil
 """
 
+import functools
 import os
 from pathlib import Path
+from typing import Final
 
 import yaml
 
 
+@functools.cache
 def _cpu_count() -> int:
-    """Hämta antal CPU-kärnor med fallback."""
+    """Hämta antal CPU-kärnor med fallback (beräknas en gång per process)."""
     return os.cpu_count() or 4
 
 
@@ -41,8 +44,36 @@ class Settings:
 
     Konfigurerbara värden laddas från config/config.yml.
     Infrastrukturkonstanter definieras som klassattribut.
+
+    Instansattributen ligger i __slots__ (ingen __dict__ per instans). Klassen
+    är inte frozen eftersom t.ex. QGIS-pluginet pekar om sökvägarna i runtime.
     """
 
+    __slots__ = (
+        "DATA_DIR",
+        "INPUT_DATA_DIR",
+        "LOGS_DIR",
+        "SQL_DIR",
+        "CONFIG_DIR",
+        "DB_PREFIX",
+        "DB_KEEP_COUNT",
+        "H3_RESOLUTION",
+        "H3_POLYFILL_RESOLUTION",
+        "H3_LINE_RESOLUTION",
+        "H3_POINT_RESOLUTION",
+        "H3_LINE_BUFFER_METERS",
+        "MAX_CONCURRENT_EXTRACTS",
+        "MAX_CONCURRENT_SQL",
+        "EXTRACT_TIMEOUT_SECONDS",
+        "SHAPEFILE_CACHE_PERSIST",
+        "SHAPEFILE_CACHE_MAX_ENTRIES",
+        "SHAPEFILE_CACHE_TTL_SECONDS",
+        "SHAPEFILE_RAM_EXTRACT_MAX_MB",
+        "SHAPEFILE_AUTO_INDEX",
+        "SOURCE_CRS",
+        "TARGET_CRS",
+    )
+
     # === Infrastrukturkonstanter (ej konfigurerbara) ===
     DB_EXTENSION: str = ".duckdb"
     DUCKDB_EXTENSIONS: list[str] = ["spatial", "parquet", "httpfs", "json", "h3"]
@@ -54,14 +85,16 @@ class Settings:
     )
     PROJ4_WGS84: str = "+proj=longlat +datum=WGS84 +no_defs"
 
-    SQL_DIR: Path = Path("sql")
     SQL_INIT_DIR: Path = Path("sql/_init")
-    CONFIG_DIR: Path = Path("config")
 
     def __init__(self, config_path: Path | None = None):
         cfg = _load_config(config_path)
         h3 = cfg.get("h3", {}) if isinstance(cfg.get("h3"), dict) else {}
 
+        # Projektkataloger (instansattribut så att de kan pekas om, t.ex. i QGIS)
+        self.SQL_DIR: Path = Path("sql")
+        self.CONFIG_DIR: Path = Path("config")
+
         # === Sökvägar ===
         # Prioritet: miljövariabel > config.yml > default
         env_data_dir = os.environ.get("G_ETL_DATA_DIR")
@@ -89,6 +122,16 @@ class Settings:
         self.MAX_CONCURRENT_EXTRACTS: int = cfg.get("max_concurrent_extracts", _cpu_count())
         self.MAX_CONCURRENT_SQL: int = cfg.get("max_concurrent_sql", max(2, _cpu_count() // 2))
         self.EXTRACT_TIMEOUT_SECONDS: int = cfg.get("extract_timeout_seconds", 300)
+        # Spara extraherade shapefile-zip:ar mellan körningar (TEMP_DIR/shapefile_cache).
+        # Opt-in: kostar ett HEAD-anrop per cachemiss och stänger av RAM-extrahering
+        self.SHAPEFILE_CACHE_PERSIST: bool = cfg.get("shapefile_cache_persist", False)
+        # Max antal extraktioner i minnescachen (LRU, 0 = obegränsat) och max ålder
+        self.SHAPEFILE_CACHE_MAX_ENTRIES: int = cfg.get("shapefile_cache_max_entries", 16)
+        self.SHAPEFILE_CACHE_TTL_SECONDS: int = cfg.get("shapefile_cache_ttl_seconds", 0)
+        # Extrahera mindre shapefile-zip:ar till RAM (/dev/shm), 0 = avstängt
+        self.SHAPEFILE_RAM_EXTRACT_MAX_MB: int = cfg.get("shapefile_ram_extract_max_mb", 512)
+        # Skapa R-tree-index på geom i raw-tabeller från shapefiles
+        self.SHAPEFILE_AUTO_INDEX: bool = cfg.get("shapefile_auto_index", True)
 
         # === Koordinatsystem ===
         self.SOURCE_CRS: str = cfg.get("source_crs", "EPSG:3006")
@@ -172,4 +215,4 @@ class Settings:
 
 
 # Singleton-instans
-settings = Settings()
+settings: Final[Settings] = Settings()
@@ -25,11 +25,140 @@ Användning:
     )
 """
 
+import dataclasses
+import functools
+import os
+import re
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from enum import IntEnum
 from pathlib import Path
 
 from g_etl.settings import settings
 
+# {{ variabel }} eller {{variabel}} - grupp 1 = hela platshållaren, grupp 2 = namnet
+_PLACEHOLDER_RE = re.compile(r"(\{\{ ?(\w+) ?\}\})")
+
+# Kompilerad template: statiska delar och (namn, originaltext) per platshållare.
+# len(statics) == len(placeholders) + 1
+CompiledTemplate = tuple[list[str], list[tuple[str, str]]]
+
+# Markörer för migrationssektioner i template-filer
+_MIGRATE_UP = b"-- migrate:up"
+_MIGRATE_DOWN = b"-- migrate:down"
+
+# Max antal trådar när templates läses in i förväg (preload)
+PRELOAD_MAX_WORKERS = 8
+
+# data_1_expr..data_5_expr finns alltid, tomma om de inte mappas
+_DEFAULT_DATA_EXPRS = {f"data_{i}_expr": "''" for i in range(1, 6)}
+
+
+def _compile_template(template: str) -> CompiledTemplate:
+    """Dela upp en template i statiska delar och platshållare (ett regex-pass)."""
+    parts = _PLACEHOLDER_RE.split(template)
+    statics = parts[0::3]
+    placeholders = list(zip(parts[2::3], parts[1::3], strict=True))
+    return statics, placeholders
+
+
+class TemplateKind(IntEnum):
+    """Typ av template, härledd ur filnamnet."""
+
+    OTHER = 0
+    STAGING = 1  # *_staging_*
+    MART = 2  # *_mart_*
+
+
+@functools.lru_cache(maxsize=256)
+def _template_kind(template_name: str) -> TemplateKind:
+    """Avgör template-typ med en lower() och två substring-test (cachad)."""
+    name = template_name.lower()
+    if "_staging_" in name:
+        return TemplateKind.STAGING
+    if "_mart_" in name:
+        return TemplateKind.MART
+    return TemplateKind.OTHER
+
+
+@functools.lru_cache(maxsize=256)
+def _extract_template_number(template_name: str) -> str:
+    """Extrahera numret (NNN) från template-filnamn (cachad)."""
+    parts = template_name.split("_")
+    if parts and parts[0].isdigit():
+        return parts[0]
+    return ""
+
+
+@functools.lru_cache(maxsize=256)
+def _schema_name(num: str, kind: TemplateKind, pipeline: str | None) -> str:
+    """Schemanamn för en template (cachad, se SQLGenerator._get_schema_name)."""
+    if kind == TemplateKind.STAGING:
+        if pipeline:
+            return f"staging_{pipeline}_{num}" if num else f"staging_{pipeline}"
+        return f"staging_{num}" if num else "staging"
+    elif kind == TemplateKind.MART:
+        return "mart"
+    return "staging"
+
+
+@functools.lru_cache(maxsize=256)
+def _prev_schema_name(num: str, kind: TemplateKind, pipeline: str | None) -> str | None:
+    """Föregående schema för en template (cachad).
+
+    Returnerar None för mart-templates i en pipeline - de beror på
+    pipelinens templates och slås upp av anroparen.
+    """
+    if not num:
+        return "raw"
+
+    num_int = int(num)
+
+    if pipeline:
+        # Pipeline-kontext
+        if kind == TemplateKind.STAGING:
+            if num_int <= 1:
+                # Första staging i pipeline → sista delade schemat
+                return "staging_004"
+            # Kedjad staging inom pipeline
+            return f"staging_{pipeline}_{num_int - 1:03d}"
+        elif kind == TemplateKind.MART:
+            return None
+        return "staging_004"
+
+    # Root-kontext (utan pipeline)
+    if kind == TemplateKind.STAGING:
+        if num_int <= 4:
+            return "raw"
+        return f"staging_{num_int - 1:03d}"
+    elif kind == TemplateKind.MART:
+        # Mart i root refererar till staging_004 (eller senaste)
+        return "staging_004"
+
+    return "raw"
+
+
+def _value_expr(value: str | None) -> str:
+    """SQL-uttryck för ett mappat värde: "$kolumn" → kolumnvärde, annars literal.
+
+    Ett enda test av första tecknet avgör både typ och kolumnnamn.
+    """
+    if not value:
+        return "''"
+    if value[0] == "$":
+        return f"COALESCE(s.{value[1:]}::VARCHAR, '')"
+    return f"'{value}'"
+
+
+@dataclass
+class _MigrationsIndex:
+    """Innehållet i sql/migrations/, inläst en gång per SQLGenerator."""
+
+    sql_path: Path  # sql_path som indexet byggdes för
+    root_templates: list[str]  # Template-filnamn i roten, sorterade
+    subdirs: dict[str, list[str]]  # Katalognamn -> template-filnamn (båda sorterade)
+
 
 @dataclass
 class TemplateInfo:
@@ -40,11 +169,18 @@ class TemplateInfo:
     pipeline: str | None  # "ext_restr" (kort pipeline-namn) eller None för root
     pipeline_dir: str | None  # "aab_ext_restr" (katalognamn) eller None
     number: str  # "001"
+    kind: TemplateKind = field(init=False)  # Härleds ur filename
 
+    def __post_init__(self) -> None:
+        self.kind = _template_kind(self.filename)
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class DatasetConfig:
-    """Konfiguration för ett dataset från field_mapping i datasets.yml."""
+    """Konfiguration för ett dataset från field_mapping i datasets.yml.
+
+    Oföränderlig - använd dataclasses.replace() för att ändra fält.
+    """
 
     # Identitet
     dataset_id: str = ""
@@ -63,8 +199,8 @@ class DatasetConfig:
     typ: str = ""
     leverantor: str = ""
 
-    # Extra data-mappningar
-    data_mappings: dict[str, str] = field(default_factory=dict)
+    # Extra data-mappningar (None = inga)
+    data_mappings: dict[str, str] | None = None
 
     @classmethod
     def from_dataset_yml(cls, dataset_id: str, config: dict) -> "DatasetConfig":
@@ -109,10 +245,88 @@ class DatasetConfig:
             grupp=fm.get("grupp", ""),
             typ=fm.get("typ", ""),
             leverantor=fm.get("leverantor", ""),
-            data_mappings=extra,
+            data_mappings=extra or None,
         )
 
 
+@dataclass(slots=True)
+class _RenderContext:
+    """Indata för att räkna ut variabler vid rendering av en template."""
+
+    generator: "SQLGenerator"
+    config: DatasetConfig
+    template_name: str  # Filnamn utan katalogprefix ("" = ingen schema-logik)
+    pipeline: str | None
+    pipeline_templates: list[TemplateInfo] | None
+
+
+def _schema_var(ctx: _RenderContext) -> str:
+    if not ctx.template_name:
+        return "staging"
+    return ctx.generator._get_schema_name(ctx.template_name, ctx.pipeline)
+
+
+def _prev_schema_var(ctx: _RenderContext) -> str:
+    if not ctx.template_name:
+        return "raw"
+    return ctx.generator._get_prev_schema_name(
+        ctx.template_name, ctx.pipeline, ctx.pipeline_templates
+    )
+
+
+def _source_id_expr(ctx: _RenderContext) -> str:
+    # Kolumnreferens eller tom sträng
+    src_col = ctx.config.source_id_column.removeprefix("$")
+    return f"s.{src_col}::VARCHAR" if src_col.strip() else "''"
+
+
+# Variabelnamn -> funktion som räknar ut värdet (anropas bara för använda variabler)
+_RESOLVERS: dict[str, Callable[[_RenderContext], str]] = {
+    "dataset_id": lambda ctx: ctx.config.dataset_id,
+    "schema": _schema_var,
+    "prev_schema": _prev_schema_var,
+    "source_id_column": lambda ctx: ctx.config.source_id_column.removeprefix("$"),
+    "geometry_column": lambda ctx: ctx.config.geometry_column,
+    "h3_center_resolution": lambda ctx: str(ctx.config.h3_center_resolution),
+    "h3_polyfill_resolution": lambda ctx: str(ctx.config.h3_polyfill_resolution),
+    "h3_line_resolution": lambda ctx: str(ctx.config.h3_line_resolution),
+    "h3_point_resolution": lambda ctx: str(ctx.config.h3_point_resolution),
+    "h3_line_buffer_meters": lambda ctx: str(ctx.config.h3_line_buffer_meters),
+    "klass": lambda ctx: ctx.config.klass,
+    "leverantor": lambda ctx: ctx.config.leverantor,
+    "source_id_expr": _source_id_expr,
+    # grupp_expr / typ_expr - kolumnreferens ($prefix) eller literal
+    "grupp_expr": lambda ctx: _value_expr(ctx.config.grupp),
+    "typ_expr": lambda ctx: _value_expr(ctx.config.typ),
+}
+
+
+def _resolve_placeholder(name: str, raw: str, ctx: _RenderContext) -> str:
+    """Värde för en platshållare, samma prioritet som _build_variables.
+
+    data_mappings går före fasta variabler, data_1..data_5 är alltid
+    definierade och okända platshållare lämnas orörda (raw).
+    """
+    mappings = ctx.config.data_mappings
+    if mappings and name.endswith("_expr"):
+        key = name[: -len("_expr")]
+        if key in mappings:
+            return _value_expr(mappings[key])
+    resolver = _RESOLVERS.get(name)
+    if resolver is not None:
+        return resolver(ctx)
+    return _DEFAULT_DATA_EXPRS.get(name, raw)
+
+
+def _join_segments(statics: list[str], values: Sequence[str]) -> str:
+    """Varva statiska delar och värden: s0 v0 s1 v1 ... sN."""
+    parts = [statics[0]]
+    for value, static in zip(values, statics[1:], strict=True):
+        parts.append(value)
+        parts.append(static)
+    return "".join(parts)
+
+
 class SQLGenerator:
     """Generisk SQL-generator för template-baserade transformationer.
 
@@ -124,6 +338,8 @@ class SQLGenerator:
     def __init__(self, sql_path: Path | None = None):
         self.sql_path = sql_path or settings.SQL_DIR
         self._template_cache: dict[str, str] = {}
+        self._compiled_cache: dict[str, CompiledTemplate] = {}
+        self._migrations_index: _MigrationsIndex | None = None
 
     def _load_template(self, template_path: str) -> str:
         """Läs mall från fil (cachad).
@@ -135,23 +351,92 @@ class SQLGenerator:
 
         Extraherar endast 'migrate:up' sektionen om den finns.
         """
-        if template_path not in self._template_cache:
-            full_path = self.sql_path / "migrations" / template_path
-            if full_path.exists():
-                content = full_path.read_text()
-                # Extrahera endast up-sektionen (stoppa vid migrate:down)
-                if "-- migrate:down" in content:
-                    content = content.split("-- migrate:down")[0]
-                # Ta bort migrate:up markören
-                if "-- migrate:up" in content:
-                    content = content.split("-- migrate:up", 1)[1]
-                self._template_cache[template_path] = content.strip()
-            else:
-                self._template_cache[template_path] = ""
-        return self._template_cache[template_path]
+        template = self._template_cache.get(template_path)
+        if template is None:
+            template = self._read_template(template_path)
+            self._template_cache[template_path] = template
+        return template
+
+    def _read_template(self, template_path: str) -> str:
+        """Läs mall från disk och plocka ut 'migrate:up' (tom sträng om filen saknas)."""
+        try:
+            data = (self.sql_path / "migrations" / template_path).read_bytes()
+        except FileNotFoundError:
+            return ""
+        # Markörerna letas upp i bytes och bara up-sektionen avkodas
+        end = data.find(_MIGRATE_DOWN)
+        if end < 0:
+            end = len(data)
+        start = data.find(_MIGRATE_UP, 0, end)
+        start = start + len(_MIGRATE_UP) if start >= 0 else 0
+        return data[start:end].decode("utf-8").strip()
+
+    def preload(self, pipeline: str | None = None) -> None:
+        """Läs och kompilera alla templates för en pipeline i förväg.
+
+        Filerna läses parallellt i trådar (I/O-bundet) och hamnar i
+        samma cachar som _load_template/_load_compiled fyller.
+
+        Args:
+            pipeline: Pipeline-namn, eller None för bara root-templates.
+        """
+        paths = [
+            t.relative_path
+            for t in self.list_templates(pipeline=pipeline)
+            if t.relative_path not in self._compiled_cache
+        ]
+        if not paths:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(len(paths), PRELOAD_MAX_WORKERS)) as executor:
+            contents = list(executor.map(self._read_template, paths))
+
+        for path, content in zip(paths, contents, strict=True):
+            self._template_cache.setdefault(path, content)
+            self._compiled_cache[path] = _compile_template(self._template_cache[path])
+
+    def _load_compiled(self, template_path: str) -> CompiledTemplate:
+        """Läs och kompilera mall (cachad, kompileras en gång per mall)."""
+        compiled = self._compiled_cache.get(template_path)
+        if compiled is None:
+            compiled = _compile_template(self._load_template(template_path))
+            self._compiled_cache[template_path] = compiled
+        return compiled
 
     # === Pipeline-hantering ===
 
+    def _get_index(self) -> _MigrationsIndex:
+        """Hämta index över sql/migrations/ (byggs en gång, om sql_path ändras)."""
+        index = self._migrations_index
+        if index is not None and index.sql_path == self.sql_path:
+            return index
+
+        root_templates: list[str] = []
+        subdirs: dict[str, list[str]] = {}
+        migrations_dir = self.sql_path / "migrations"
+        if migrations_dir.is_dir():
+            with os.scandir(migrations_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirs[entry.name] = []
+                    elif entry.name.endswith("_template.sql"):
+                        root_templates.append(entry.name)
+            for dirname in subdirs:
+                with os.scandir(migrations_dir / dirname) as entries:
+                    subdirs[dirname] = sorted(
+                        entry.name
+                        for entry in entries
+                        if entry.name.endswith("_template.sql") and not entry.is_dir()
+                    )
+
+        index = _MigrationsIndex(
+            sql_path=self.sql_path,
+            root_templates=sorted(root_templates),
+            subdirs=dict(sorted(subdirs.items())),
+        )
+        self._migrations_index = index
+        return index
+
     def _dir_to_pipeline_name(self, dirname: str) -> str:
         """Extrahera pipeline-namn från katalognamn (ta bort ordningsprefix).
 
@@ -177,13 +462,9 @@ class SQLGenerator:
         Returns:
             Katalognamn (t.ex. "aab_ext_restr") eller None om inte hittad.
         """
-        migrations_dir = self.sql_path / "migrations"
-        if not migrations_dir.exists():
-            return None
-
-        for subdir in sorted(migrations_dir.iterdir()):
-            if subdir.is_dir() and self._dir_to_pipeline_name(subdir.name) == pipeline:
-                return subdir.name
+        for dirname in self._get_index().subdirs:
+            if self._dir_to_pipeline_name(dirname) == pipeline:
+                return dirname
         return None
 
     def list_pipeline_dirs(self) -> list[tuple[str, str]]:
@@ -192,16 +473,11 @@ class SQLGenerator:
         Returns:
             Lista av (katalognamn, pipeline-namn) sorterat på katalognamn.
         """
-        migrations_dir = self.sql_path / "migrations"
-        if not migrations_dir.exists():
-            return []
-
-        result = []
-        for subdir in sorted(migrations_dir.iterdir()):
-            if subdir.is_dir() and not subdir.name.startswith((".", "_")):
-                pipeline_name = self._dir_to_pipeline_name(subdir.name)
-                result.append((subdir.name, pipeline_name))
-        return result
+        return [
+            (dirname, self._dir_to_pipeline_name(dirname))
+            for dirname in self._get_index().subdirs
+            if not dirname.startswith((".", "_"))
+        ]
 
     def list_templates(self, pipeline: str | None = None) -> list[TemplateInfo]:
         """Lista templates för en specifik pipeline.
@@ -216,19 +492,16 @@ class SQLGenerator:
         Returns:
             Lista av TemplateInfo sorterade i körningsordning.
         """
-        migrations_dir = self.sql_path / "migrations"
-        if not migrations_dir.exists():
-            return []
-
+        index = self._get_index()
         result = []
 
         # 1. Delade root-templates (alltid inkluderade)
-        for f in sorted(migrations_dir.glob("*_template.sql")):
-            num = self._extract_template_number(f.name)
+        for name in index.root_templates:
+            num = self._extract_template_number(name)
             result.append(
                 TemplateInfo(
-                    filename=f.name,
-                    relative_path=f.name,
+                    filename=name,
+                    relative_path=name,
                     pipeline=None,
                     pipeline_dir=None,
                     number=num,
@@ -239,13 +512,12 @@ class SQLGenerator:
         if pipeline:
             pipeline_dir = self._pipeline_name_to_dir(pipeline)
             if pipeline_dir:
-                subdir = migrations_dir / pipeline_dir
-                for f in sorted(subdir.glob("*_template.sql")):
-                    num = self._extract_template_number(f.name)
+                for name in index.subdirs[pipeline_dir]:
+                    num = self._extract_template_number(name)
                     result.append(
                         TemplateInfo(
-                            filename=f.name,
-                            relative_path=f"{pipeline_dir}/{f.name}",
+                            filename=name,
+                            relative_path=f"{pipeline_dir}/{name}",
                             pipeline=pipeline,
                             pipeline_dir=pipeline_dir,
                             number=num,
@@ -256,43 +528,38 @@ class SQLGenerator:
 
     # === Template-nummer och scheman ===
 
-    def _is_column_ref(self, value: str | None) -> bool:
+    @staticmethod
+    def _is_column_ref(value: str | None) -> bool:
         """Kolla om ett värde är en kolumnreferens (börjar med $)."""
-        if value is None or value == "":
-            return False
-        return value.startswith("$")
+        return bool(value) and value.startswith("$")
 
-    def _get_column_name(self, value: str) -> str:
+    @staticmethod
+    def _get_column_name(value: str) -> str:
         """Extrahera kolumnnamn från $-prefixat värde."""
-        if value.startswith("$"):
-            return value[1:]
-        return value
+        return value.removeprefix("$")
 
     def _extract_template_number(self, template_name: str) -> str:
         """Extrahera numret (NNN) från template-filnamn.
 
         Exempel: '004_staging_transform_template.sql' -> '004'
         """
-        parts = template_name.split("_")
-        if parts and parts[0].isdigit():
-            return parts[0]
-        return ""
+        return _extract_template_number(template_name)
 
-    def _get_schema_name(self, template_name: str, pipeline: str | None = None) -> str:
+    def _get_schema_name(
+        self,
+        template_name: str,
+        pipeline: str | None = None,
+        kind: TemplateKind | None = None,
+    ) -> str:
         """Generera schemanamn baserat på template-typ, nummer och pipeline.
 
         Root-staging: staging_004
         Pipeline-staging: staging_ext_restr_001
         Mart: mart (alltid)
         """
-        num = self._extract_template_number(template_name)
-        if "_staging_" in template_name.lower():
-            if pipeline:
-                return f"staging_{pipeline}_{num}" if num else f"staging_{pipeline}"
-            return f"staging_{num}" if num else "staging"
-        elif "_mart_" in template_name.lower():
-            return "mart"
-        return "staging"
+        if kind is None:
+            kind = _template_kind(template_name)
+        return _schema_name(_extract_template_number(template_name), kind, pipeline)
 
     def _find_last_staging_schema(self, pipeline: str, templates: list[TemplateInfo] | None) -> str:
         """Hitta senaste staging-schemat i en pipeline.
@@ -305,7 +572,7 @@ class SQLGenerator:
 
         # Filtrera pipeline-templates med staging
         staging_templates = [
-            t for t in templates if t.pipeline == pipeline and "_staging_" in t.filename.lower()
+            t for t in templates if t.pipeline == pipeline and t.kind == TemplateKind.STAGING
         ]
         if staging_templates:
             last = staging_templates[-1]
@@ -319,6 +586,7 @@ class SQLGenerator:
         template_name: str,
         pipeline: str | None = None,
         pipeline_templates: list[TemplateInfo] | None = None,
+        kind: TemplateKind | None = None,
     ) -> str:
         """Hämta föregående schema för referens.
 
@@ -332,35 +600,13 @@ class SQLGenerator:
             001_mart_*    → staging_004 (om inga staging i pipeline)
             003_mart_*    → staging_ext_restr_002 (sista staging)
         """
-        num = self._extract_template_number(template_name)
-        if not num:
-            return "raw"
-
-        num_int = int(num)
-
-        if pipeline:
-            # Pipeline-kontext
-            if "_staging_" in template_name.lower():
-                if num_int <= 1:
-                    # Första staging i pipeline → sista delade schemat
-                    return "staging_004"
-                # Kedjad staging inom pipeline
-                return f"staging_{pipeline}_{num_int - 1:03d}"
-            elif "_mart_" in template_name.lower():
-                # Mart refererar till sista staging i pipelinen
-                return self._find_last_staging_schema(pipeline, pipeline_templates)
-            return "staging_004"
-
-        # Root-kontext (utan pipeline)
-        if "_staging_" in template_name.lower():
-            if num_int <= 4:
-                return "raw"
-            return f"staging_{num_int - 1:03d}"
-        elif "_mart_" in template_name.lower():
-            # Mart i root refererar till staging_004 (eller senaste)
-            return "staging_004"
-
-        return "raw"
+        if kind is None:
+            kind = _template_kind(template_name)
+        prev_schema = _prev_schema_name(_extract_template_number(template_name), kind, pipeline)
+        if prev_schema is None:
+            # Mart refererar till sista staging i pipelinen
+            return self._find_last_staging_schema(pipeline, pipeline_templates)
+        return prev_schema
 
     # === Variabelsubstitution ===
 
@@ -371,81 +617,36 @@ class SQLGenerator:
         pipeline: str | None = None,
         pipeline_templates: list[TemplateInfo] | None = None,
     ) -> dict[str, str]:
-        """Bygg variabel-dict för substitution."""
-        # Schema-variabler baserade på template-nummer och pipeline
-        schema = self._get_schema_name(template_name, pipeline) if template_name else "staging"
-        prev_schema = (
-            self._get_prev_schema_name(template_name, pipeline, pipeline_templates)
-            if template_name
-            else "raw"
-        )
+        """Bygg variabel-dict för substitution (alla kända variabler).
 
-        # Grundläggande variabler
-        variables = {
-            "dataset_id": config.dataset_id,
-            "schema": schema,
-            "prev_schema": prev_schema,
-            "source_id_column": self._get_column_name(config.source_id_column),
-            "geometry_column": config.geometry_column,
-            "h3_center_resolution": str(config.h3_center_resolution),
-            "h3_polyfill_resolution": str(config.h3_polyfill_resolution),
-            "h3_line_resolution": str(config.h3_line_resolution),
-            "h3_point_resolution": str(config.h3_point_resolution),
-            "h3_line_buffer_meters": str(config.h3_line_buffer_meters),
-            "klass": config.klass,
-            "leverantor": config.leverantor,
-        }
-
-        # source_id_expr - kolumnreferens eller tom sträng
-        src_col = self._get_column_name(config.source_id_column)
-        if src_col and src_col.strip():
-            variables["source_id_expr"] = f"s.{src_col}::VARCHAR"
-        else:
-            variables["source_id_expr"] = "''"
+        Används inte vid rendering: render_template räknar bara ut de
+        platshållare templaten använder (_resolve_placeholder). Finns kvar
+        som referens i testerna, som jämför renderingen mot den här dicten.
+        """
+        ctx = _RenderContext(self, config, template_name, pipeline, pipeline_templates)
+        variables = {name: resolver(ctx) for name, resolver in _RESOLVERS.items()}
 
-        # grupp_expr - kolumnreferens ($prefix) eller literal
-        if self._is_column_ref(config.grupp):
-            col_name = self._get_column_name(config.grupp)
-            variables["grupp_expr"] = f"COALESCE(s.{col_name}::VARCHAR, '')"
-        else:
-            variables["grupp_expr"] = f"'{config.grupp}'" if config.grupp else "''"
-
-        # typ_expr - kolumnreferens ($prefix) eller literal
-        if config.typ is None or config.typ == "":
-            variables["typ_expr"] = "''"
-        elif self._is_column_ref(config.typ):
-            col_name = self._get_column_name(config.typ)
-            variables["typ_expr"] = f"COALESCE(s.{col_name}::VARCHAR, '')"
-        else:
-            variables["typ_expr"] = f"'{config.typ}'"
+        # Säkerställ att data_1..data_5 alltid finns (bakåtkompatibilitet)
+        variables.update(_DEFAULT_DATA_EXPRS)
 
         # Dynamiska variabler från data_mappings (inkl data_N och egna nycklar)
         # Varje nyckel "foo" med värde "$kolumn" → {{ foo_expr }} = COALESCE(s.kolumn::VARCHAR, '')
         # Varje nyckel "foo" med värde "literal" → {{ foo_expr }} = 'literal'
-        for key, value in config.data_mappings.items():
-            if self._is_column_ref(value):
-                col = self._get_column_name(value)
-                variables[f"{key}_expr"] = f"COALESCE(s.{col}::VARCHAR, '')"
-            elif value:
-                variables[f"{key}_expr"] = f"'{value}'"
-            else:
-                variables[f"{key}_expr"] = "''"
-
-        # Säkerställ att data_1..data_5 alltid finns (bakåtkompatibilitet)
-        for i in range(1, 6):
-            key = f"data_{i}_expr"
-            if key not in variables:
-                variables[key] = "''"
+        if config.data_mappings:
+            variables.update(
+                {f"{key}_expr": _value_expr(value) for key, value in config.data_mappings.items()}
+            )
 
         return variables
 
     def _substitute(self, template: str, variables: dict[str, str]) -> str:
-        """Ersätt {{ variabel }} med värden."""
-        result = template
-        for key, value in variables.items():
-            result = result.replace("{{ " + key + " }}", value)
-            result = result.replace("{{" + key + "}}", value)
-        return result
+        """Ersätt {{ variabel }} med värden i ett re.sub-pass.
+
+        Okända variabler lämnas orörda. Används inte vid rendering (se
+        render_template), bara som referens tillsammans med _build_variables
+        i testerna.
+        """
+        return _PLACEHOLDER_RE.sub(lambda m: variables.get(m.group(2), m.group(1)), template)
 
     # === Rendering ===
 
@@ -470,8 +671,8 @@ class SQLGenerator:
         Returns:
             SQL-sträng med substituerade variabler
         """
-        template = self._load_template(template_path)
-        if not template:
+        compiled = self._load_compiled(template_path)
+        if compiled == ([""], []):
             return ""
 
         # Konvertera config till DatasetConfig
@@ -479,15 +680,19 @@ class SQLGenerator:
             cfg = DatasetConfig(dataset_id=dataset_id)
         elif isinstance(config, dict):
             cfg = DatasetConfig.from_dataset_yml(dataset_id, config)
+        elif config.dataset_id != dataset_id:
+            cfg = dataclasses.replace(config, dataset_id=dataset_id)
         else:
             cfg = config
-            cfg.dataset_id = dataset_id
 
         # Extrahera filnamn för schema-logik (utan katalogprefix)
         filename = Path(template_path).name
 
-        variables = self._build_variables(cfg, filename, pipeline, pipeline_templates)
-        return self._substitute(template, variables)
+        # Räkna bara ut de variabler som templaten faktiskt använder
+        statics, placeholders = compiled
+        ctx = _RenderContext(self, cfg, filename, pipeline, pipeline_templates)
+        values = [_resolve_placeholder(name, raw, ctx) for name, raw in placeholders]
+        return _join_segments(statics, values)
 
     def get_schema_create_sql(self, template_name: str, pipeline: str | None = None) -> str:
         """Generera SQL för att skapa schemat som template använder.
@@ -519,6 +724,7 @@ class SQLGenerator:
             Lista av (template_path, rendered_sql) tuples i nummerordning
         """
         templates = self.list_templates(pipeline=pipeline)
+        self.preload(pipeline)
         results = []
         for tmpl in templates:
             sql = self.render_template(tmpl.relative_path, dataset_id, config, pipeline, templates)
@@ -552,15 +758,19 @@ class SQLGenerator:
         return self._load_template("aab_ext_restr/002_mart_h3_cells_template.sql")
 
 
-# Singleton-instans
-_generator = None
+# Singleton-instans (skapas vid import, billig tills den används)
+_generator = SQLGenerator()
 
 
 def get_generator() -> SQLGenerator:
     """Hämta singleton-instans av SQLGenerator."""
+    return _generator
+
+
+def reset_generator() -> SQLGenerator:
+    """Ersätt singleton-instansen med en ny (t.ex. efter ändrad settings.SQL_DIR)."""
     global _generator
-    if _generator is None:
-        _generator = SQLGenerator()
+    _generator = SQLGenerator()
     return _generator
 
 
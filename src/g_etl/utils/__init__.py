@@ -1,6 +1,7 @@
 """Utilities för G-ETL."""
 
+from g_etl.utils.archive import extract_zip
 from g_etl.utils.downloader import download_file_streaming, is_url
 from g_etl.utils.logging import FileLogger
 
-__all__ = ["FileLogger", "download_file_streaming", "is_url"]
+__all__ = ["FileLogger", "download_file_streaming", "extract_zip", "is_url"]
@@ -6,17 +6,70 @@ progress-rapportering och streaming.
 
 from __future__ import annotations
 
+import os
+import shutil
 import tempfile
 from collections.abc import Callable
 from pathlib import Path
+from typing import BinaryIO
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 
-# Chunk-storlek för streaming (8KB)
-CHUNK_SIZE = 8192
+# Chunk-storlek för streaming (1 MiB)
+CHUNK_SIZE = 1 << 20
 
-# Rapportera progress var N:te chunk (~800KB)
-PROGRESS_REPORT_INTERVAL = 100
+# Rapportera progress var N:te byte (8 MiB), oberoende av chunk-storlek
+PROGRESS_REPORT_BYTES = 8 << 20
+
+# Max antal anslutningar per värd i den delade sessionen
+POOL_MAXSIZE = 4
+
+
+def _make_session() -> requests.Session:
+    """Skapa den delade sessionen för nedladdningar.
+
+    Sessionen återanvänder anslutningar mellan nedladdningar och läser,
+    precis som requests.get, proxyinställningar (HTTP_PROXY/HTTPS_PROXY/
+    NO_PROXY), .netrc och CA-bundle (REQUESTS_CA_BUNDLE, annars certifi)
+    från miljön via trust_env.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _make_session()
+
+
+def _preallocate(fileno: int, size: int) -> None:
+    """Reservera plats för filen i förväg (Linux), så att den kan läggas sammanhängande."""
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fileno, 0, size)
+    except OSError:
+        # Filsystemet stödjer inte fallocate (t.ex. vissa nätverksdiskar)
+        pass
+
+
+def _open_url(url: str, timeout: int) -> requests.Response:
+    """Öppna en streamande GET mot url via den delade sessionen.
+
+    Raises:
+        requests.HTTPError: Vid HTTP-status >= 400.
+        requests.ConnectionError: Vid nätverksfel.
+    """
+    response = _session.get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+    return response
 
 
 def download_file_streaming(
@@ -31,6 +84,7 @@ def download_file_streaming(
 
     Laddar ner filen i chunks för att hantera stora filer utan att
     förbruka för mycket minne. Rapporterar progress via callback.
+    Utan on_progress kopieras svaret direkt med shutil.copyfileobj.
 
     Args:
         url: URL att ladda ner från.
@@ -45,7 +99,7 @@ def download_file_streaming(
         Path till den nedladdade temporärfilen.
 
     Raises:
-        requests.RequestException: Vid HTTP-fel.
+        requests.RequestException: Vid HTTP- eller nätverksfel.
 
     Example:
         path = download_file_streaming(
@@ -60,33 +114,55 @@ def download_file_streaming(
     if on_progress:
         on_progress(0.0, "Ansluter...")
 
-    response = requests.get(url, timeout=timeout, stream=True)
-    response.raise_for_status()
+    response = _open_url(url, timeout)
 
     total_size = int(response.headers.get("content-length", 0))
+
+    try:
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            _preallocate(tmp.fileno(), total_size)
+            if on_progress is None:
+                # Ingen progress att rapportera - kopiera rå-strömmen utan Python-loop
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, tmp, length=CHUNK_SIZE)
+            else:
+                _stream_with_progress(response, tmp, total_size, on_progress, progress_weight)
+            # Klipp bort eventuell förallokerad plats som inte skrevs
+            tmp.truncate()
+            return Path(tmp.name)
+    except urllib3.exceptions.HTTPError as e:
+        # Fel vid läsning av rå-strömmen översätts som requests själv gör
+        raise requests.ConnectionError(f"{e} for url: {url}") from e
+    finally:
+        response.close()
+
+
+def _stream_with_progress(
+    response: requests.Response,
+    tmp: BinaryIO,
+    total_size: int,
+    on_progress: Callable[[float, str], None],
+    progress_weight: float,
+) -> None:
+    """Skriv svaret till tmp och rapportera progress var PROGRESS_REPORT_BYTES:e byte."""
     downloaded = 0
-    chunk_count = 0
-
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
-            tmp.write(chunk)
-            downloaded += len(chunk)
-            chunk_count += 1
-
-            # Rapportera progress var PROGRESS_REPORT_INTERVAL:e chunk
-            if on_progress and chunk_count % PROGRESS_REPORT_INTERVAL == 0:
-                mb_done = downloaded / (1024 * 1024)
-
-                if total_size > 0:
-                    fraction = downloaded / total_size
-                    progress = fraction * progress_weight
-                    mb_total = total_size / (1024 * 1024)
-                    on_progress(progress, f"Laddar ner {mb_done:.1f}/{mb_total:.1f} MB...")
-                else:
-                    # Okänd storlek, visa bara nedladdat
-                    on_progress(progress_weight / 2, f"Laddar ner {mb_done:.1f} MB...")
-
-        return Path(tmp.name)
+    next_report = PROGRESS_REPORT_BYTES
+    for chunk in response.iter_content(CHUNK_SIZE):
+        tmp.write(chunk)
+        downloaded += len(chunk)
+
+        if downloaded >= next_report:
+            next_report = downloaded + PROGRESS_REPORT_BYTES
+            mb_done = downloaded / (1024 * 1024)
+
+            if total_size > 0:
+                fraction = downloaded / total_size
+                progress = fraction * progress_weight
+                mb_total = total_size / (1024 * 1024)
+                on_progress(progress, f"Laddar ner {mb_done:.1f}/{mb_total:.1f} MB...")
+            else:
+                # Okänd storlek, visa bara nedladdat
+                on_progress(progress_weight / 2, f"Laddar ner {mb_done:.1f} MB...")
 
 
 def is_url(path: str) -> bool:
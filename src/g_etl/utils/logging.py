@@ -5,12 +5,19 @@ Används av både CLI/TUI och QGIS-plugin för konsekvent loggning till fil.
 
 from __future__ import annotations
 
+import time
 from datetime import datetime
 from pathlib import Path
 
 # Default: behåll de senaste 20 loggfilerna
 DEFAULT_MAX_LOG_FILES = 20
 
+# Default: flusha loggfilen till disk högst en gång per sekund
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Rader med någon av dessa markörer flushas direkt, oavsett flush_interval
+ERROR_MARKERS = ("✗", "❌", "Fel", "FEL", "Error", "ERROR", "MISSLYCKADES")
+
 
 class FileLogger:
     """Hanterar loggning till fil med automatisk rotation.
@@ -20,6 +27,14 @@ class FileLogger:
     - TUI admin (admin/screens/)
     - QGIS plugin (qgis_runner.py)
 
+    Rader buffras och flushas till disk högst en gång per flush_interval,
+    och då först vid nästa log()-anrop. Det sparar ett syscall per rad men
+    betyder att de sista raderna kan saknas i filen om processen dör hårt
+    (t.ex. kill -9 eller krasch i QGIS) innan nästa flush. Rader med en
+    felmarkör (ERROR_MARKERS) flushas därför alltid direkt, så att felet
+    som föregick en krasch hamnar på disk. Sätt flush_interval=0 för att
+    flusha varje rad.
+
     Example:
         logger = FileLogger(logs_dir=Path("logs"), prefix="pipeline")
         log_file = logger.start()
@@ -33,6 +48,7 @@ class FileLogger:
         prefix: str = "pipeline",
         title: str = "G-ETL Pipeline Log",
         max_log_files: int | None = DEFAULT_MAX_LOG_FILES,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
     ):
         """Initiera FileLogger.
 
@@ -41,13 +57,20 @@ class FileLogger:
             prefix: Prefix för loggfilnamn (t.ex. "pipeline" -> "pipeline_2024-01-15_123456.log").
             title: Titel som skrivs i loggfilens header.
             max_log_files: Max antal loggfiler att behålla. None = ingen rotation.
+            flush_interval: Max sekunder mellan flush till disk vid log().
+                0 = flusha varje rad (säkrast vid krasch, men ett syscall per rad).
         """
         self.logs_dir = logs_dir
         self.prefix = prefix
         self.title = title
         self.max_log_files = max_log_files
+        self.flush_interval = flush_interval
         self.log_file: Path | None = None
         self._file_handle = None
+        self._last_flush = 0.0
+        # Formaterad tidsstämpel cachas per sekund
+        self._last_ts_sec = -1
+        self._last_ts_str = ""
 
     def start(self) -> Path:
         """Startar en ny loggfil och returnerar sökvägen."""
@@ -64,7 +87,7 @@ class FileLogger:
         self._file_handle.write(f"# {self.title}\n")
         self._file_handle.write(f"# Startad: {datetime.now().isoformat()}\n")
         self._file_handle.write(f"# {'=' * 58}\n\n")
-        self._file_handle.flush()
+        self.flush()
 
         # Rensa gamla loggfiler
         if self.max_log_files is not None:
@@ -73,11 +96,27 @@ class FileLogger:
         return self.log_file
 
     def log(self, message: str) -> None:
-        """Skriv ett meddelande till loggfilen."""
+        """Skriv ett meddelande till loggfilen.
+
+        Raden buffras och flushas när flush_interval sekunder gått sedan
+        senaste flush, eller direkt om den innehåller en felmarkör.
+        """
+        if self._file_handle:
+            sec = int(time.time())
+            if sec != self._last_ts_sec:
+                self._last_ts_sec = sec
+                self._last_ts_str = time.strftime("%H:%M:%S", time.localtime(sec))
+            self._file_handle.write(f"[{self._last_ts_str}] {message}\n")
+            if time.monotonic() - self._last_flush >= self.flush_interval or any(
+                marker in message for marker in ERROR_MARKERS
+            ):
+                self.flush()
+
+    def flush(self) -> None:
+        """Skriv buffrade rader till disk."""
         if self._file_handle:
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            self._file_handle.write(f"[{timestamp}] {message}\n")
             self._file_handle.flush()
+            self._last_flush = time.monotonic()
 
     def close(self) -> None:
         """Stänger loggfilen."""
@@ -92,9 +131,11 @@ class FileLogger:
         if self.max_log_files is None:
             return
 
+        # Filnamnen har tidsstämpel (YYYY-MM-DD_HHMMSS), så namnordning är
+        # kronologisk och ingen stat() per fil behövs
         log_files = sorted(
             self.logs_dir.glob(f"{self.prefix}_*.log"),
-            key=lambda f: f.stat().st_mtime,
+            key=lambda f: f.name,
             reverse=True,
         )
 
@@ -0,0 +1,271 @@
+"""Enkel Shapefile-läsare i ren Python (fallback när pyogrio saknas).
+
+Läser .shp/.shx/.dbf via mmap och memoryview. Postpositioner hämtas ur
+.shx-indexet i ett svep med struct.iter_unpack, och DBF-poster packas upp
+en hel fil i taget med ett förkompilerat struct.Struct. Koordinaterna i
+.shp har samma layout som WKB (little-endian x,y-par) och kopieras direkt
+till WKB utan att tolkas, förutom för polygonringarnas orientering.
+
+Stödjer Point, MultiPoint, PolyLine och Polygon (även Z/M-varianter, som
+läses som 2D). Övriga geometrityper ger NULL.
+"""
+
+from __future__ import annotations
+
+import datetime
+import mmap
+import struct
+import sys
+from array import array
+from operator import mul
+from pathlib import Path
+
+import pyarrow as pa
+
+# Namn på geometrikolumnen (WKB) i den returnerade tabellen
+GEOMETRY_COLUMN = "wkb_geometry"
+
+# Shapefile-typer (utan Z/M) -> bastyp
+_NULL, _POINT, _POLYLINE, _POLYGON, _MULTIPOINT = 0, 1, 3, 5, 8
+_BASE_TYPES = {
+    0: _NULL,
+    1: _POINT,
+    11: _POINT,
+    21: _POINT,
+    3: _POLYLINE,
+    13: _POLYLINE,
+    23: _POLYLINE,
+    5: _POLYGON,
+    15: _POLYGON,
+    25: _POLYGON,
+    8: _MULTIPOINT,
+    18: _MULTIPOINT,
+    28: _MULTIPOINT,
+}
+
+# WKB-geometrityper
+_WKB_POINT, _WKB_LINESTRING, _WKB_POLYGON = 1, 2, 3
+_WKB_MULTIPOINT, _WKB_MULTILINESTRING, _WKB_MULTIPOLYGON = 4, 5, 6
+
+_SHP_HEADER_SIZE = 100
+_RECORD_HEADER = struct.Struct(">ii")
+_SHAPE_TYPE = struct.Struct("<i")
+_PARTS_HEADER = struct.Struct("<32xii")  # bbox + antal delar + antal punkter
+_MULTIPOINT_HEADER = struct.Struct("<32xi")  # bbox + antal punkter
+_WKB_HEADER = struct.Struct("<BI")
+_WKB_COUNT = struct.Struct("<I")
+_DBF_HEADER = struct.Struct("<4xIHH")
+_DBF_FIELD = struct.Struct("<11sc4xBB14x")
+_LOGICAL = {b"Y": True, b"y": True, b"T": True, b"t": True}
+_LOGICAL.update({b"N": False, b"n": False, b"F": False, b"f": False})
+
+
+def _wkb(geom_type: int, body: bytes) -> bytes:
+    return _WKB_HEADER.pack(1, geom_type) + body
+
+
+def _ring_is_clockwise(coords: bytes) -> bool:
+    """Avgör ringens orientering via shoelace-formeln."""
+    values = array("d")
+    values.frombytes(coords)
+    if sys.byteorder != "little":
+        values.byteswap()
+    xs = values[0::2]
+    ys = values[1::2]
+    area = sum(map(mul, xs[:-1], ys[1:])) - sum(map(mul, xs[1:], ys[:-1]))
+    return area < 0
+
+
+def _parts_to_wkb(base_type: int, mv: memoryview, offset: int) -> bytes | None:
+    """Konvertera PolyLine/Polygon-post till WKB."""
+    num_parts, num_points = _PARTS_HEADER.unpack_from(mv, offset)
+    if num_parts == 0 or num_points == 0:
+        return None
+    parts_offset = offset + _PARTS_HEADER.size
+    starts = list(struct.unpack_from(f"<{num_parts}i", mv, parts_offset))
+    points_offset = parts_offset + 4 * num_parts
+    ends = starts[1:] + [num_points]
+
+    parts = [
+        (end - start, mv[points_offset + 16 * start : points_offset + 16 * end].tobytes())
+        for start, end in zip(starts, ends, strict=True)
+    ]
+
+    if base_type == _POLYLINE:
+        lines = [_wkb(_WKB_LINESTRING, _WKB_COUNT.pack(n) + coords) for n, coords in parts]
+        if len(lines) == 1:
+            return lines[0]
+        return _wkb(_WKB_MULTILINESTRING, _WKB_COUNT.pack(len(lines)) + b"".join(lines))
+
+    # Polygon: medurs ring = yttre ring, moturs = hål i föregående polygon
+    polygons: list[list[bytes]] = []
+    for n, coords in parts:
+        ring = _WKB_COUNT.pack(n) + coords
+        if _ring_is_clockwise(coords) or not polygons:
+            polygons.append([ring])
+        else:
+            polygons[-1].append(ring)
+
+    wkb_polygons = [
+        _wkb(_WKB_POLYGON, _WKB_COUNT.pack(len(rings)) + b"".join(rings)) for rings in polygons
+    ]
+    if len(wkb_polygons) == 1:
+        return wkb_polygons[0]
+    return _wkb(_WKB_MULTIPOLYGON, _WKB_COUNT.pack(len(wkb_polygons)) + b"".join(wkb_polygons))
+
+
+def _record_to_wkb(mv: memoryview, offset: int) -> bytes | None:
+    """Konvertera en .shp-post (offset till postens innehåll) till WKB."""
+    (shape_type,) = _SHAPE_TYPE.unpack_from(mv, offset)
+    base_type = _BASE_TYPES.get(shape_type)
+    offset += _SHAPE_TYPE.size
+
+    if base_type == _POINT:
+        return _wkb(_WKB_POINT, mv[offset : offset + 16].tobytes())
+    if base_type == _MULTIPOINT:
+        (num_points,) = _MULTIPOINT_HEADER.unpack_from(mv, offset)
+        points_offset = offset + _MULTIPOINT_HEADER.size
+        points = b"".join(
+            _wkb(_WKB_POINT, mv[points_offset + 16 * i : points_offset + 16 * (i + 1)].tobytes())
+            for i in range(num_points)
+        )
+        return _wkb(_WKB_MULTIPOINT, _WKB_COUNT.pack(num_points) + points)
+    if base_type in (_POLYLINE, _POLYGON):
+        return _parts_to_wkb(base_type, mv, offset)
+    return None
+
+
+def _record_offsets(shp: memoryview, shx_path: Path) -> list[int]:
+    """Hämta byte-offset till varje posts innehåll i .shp.
+
+    Använder .shx-indexet om det finns, annars stegas .shp igenom.
+    """
+    if shx_path.exists():
+        data = shx_path.read_bytes()[_SHP_HEADER_SIZE:]
+        return [
+            offset * 2 + _RECORD_HEADER.size
+            for offset, _length in _RECORD_HEADER.iter_unpack(data[: len(data) // 8 * 8])
+        ]
+
+    offsets = []
+    pos = _SHP_HEADER_SIZE
+    while pos + _RECORD_HEADER.size <= len(shp):
+        _number, length = _RECORD_HEADER.unpack_from(shp, pos)
+        offsets.append(pos + _RECORD_HEADER.size)
+        pos += _RECORD_HEADER.size + length * 2
+    return offsets
+
+
+def _read_geometries(shp_path: Path) -> list[bytes | None]:
+    """Läs alla geometrier i en .shp som WKB."""
+    with open(shp_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mv = memoryview(mm)
+        try:
+            offsets = _record_offsets(mv, shp_path.with_suffix(".shx"))
+            return [_record_to_wkb(mv, offset) for offset in offsets]
+        finally:
+            mv.release()
+
+
+def _convert_column(
+    raw: list[bytes], field_type: str, decimals: int, encoding: str
+) -> list[object]:
+    """Konvertera råa DBF-värden för en kolumn till Python-värden."""
+    if field_type in ("N", "F"):
+        values: list[object] = []
+        for value in raw:
+            text = value.strip()
+            if not text or text.startswith(b"*"):
+                values.append(None)
+            elif decimals == 0 and b"." not in text:
+                values.append(int(text))
+            else:
+                values.append(float(text))
+        return values
+    if field_type == "L":
+        return [_LOGICAL.get(value.strip()[:1]) for value in raw]
+    if field_type == "D":
+        values = []
+        for value in raw:
+            text = value.strip()
+            try:
+                values.append(datetime.date(int(text[:4]), int(text[4:6]), int(text[6:8])))
+            except ValueError:
+                values.append(None)
+        return values
+    return [value.decode(encoding, errors="replace").rstrip(" \x00") for value in raw]
+
+
+def _read_attributes(
+    dbf_path: Path, encoding: str, columns: list[str] | None = None
+) -> tuple[dict[str, list[object]], list[bool]]:
+    """Läs attribut ur en .dbf (alla, eller bara columns).
+
+    Returns:
+        Tuple av (kolumnnamn -> värden, raderad-flagga per post).
+    """
+    data = dbf_path.read_bytes()
+    num_records, header_length, record_length = _DBF_HEADER.unpack_from(data, 0)
+
+    fields: list[tuple[str, str, int, int]] = []
+    pos = 32
+    while pos + _DBF_FIELD.size <= header_length and data[pos] != 0x0D:
+        raw_name, raw_type, length, decimals = _DBF_FIELD.unpack_from(data, pos)
+        name = raw_name.split(b"\x00", 1)[0].decode(encoding, errors="replace")
+        fields.append((name, raw_type.decode("ascii", errors="replace"), length, decimals))
+        pos += _DBF_FIELD.size
+
+    # En post = raderingsflagga + fält med fast bredd; hela filen packas upp i ett svep
+    record = struct.Struct("<c" + "".join(f"{length}s" for _, _, length, _ in fields))
+    padding = record_length - record.size
+    if padding > 0:
+        record = struct.Struct(record.format + f"{padding}x")
+    num_records = min(num_records, (len(data) - header_length) // record.size)
+    body = memoryview(data)[header_length : header_length + num_records * record.size]
+    try:
+        rows = list(record.iter_unpack(body))
+    finally:
+        body.release()
+
+    deleted = [row[0] == b"*" for row in rows]
+    wanted = set(columns) if columns is not None else None
+    values = {
+        name: _convert_column([row[i + 1] for row in rows], field_type, decimals, encoding)
+        for i, (name, field_type, _length, decimals) in enumerate(fields)
+        if wanted is None or name in wanted
+    }
+    return values, deleted
+
+
+def read_shapefile(
+    shp_path: str | Path, encoding: str = "LATIN1", columns: list[str] | None = None
+) -> pa.Table:
+    """Läs en Shapefile till en Arrow-tabell.
+
+    Geometrin returneras som WKB i kolumnen GEOMETRY_COLUMN. Poster som
+    markerats som raderade i .dbf hoppas över.
+
+    Args:
+        shp_path: Sökväg till .shp-filen (.shx och .dbf läses bredvid).
+        encoding: Teckenkodning för textfält i .dbf.
+        columns: Attributkolumner att läsa (None = alla). Övriga fält
+            konverteras aldrig.
+
+    Returns:
+        pyarrow.Table med attributkolumner och geometrikolumn.
+    """
+    shp_path = Path(shp_path)
+    geometries = _read_geometries(shp_path)
+
+    dbf_path = shp_path.with_suffix(".dbf")
+    if dbf_path.exists():
+        attributes, deleted = _read_attributes(dbf_path, encoding, columns)
+    else:
+        attributes, deleted = {}, [False] * len(geometries)
+
+    num_rows = min(len(geometries), len(deleted))
+    keep = [i for i in range(num_rows) if not deleted[i]]
+
+    arrays = {name: pa.array([values[i] for i in keep]) for name, values in attributes.items()}
+    arrays[GEOMETRY_COLUMN] = pa.array([geometries[i] for i in keep], type=pa.binary())
+    return pa.table(arrays)
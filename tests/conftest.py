@@ -1,11 +1,35 @@
 """Pytest fixtures för G-ETL tester."""
 
 import tempfile
+import uuid
 from pathlib import Path
 
 import duckdb
 import pytest
 
+from g_etl.plugins import PLUGINS
+
+
+def pytest_addoption(parser):
+    """Lägg till --run-slow för tester markerade med slow."""
+    parser.addoption(
+        "--run-slow", action="store_true", default=False, help="kör även långsamma tester"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: långsamt test, körs bara med --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Hoppa över slow-markerade tester om inte --run-slow angetts."""
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="använd --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
 
 @pytest.fixture
 def temp_dir():
@@ -14,9 +38,17 @@ def temp_dir():
         yield Path(tmpdir)
 
 
-@pytest.fixture
-def duckdb_conn():
-    """Skapar en in-memory DuckDB-anslutning med extensions."""
+# Scheman som finns i varje test-anslutning
+DUCKDB_SCHEMAS = ["raw", "staging", "staging_004", "mart"]
+
+
+@pytest.fixture(scope="session")
+def duckdb_session_conn():
+    """In-memory DuckDB-anslutning som delas av hela testkörningen.
+
+    Extensions installeras och laddas bara en gång; INSTALL kan ta över en
+    sekund per anrop (nätverksuppslag) även när det misslyckas.
+    """
     conn = duckdb.connect(":memory:")
 
     # Installera och ladda extensions
@@ -27,14 +59,42 @@ def duckdb_conn():
         except Exception:
             pass
 
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def duckdb_conn(duckdb_session_conn):
+    """DuckDB-anslutning med tomma scheman för varje test.
+
+    Scheman skapas före testet och droppas med CASCADE efteråt, så att
+    testerna inte ser varandras tabeller.
+    """
+    conn = duckdb_session_conn
+
     # Skapa scheman
-    conn.execute("CREATE SCHEMA IF NOT EXISTS raw")
-    conn.execute("CREATE SCHEMA IF NOT EXISTS staging")
-    conn.execute("CREATE SCHEMA IF NOT EXISTS staging_004")
-    conn.execute("CREATE SCHEMA IF NOT EXISTS mart")
+    for schema in DUCKDB_SCHEMAS:
+        conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
 
     yield conn
-    conn.close()
+
+    for schema in DUCKDB_SCHEMAS:
+        conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+
+@pytest.fixture
+def duckdb_schema(duckdb_conn):
+    """Unikt schema i den delade anslutningen, droppas efter testet."""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    duckdb_conn.execute(f"CREATE SCHEMA {schema}")
+    yield schema
+    duckdb_conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+
+@pytest.fixture(scope="session")
+def plugin_instances():
+    """En instans per registrerad plugin, delad av hela testkörningen."""
+    return {name: plugin_class() for name, plugin_class in PLUGINS.items()}
 
 
 @pytest.fixture
@@ -0,0 +1,31 @@
+"""Gemensamma fixtures för QGIS-plugin-tester."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+QGIS_PLUGIN_DIR = Path(__file__).parent.parent.parent / "qgis_plugin"
+
+
+@pytest.fixture(scope="session")
+def qgis_runner_cls():
+    """QGISPipelineRunner-klassen med core-imports kopplade en gång per session.
+
+    _ensure_core_imports() rensar g_etl ur sys.modules när paketet inte
+    ligger under runner/, vilket skulle slå sönder övriga tester. Istället
+    markeras core som importerad och runner-modulen får funktionerna ur
+    det redan installerade g_etl-paketet.
+    """
+    if str(QGIS_PLUGIN_DIR) not in sys.path:
+        sys.path.insert(0, str(QGIS_PLUGIN_DIR))
+
+    import qgis_runner
+
+    from g_etl.config_loader import load_dataset_types, load_datasets_config
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(qgis_runner, "core_imported", True)
+        mp.setattr(qgis_runner, "load_datasets_config", load_datasets_config, raising=False)
+        mp.setattr(qgis_runner, "load_dataset_types", load_dataset_types, raising=False)
+        yield qgis_runner.QGISPipelineRunner
@@ -6,15 +6,28 @@ from unittest.mock import MagicMock, patch
 # Lägg till qgis_plugin i path för import
 sys.path.insert(0, str(__file__).rsplit("/tests/", 1)[0] + "/qgis_plugin")
 
+import json
+import time
+
+import deps
 from deps import (
     REQUIRED_PACKAGES,
+    _missing_packages,
     check_dependencies,
     ensure_dependencies,
     install_dependencies,
     install_duckdb_extensions,
+    prefetch_dependencies,
 )
 
 
+def _mock_popen(returncode: int = 0, output: str = "") -> MagicMock:
+    """Skapa en mockad Popen-process med given utskrift och returkod."""
+    proc = MagicMock(returncode=returncode)
+    proc.stdout.__iter__.return_value = iter(output.splitlines(keepends=True))
+    return proc
+
+
 class TestRequiredPackages:
     """Tester för REQUIRED_PACKAGES."""
 
@@ -60,6 +73,26 @@ class TestCheckDependencies:
         # (kan finnas i listan om det inte är installerat)
         assert isinstance(missing, list)
 
+    def test_check_dependencies_reports_missing_module(self):
+        """Moduler som inte går att hitta rapporteras med sitt pip-namn."""
+        _missing_packages.cache_clear()
+        with patch.dict(REQUIRED_PACKAGES, {"nonexistent_package_xyz": "nonexistent-pkg"}):
+            missing = check_dependencies()
+        _missing_packages.cache_clear()
+
+        assert "nonexistent-pkg" in missing
+        assert "duckdb" not in missing
+
+    def test_check_dependencies_does_not_import(self):
+        """find_spec används, så paketen importeras inte."""
+        _missing_packages.cache_clear()
+        with patch.dict(REQUIRED_PACKAGES, {"json.tool": "json-tool"}):
+            sys.modules.pop("json.tool", None)
+            assert "json-tool" not in check_dependencies()
+        _missing_packages.cache_clear()
+
+        assert "json.tool" not in sys.modules
+
     @patch.dict("sys.modules", {"nonexistent_package_xyz": None})
     def test_check_dependencies_with_mock(self):
         """Testa med mockad import."""
@@ -67,6 +100,101 @@ class TestCheckDependencies:
         result = check_dependencies()
         assert isinstance(result, list)
 
+    def test_check_dependencies_is_cached(self):
+        """Uppslagningarna körs bara en gång tills cachen töms."""
+        _missing_packages.cache_clear()
+        with patch("deps._has_module", return_value=False) as mock_import:
+            first = check_dependencies()
+            second = check_dependencies()
+        _missing_packages.cache_clear()
+
+        assert first == second == list(REQUIRED_PACKAGES.values())
+        assert mock_import.call_count == len(REQUIRED_PACKAGES)
+
+    @patch("subprocess.Popen")
+    def test_successful_install_clears_cache(self, mock_run):
+        """Efter lyckad installation görs uppslagningarna om."""
+        mock_run.return_value = _mock_popen()
+        _missing_packages.cache_clear()
+        with patch("deps._has_module", return_value=False):
+            assert check_dependencies()
+            install_dependencies(["test-package"])
+        with patch("deps._has_module", return_value=True):
+            assert check_dependencies() == []
+        _missing_packages.cache_clear()
+
+    def test_check_dependencies_uses_cache(self, tmp_path, monkeypatch):
+        """Ett färskt diskcachat resultat används utan att något slås upp."""
+        cache_file = tmp_path / "g_etl_deps.json"
+        monkeypatch.setattr(deps, "_cache_path", lambda: cache_file)
+        _missing_packages.cache_clear()
+
+        with patch("deps._has_module", return_value=True) as mock_import:
+            first = check_dependencies()
+        _missing_packages.cache_clear()
+        with patch("deps._has_module", return_value=False) as mock_import_again:
+            second = check_dependencies()
+        _missing_packages.cache_clear()
+
+        assert mock_import.call_count == len(REQUIRED_PACKAGES)
+        mock_import_again.assert_not_called()
+        assert first == second == []
+        assert json.loads(cache_file.read_text())["missing"] == []
+
+    def test_missing_packages_are_not_cached_on_disk(self, tmp_path, monkeypatch):
+        """Saknade paket sparas inte, så en installation syns efter omstart."""
+        cache_file = tmp_path / "g_etl_deps.json"
+        monkeypatch.setattr(deps, "_cache_path", lambda: cache_file)
+        _missing_packages.cache_clear()
+
+        with patch("deps._has_module", return_value=False):
+            assert check_dependencies() == list(REQUIRED_PACKAGES.values())
+        _missing_packages.cache_clear()
+        with patch("deps._has_module", return_value=True):
+            assert check_dependencies() == []
+        _missing_packages.cache_clear()
+
+    def test_cached_missing_list_is_ignored(self, tmp_path, monkeypatch):
+        """En sparad lista med saknade paket leder till ny kontroll."""
+        cache_file = tmp_path / "g_etl_deps.json"
+        monkeypatch.setattr(deps, "_cache_path", lambda: cache_file)
+        data = {"key": deps._cache_key(), "ts": time.time(), "missing": ["x"]}
+        cache_file.write_text(json.dumps(data))
+        _missing_packages.cache_clear()
+
+        with patch("deps._has_module", return_value=True):
+            assert check_dependencies() == []
+        _missing_packages.cache_clear()
+
+    def test_stale_cache_is_ignored(self, tmp_path, monkeypatch):
+        """För gammalt eller annan nyckel ger ny kontroll."""
+        cache_file = tmp_path / "g_etl_deps.json"
+        monkeypatch.setattr(deps, "_cache_path", lambda: cache_file)
+        for key, ts in [
+            (deps._cache_key(), time.time() - deps.DEPS_CACHE_TTL - 1),
+            ("annan-miljo", time.time()),
+        ]:
+            cache_file.write_text(json.dumps({"key": key, "ts": ts, "missing": []}))
+            _missing_packages.cache_clear()
+            with patch("deps._has_module", return_value=False):
+                assert check_dependencies() == list(REQUIRED_PACKAGES.values())
+        _missing_packages.cache_clear()
+
+    @patch("subprocess.Popen")
+    def test_successful_install_removes_cache_file(self, mock_run, tmp_path, monkeypatch):
+        """Lyckad installation tar bort diskcachen."""
+        mock_run.return_value = _mock_popen()
+        cache_file = tmp_path / "g_etl_deps.json"
+        monkeypatch.setattr(deps, "_cache_path", lambda: cache_file)
+        _missing_packages.cache_clear()
+        with patch("deps._has_module", return_value=True):
+            check_dependencies()
+        assert cache_file.exists()
+
+        install_dependencies(["test-package"])
+
+        assert not cache_file.exists()
+
 
 class TestInstallDependencies:
     """Tester för install_dependencies()."""
@@ -76,29 +204,83 @@ class TestInstallDependencies:
         result = install_dependencies([])
         assert result is True
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
     def test_install_dependencies_success(self, mock_run):
         """Testa lyckad installation."""
-        mock_run.return_value = MagicMock(returncode=0)
+        mock_run.return_value = _mock_popen()
 
         result = install_dependencies(["test-package"])
 
         assert result is True
         mock_run.assert_called_once()
 
-    @patch("subprocess.run")
+    @patch("deps.get_qgis_pip_path", return_value=None)
+    @patch("subprocess.Popen")
+    def test_install_dependencies_batches_multiple(self, mock_run, _mock_pip):
+        """Alla paket installeras i ett enda pip-anrop."""
+        mock_run.return_value = _mock_popen()
+
+        result = install_dependencies(["a", "b", "c"])
+
+        assert result is True
+        assert mock_run.call_count == 1
+        cmd = mock_run.call_args[0][0]
+        assert cmd[1:4] == ["-m", "pip", "install"]
+        assert cmd[-3:] == ["a", "b", "c"]
+
+    @patch("deps.get_qgis_pip_path", return_value=None)
+    @patch("subprocess.Popen")
+    def test_install_dependencies_offline_uses_find_links(self, mock_run, _mock_pip, tmp_path):
+        """Offline-läge installerar från wheel-katalogen utan PyPI."""
+        mock_run.return_value = _mock_popen()
+
+        result = install_dependencies(["a"], offline=True, cache_dir=tmp_path)
+
+        assert result is True
+        cmd = mock_run.call_args[0][0]
+        assert "--no-index" in cmd
+        assert cmd[cmd.index("--find-links") + 1] == str(tmp_path)
+        assert cmd[-1] == "a"
+
+    @patch("subprocess.Popen")
+    def test_prefetch_dependencies_downloads_wheels(self, mock_run, tmp_path):
+        """prefetch_dependencies kör pip download till cache-katalogen."""
+        mock_run.return_value = _mock_popen()
+        wheel_dir = tmp_path / "wheels"
+
+        assert prefetch_dependencies(wheel_dir) is True
+
+        cmd = mock_run.call_args[0][0]
+        assert cmd[3] == "download"
+        assert cmd[cmd.index("-d") + 1] == str(wheel_dir)
+        assert cmd[-len(REQUIRED_PACKAGES) :] == list(REQUIRED_PACKAGES.values())
+        assert wheel_dir.is_dir()
+
+    @patch("subprocess.Popen")
+    def test_install_dependencies_prefers_binary(self, mock_run):
+        """Alla pip-anrop föredrar färdiga wheels och frågar aldrig interaktivt."""
+        mock_run.return_value = _mock_popen(returncode=1)
+
+        install_dependencies(["test-package"])
+
+        for call in mock_run.call_args_list:
+            cmd = call[0][0]
+            assert "--prefer-binary" in cmd
+            assert "--no-input" in cmd
+
+    @patch("subprocess.Popen")
     def test_install_dependencies_failure(self, mock_run):
         """Testa misslyckad installation."""
-        mock_run.return_value = MagicMock(returncode=1, stderr="Error")
+        mock_run.return_value = _mock_popen(returncode=1, output="Error\n")
 
         result = install_dependencies(["test-package"])
 
         assert result is False
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
     def test_install_dependencies_with_progress_callback(self, mock_run):
         """Testa med progress-callback."""
-        mock_run.return_value = MagicMock(returncode=0)
+        mock_run.return_value = _mock_popen()
         messages = []
 
         def on_progress(msg):
@@ -110,7 +292,37 @@ class TestInstallDependencies:
         assert len(messages) > 0
         assert any("test-package" in msg for msg in messages)
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
+    def test_install_dependencies_streams_pip_output(self, mock_run):
+        """pip:s utskrift når callbacken rad för rad."""
+        mock_run.return_value = _mock_popen(
+            output="Collecting test-package\nInstalling collected packages\n"
+        )
+        messages = []
+
+        result = install_dependencies(["test-package"], on_progress=messages.append)
+
+        assert result is True
+        assert "Collecting test-package" in messages
+        assert messages.index("Collecting test-package") < messages.index(
+            "Installing collected packages"
+        )
+
+    def test_pip_timeout_kills_process(self, monkeypatch):
+        """En process som hänger dödas efter PIP_TIMEOUT."""
+        monkeypatch.setattr(deps, "PIP_TIMEOUT", 0.2)
+        messages = []
+
+        result = deps._try_pip_install(
+            [sys.executable, "-c", "import time; time.sleep(30)"],
+            "sleep",
+            messages.append,
+        )
+
+        assert result is False
+        assert any("timeout" in msg.lower() for msg in messages)
+
+    @patch("subprocess.Popen")
     def test_install_dependencies_timeout(self, mock_run):
         """Testa timeout-hantering."""
         import subprocess
@@ -123,7 +335,7 @@ class TestInstallDependencies:
         assert result is False
         assert any("timeout" in msg.lower() for msg in messages)
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
     def test_install_dependencies_exception(self, mock_run):
         """Testa generell exception-hantering."""
         mock_run.side_effect = Exception("Test error")
@@ -201,3 +413,30 @@ class TestInstallDuckdbExtensions:
 
         assert result is False
         assert any("fel" in msg.lower() or "error" in msg.lower() for msg in messages)
+
+    @patch("duckdb.connect")
+    def test_install_duckdb_extensions_skips_when_cached(self, mock_connect, tmp_path, monkeypatch):
+        """Med matchande stämpel körs ingen INSTALL."""
+        import duckdb
+
+        monkeypatch.setenv("HOME", str(tmp_path))
+
+        install_duckdb_extensions()
+        assert mock_connect.call_count == 1
+        stamp = json.loads(deps._extension_stamp_path().read_text())
+        assert stamp == {"duckdb": duckdb.__version__, "ext": sorted(deps.DUCKDB_EXTENSIONS)}
+
+        messages = []
+        assert install_duckdb_extensions(on_progress=messages.append) is True
+        assert mock_connect.call_count == 1
+        assert messages == ["DuckDB extensions redan installerade"]
+
+    @patch("duckdb.connect")
+    def test_no_stamp_when_install_fails(self, mock_connect, tmp_path, monkeypatch):
+        """Misslyckad INSTALL skriver ingen stämpel."""
+        monkeypatch.setenv("HOME", str(tmp_path))
+        mock_connect.return_value.execute.side_effect = Exception("offline")
+
+        install_duckdb_extensions()
+
+        assert not deps._extension_stamp_path().exists()
@@ -5,60 +5,79 @@ så att alla moduler kan importeras korrekt i QGIS-miljön.
 """
 
 import ast
-import re
+import shutil
 import tempfile
 from pathlib import Path
 
 import pytest
 
 
-class TestPluginImportStructure:
-    """Tester för att verifiera korrekt importstruktur i plugin."""
+@pytest.fixture(scope="session")
+def project_root() -> Path:
+    """Hämta projektets rotkatalog."""
+    return Path(__file__).parent.parent.parent
+
+
+def _parse_one(content: bytes, filename: str) -> ast.Module | None:
+    """Parsa en fil, None vid syntaxfel.
+
+    ast.parse tar bytes direkt och hanterar själv kodningsdeklarationen.
+    """
+    try:
+        return ast.parse(content, filename=filename)
+    except SyntaxError:
+        return None
+
+
+def _read_sources(root: Path) -> list[tuple[Path, bytes, ast.Module | None]]:
+    """Läs och parsa alla Python-filer under root (trädet är None vid syntaxfel)."""
+    sources = []
+    for path in root.rglob("*.py"):
+        content = path.read_bytes()
+        sources.append((path, content, _parse_one(content, str(path))))
+    return sources
 
-    @pytest.fixture
-    def project_root(self) -> Path:
-        """Hämta projektets rotkatalog."""
-        return Path(__file__).parent.parent.parent
 
-    @pytest.fixture
-    def core_files(self, project_root: Path) -> list:
-        """Hämta alla Python-filer i src/g_etl."""
-        core_path = project_root / "src" / "g_etl"
-        return list(core_path.rglob("*.py"))
+@pytest.fixture(scope="session")
+def core_sources(project_root: Path) -> list[tuple[Path, bytes, ast.Module | None]]:
+    """Alla Python-filer i src/g_etl med innehåll och AST (en gång per session)."""
+    return _read_sources(project_root / "src" / "g_etl")
 
-    @pytest.fixture
-    def plugin_files(self, project_root: Path) -> list:
-        """Hämta alla Python-filer i qgis_plugin."""
-        plugin_path = project_root / "qgis_plugin"
-        return list(plugin_path.rglob("*.py"))
 
-    def test_no_absolute_g_etl_imports_after_transform(self, project_root: Path):
+@pytest.fixture(scope="session")
+def plugin_sources(project_root: Path) -> list[tuple[Path, bytes, ast.Module | None]]:
+    """Alla Python-filer i qgis_plugin med innehåll och AST (en gång per session)."""
+    return _read_sources(project_root / "qgis_plugin")
+
+
+class TestPluginImportStructure:
+    """Tester för att verifiera korrekt importstruktur i plugin."""
+
+    def test_no_absolute_g_etl_imports_after_transform(
+        self, project_root: Path, core_sources: list
+    ):
         """Verifiera att import-transformationen fungerar korrekt.
 
         Efter transformationen ska inga 'from g_etl.' eller 'import g_etl.'
         finnas kvar i core-filerna (de ska vara 'from g_etl.runner.core.').
         """
-        core_path = project_root / "src" / "g_etl"
-
-        # Mönster som ska transformeras
-        pattern_from = re.compile(r"from g_etl\.(?!runner\.core\.)")
-        pattern_import = re.compile(r"import g_etl\.(?!runner\.core\.)")
-
         files_with_imports = []
-        for py_file in core_path.rglob("*.py"):
-            content = py_file.read_text()
-
-            # Hoppa över kommentarer och docstrings för enkel kontroll
-            lines = content.split("\n")
-            for line_no, line in enumerate(lines, 1):
-                stripped = line.strip()
-                # Hoppa över kommentarer
-                if stripped.startswith("#"):
+        for py_file, content, tree in core_sources:
+            # Snabb substrängskontroll innan trädet gås igenom
+            if tree is None or b"g_etl." not in content:
+                continue
+            # AST-noder ger bara riktiga importer, inte kommentarer eller strängar
+            for node in ast.walk(tree):
+                if isinstance(node, ast.ImportFrom):
+                    modules = [node.module or ""]
+                elif isinstance(node, ast.Import):
+                    modules = [alias.name for alias in node.names]
+                else:
                     continue
-
-                if pattern_from.search(line) or pattern_import.search(line):
-                    rel_path = py_file.relative_to(project_root)
-                    files_with_imports.append((str(rel_path), line_no, stripped))
+                for module in modules:
+                    if module.startswith("g_etl.") and not module.startswith("g_etl.runner.core."):
+                        rel_path = py_file.relative_to(project_root)
+                        files_with_imports.append((str(rel_path), node.lineno, module))
 
         # Detta test dokumenterar vilka filer som har importer som behöver transformeras
         # Det är inte ett fel - det är förväntat beteende
@@ -67,19 +86,17 @@ class TestPluginImportStructure:
             "något kan vara fel med testet eller filstrukturen"
         )
 
-    def test_plugin_files_use_relative_imports(self, plugin_files: list, project_root: Path):
+    def test_plugin_files_use_relative_imports(self, plugin_sources: list, project_root: Path):
         """Verifiera att plugin-filer använder relativa importer korrekt."""
         # Plugin-filer (inte core) ska använda relativa importer som .deps, .dialog etc.
         issues = []
 
-        for py_file in plugin_files:
-            content = py_file.read_text()
-
+        for py_file, content, _tree in plugin_sources:
             # qgis_runner.py använder 'from g_etl.' via sys.path-trick - det är OK
             if py_file.name == "qgis_runner.py":
                 continue
 
-            if "from g_etl." in content:
+            if b"from g_etl." in content:
                 rel_path = py_file.relative_to(project_root)
                 issues.append(f"{rel_path}: använder 'from g_etl.' istället för relativ import")
 
@@ -107,15 +124,34 @@ class TestPluginImportStructure:
         assert "runner/g_etl" in content, "Build-tasken ska kopiera core-moduler till runner/g_etl/"
 
 
+# Moduler som måste finnas i runner/g_etl/ för att pluginet ska fungera
+REQUIRED_CORE_MODULES = [
+    "__init__.py",
+    "settings.py",
+    "sql_generator.py",
+    "export.py",
+    "services/pipeline_runner.py",
+    "admin/services/pipeline_runner.py",
+    "plugins/__init__.py",
+    "migrations/migrator.py",
+    "utils/logging.py",
+    "utils/downloader.py",
+]
+
+
 class TestPluginBuildIntegration:
     """Integrationstester för plugin-bygget."""
 
-    @pytest.fixture
-    def project_root(self) -> Path:
-        """Hämta projektets rotkatalog."""
-        return Path(__file__).parent.parent.parent
+    def test_required_modules_exist_in_source(self, project_root: Path):
+        """Verifiera att alla moduler som bygget behöver finns i src/g_etl/."""
+        src_core = project_root / "src" / "g_etl"
+
+        missing = [m for m in REQUIRED_CORE_MODULES if not (src_core / m).exists()]
 
-    def test_simulated_build_has_correct_structure(self, project_root: Path):
+        assert not missing, f"Nödvändiga moduler saknas i src/g_etl/: {missing}"
+
+    @pytest.mark.slow
+    def test_simulated_build_copies_required_modules(self, project_root: Path):
         """Simulera bygget och verifiera att runner/g_etl/ innehåller alla moduler.
 
         Med det nya bygget kopieras moduler till runner/g_etl/ utan
@@ -127,98 +163,62 @@ class TestPluginBuildIntegration:
             plugin_dir = temp_path / "g_etl"
             plugin_dir.mkdir()
 
-            # Kopiera core-filer till runner/g_etl/ (som det nya bygget gör)
+            # Kopiera core-filer till runner/g_etl/ (som cp -r i bygget)
             g_etl_dir = plugin_dir / "runner" / "g_etl"
-            g_etl_dir.mkdir(parents=True)
-
-            src_core = project_root / "src" / "g_etl"
-            for py_file in src_core.rglob("*.py"):
-                rel_path = py_file.relative_to(src_core)
-                dest_file = g_etl_dir / rel_path
-                dest_file.parent.mkdir(parents=True, exist_ok=True)
-                dest_file.write_text(py_file.read_text())
+            shutil.copytree(
+                project_root / "src" / "g_etl",
+                g_etl_dir,
+                ignore=shutil.ignore_patterns("*.pyc", "__pycache__"),
+            )
 
             # Skapa __init__.py för runner
             (plugin_dir / "runner" / "__init__.py").touch()
 
-            # Verifiera att g_etl-paketet finns med __init__.py
-            assert (g_etl_dir / "__init__.py").exists(), "runner/g_etl/__init__.py saknas"
-
-            # Verifiera nödvändiga moduler
-            required = [
-                "settings.py",
-                "sql_generator.py",
-                "export.py",
-                "services/pipeline_runner.py",
-                "admin/services/pipeline_runner.py",
-                "plugins/__init__.py",
-                "migrations/migrator.py",
-                "utils/logging.py",
-                "utils/downloader.py",
-            ]
-            missing = []
-            for module in required:
-                if not (g_etl_dir / module).exists():
-                    missing.append(module)
+            missing = [m for m in REQUIRED_CORE_MODULES if not (g_etl_dir / m).exists()]
 
             assert not missing, f"Nödvändiga moduler saknas i runner/g_etl/: {missing}"
 
     def test_all_core_imports_are_internal(self, project_root: Path):
-        """Verifiera att alla importer i core refererar till g_etl-moduler."""
+        """Verifiera att förväntade g_etl-moduler finns i core."""
         src_core = project_root / "src" / "g_etl"
 
-        # Lista alla g_etl submoduler
-        submodules = set()
-        for py_file in src_core.rglob("*.py"):
-            rel_path = py_file.relative_to(src_core)
-            # Extrahera modulnamn
-            if rel_path.name == "__init__.py":
-                module = ".".join(rel_path.parent.parts)
-            else:
-                module = ".".join(rel_path.with_suffix("").parts)
-            if module:
-                submodules.add(module)
-
-        # Kontrollera att vi hittat förväntade moduler
+        # Varje modul är antingen ett paket (katalog) eller en .py-fil
         expected_modules = {"settings", "plugins", "migrations", "admin", "sql_generator"}
-        found_modules = {m.split(".")[0] for m in submodules if m}
-
-        missing = expected_modules - found_modules
+        missing = {
+            m
+            for m in expected_modules
+            if not (src_core / m / "__init__.py").exists() and not (src_core / f"{m}.py").exists()
+        }
         assert not missing, f"Förväntade moduler saknas: {missing}"
 
 
 class TestImportSyntax:
     """Tester för att verifiera syntaktisk korrekthet av Python-filer."""
 
-    @pytest.fixture
-    def project_root(self) -> Path:
-        """Hämta projektets rotkatalog."""
-        return Path(__file__).parent.parent.parent
-
-    def test_all_plugin_files_are_valid_python(self, project_root: Path):
+    def test_all_plugin_files_are_valid_python(self, project_root: Path, plugin_sources: list):
         """Verifiera att alla plugin-filer är syntaktiskt korrekta."""
-        plugin_path = project_root / "qgis_plugin"
         errors = []
 
-        for py_file in plugin_path.rglob("*.py"):
+        for py_file, content, tree in plugin_sources:
+            if tree is not None:
+                continue
             try:
-                content = py_file.read_text()
-                ast.parse(content)
+                ast.parse(content, filename=str(py_file))
             except SyntaxError as e:
                 rel_path = py_file.relative_to(project_root)
                 errors.append(f"{rel_path}: {e}")
 
         assert not errors, "Syntaxfel i plugin-filer:\n" + "\n".join(errors)
 
-    def test_all_core_files_are_valid_python(self, project_root: Path):
+    def test_all_core_files_are_valid_python(self, project_root: Path, core_sources: list):
         """Verifiera att alla core-filer är syntaktiskt korrekta."""
-        core_path = project_root / "src" / "g_etl"
         errors = []
 
-        for py_file in core_path.rglob("*.py"):
+        for py_file, content, tree in core_sources:
+            if tree is not None:
+                continue
             try:
-                content = py_file.read_text()
-                ast.parse(content)
+                ast.parse(content, filename=str(py_file))
             except SyntaxError as e:
                 rel_path = py_file.relative_to(project_root)
                 errors.append(f"{rel_path}: {e}")
@@ -1,10 +1,39 @@
 """Tester för qgis_plugin/runner.py - pipeline wrapper för QGIS."""
 
 from pathlib import Path
-from unittest.mock import MagicMock, patch
 
 import pytest
-import yaml
+
+# datasets.yml i nytt pipeline-grupperat format
+DATASETS_YML = """\
+pipelines:
+  - id: test_pipeline
+    name: Test Pipeline
+    datasets:
+      - id: test_dataset
+        name: Test Dataset
+        type: test_type
+        plugin: wfs
+        enabled: true
+        field_mapping:
+          source_id_column: $id
+          klass: test
+          leverantor: test_lev
+      - id: another_dataset
+        name: Another Dataset
+        type: other_type
+        plugin: geoparquet
+        enabled: true
+"""
+
+
+def _make_runner(runner_cls, plugin_dir: Path):
+    """Skapa en runner utan __init__ (som skriver om globala settings)."""
+    runner = runner_cls.__new__(runner_cls)
+    runner.plugin_dir = plugin_dir
+    runner.config_dir = plugin_dir / "config"
+    runner.sql_dir = plugin_dir / "sql"
+    return runner
 
 
 class TestQGISPipelineRunnerInit:
@@ -19,169 +48,33 @@ class TestQGISPipelineRunnerInit:
         sql_dir.mkdir(parents=True)
 
         # Skapa datasets.yml (nytt pipeline-grupperat format)
-        datasets_config = {
-            "pipelines": [
-                {
-                    "id": "test_pipeline",
-                    "name": "Test Pipeline",
-                    "datasets": [
-                        {
-                            "id": "test_dataset",
-                            "name": "Test Dataset",
-                            "type": "test_type",
-                            "plugin": "wfs",
-                            "enabled": True,
-                            "field_mapping": {
-                                "source_id_column": "$id",
-                                "klass": "test",
-                                "leverantor": "test_lev",
-                            },
-                        },
-                        {
-                            "id": "another_dataset",
-                            "name": "Another Dataset",
-                            "type": "other_type",
-                            "plugin": "geoparquet",
-                            "enabled": True,
-                        },
-                    ],
-                }
-            ]
-        }
-        (config_dir / "datasets.yml").write_text(yaml.dump(datasets_config))
+        (config_dir / "datasets.yml").write_text(DATASETS_YML)
 
         return tmp_path
 
-    def test_list_datasets_returns_list(self, temp_plugin_dir):
+    def test_list_datasets_returns_list(self, qgis_runner_cls, temp_plugin_dir):
         """Testa att list_datasets returnerar en lista."""
-        # Mock core imports
-        with patch.dict("sys.modules", {"yaml": yaml}):
-            # Importera runner med mockade core-moduler
-            import sys
-
-            sys.path.insert(0, str(Path(__file__).parent.parent.parent / "qgis_plugin"))
-
-            # Mock settings
-            mock_settings = MagicMock()
-            mock_settings.CONFIG_DIR = temp_plugin_dir / "config"
-            mock_settings.SQL_DIR = temp_plugin_dir / "sql"
-
-            with patch.dict(
-                "sys.modules",
-                {
-                    "runner.core": MagicMock(),
-                    "runner.core.admin": MagicMock(),
-                    "runner.core.admin.services": MagicMock(),
-                    "runner.core.admin.services.pipeline_runner": MagicMock(),
-                    "runner.core.settings": MagicMock(settings=mock_settings),
-                },
-            ):
-                # Skapa en mock runner (speglar qgis_runner.py list_datasets)
-                class MockQGISPipelineRunner:
-                    def __init__(self, plugin_dir):
-                        self.plugin_dir = plugin_dir
-                        self.config_dir = plugin_dir / "config"
-                        self.sql_dir = plugin_dir / "sql"
-
-                    def list_datasets(self):
-                        config_path = self.config_dir / "datasets.yml"
-                        if not config_path.exists():
-                            return []
-                        with open(config_path) as f:
-                            data = yaml.safe_load(f)
-                        if not data:
-                            return []
-                        if "pipelines" in data:
-                            result = []
-                            for pipeline in data["pipelines"]:
-                                pipeline_id = pipeline.get("id", "")
-                                for ds in pipeline.get("datasets", []):
-                                    ds["pipeline"] = pipeline_id
-                                    result.append(ds)
-                            return result
-                        return data.get("datasets", [])
-
-                    def list_dataset_types(self):
-                        datasets = self.list_datasets()
-                        types = set()
-                        for ds in datasets:
-                            if "type" in ds:
-                                types.add(ds["type"])
-                        return sorted(types)
-
-                runner = MockQGISPipelineRunner(temp_plugin_dir)
-                datasets = runner.list_datasets()
-
-                assert isinstance(datasets, list)
-                assert len(datasets) == 2
-                assert datasets[0]["id"] == "test_dataset"
-
-    def test_list_datasets_empty_dir(self, tmp_path):
+        runner = _make_runner(qgis_runner_cls, temp_plugin_dir)
+        datasets = runner.list_datasets()
+
+        assert isinstance(datasets, list)
+        assert len(datasets) == 2
+        assert datasets[0]["id"] == "test_dataset"
+        assert datasets[0]["pipeline"] == "test_pipeline"
+
+    def test_list_datasets_empty_dir(self, qgis_runner_cls, tmp_path):
         """Testa list_datasets med tom katalog."""
         config_dir = tmp_path / "config"
         config_dir.mkdir()
 
-        class MockQGISPipelineRunner:
-            def __init__(self, plugin_dir):
-                self.config_dir = plugin_dir / "config"
-
-            def list_datasets(self):
-                config_path = self.config_dir / "datasets.yml"
-                if not config_path.exists():
-                    return []
-                with open(config_path) as f:
-                    data = yaml.safe_load(f)
-                if not data:
-                    return []
-                if "pipelines" in data:
-                    result = []
-                    for pipeline in data["pipelines"]:
-                        pipeline_id = pipeline.get("id", "")
-                        for ds in pipeline.get("datasets", []):
-                            ds["pipeline"] = pipeline_id
-                            result.append(ds)
-                    return result
-                return data.get("datasets", [])
-
-        runner = MockQGISPipelineRunner(tmp_path)
+        runner = _make_runner(qgis_runner_cls, tmp_path)
         datasets = runner.list_datasets()
 
         assert datasets == []
 
-    def test_list_dataset_types(self, temp_plugin_dir):
+    def test_list_dataset_types(self, qgis_runner_cls, temp_plugin_dir):
         """Testa list_dataset_types."""
-
-        class MockQGISPipelineRunner:
-            def __init__(self, plugin_dir):
-                self.config_dir = plugin_dir / "config"
-
-            def list_datasets(self):
-                config_path = self.config_dir / "datasets.yml"
-                if not config_path.exists():
-                    return []
-                with open(config_path) as f:
-                    data = yaml.safe_load(f)
-                if not data:
-                    return []
-                if "pipelines" in data:
-                    result = []
-                    for pipeline in data["pipelines"]:
-                        pipeline_id = pipeline.get("id", "")
-                        for ds in pipeline.get("datasets", []):
-                            ds["pipeline"] = pipeline_id
-                            result.append(ds)
-                    return result
-                return data.get("datasets", [])
-
-            def list_dataset_types(self):
-                datasets = self.list_datasets()
-                types = set()
-                for ds in datasets:
-                    if "type" in ds:
-                        types.add(ds["type"])
-                return sorted(types)
-
-        runner = MockQGISPipelineRunner(temp_plugin_dir)
+        runner = _make_runner(qgis_runner_cls, temp_plugin_dir)
         types = runner.list_dataset_types()
 
         assert isinstance(types, list)
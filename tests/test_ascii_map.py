@@ -0,0 +1,105 @@
+"""Tester för kart-widgetens datahämtning (admin/widgets/ascii_map.py)."""
+
+import duckdb
+import pytest
+
+from g_etl.admin.widgets.ascii_map import (
+    _centroid_query,
+    _fetch_points,
+    load_centroids_from_query,
+)
+
+
+def _has_spatial(conn: duckdb.DuckDBPyConnection) -> bool:
+    try:
+        conn.execute("LOAD spatial")
+    except Exception:
+        return False
+    return True
+
+
+class TestFetchPoints:
+    """Tester för _fetch_points."""
+
+    def test_returns_float_tuples(self):
+        """Punkter returneras som (x, y)-tuples av float."""
+        conn = duckdb.connect(":memory:")
+        points = _fetch_points(conn, "SELECT 1 AS x, 2.5 AS y UNION ALL SELECT 3, 4")
+
+        assert sorted(points) == [(1.0, 2.5), (3.0, 4.0)]
+        assert all(isinstance(v, float) for p in points for v in p)
+
+    def test_nulls_are_filtered(self):
+        """Rader med NULL i x eller y tas bort."""
+        conn = duckdb.connect(":memory:")
+        points = _fetch_points(
+            conn,
+            "SELECT * FROM (VALUES (1.0, 2.0), (NULL, 3.0), (4.0, NULL)) t(x, y)",
+        )
+
+        assert points == [(1.0, 2.0)]
+
+    def test_empty_result(self):
+        """Tomt resultat ger tom lista."""
+        conn = duckdb.connect(":memory:")
+        assert _fetch_points(conn, "SELECT 1.0 AS x, 2.0 AS y WHERE false") == []
+
+
+class TestCentroidQuery:
+    """Tester för _centroid_query."""
+
+    def test_sample_is_pushed_into_sql(self):
+        """Med sample_size görs urvalet i DuckDB."""
+        query = _centroid_query("mart", "t", "geometry", 50, needs_transform=False)
+        assert "USING SAMPLE 50 ROWS" in query
+
+    def test_no_sample(self):
+        """Utan sample_size blir det en vanlig SELECT."""
+        query = _centroid_query("mart", "t", "geometry", None, needs_transform=False)
+        assert "SAMPLE" not in query
+
+    def test_transform(self):
+        """WGS84-data transformeras till SWEREF99 TM."""
+        query = _centroid_query("mart", "t", "geom", None, needs_transform=True)
+        assert "ST_Transform(geom, 'EPSG:4326', 'EPSG:3006')" in query
+
+
+class TestLoadCentroidsFromQuery:
+    """Tester för load_centroids_from_query."""
+
+    def test_missing_table(self, duckdb_conn, duckdb_schema):
+        """Saknad tabell ger tom lista."""
+        assert load_centroids_from_query(duckdb_conn, duckdb_schema, "finns_inte") == []
+
+    def test_load_from_sweref_table(self, duckdb_conn, duckdb_schema):
+        """Centroids i SWEREF99 TM läses utan transformation."""
+        if not _has_spatial(duckdb_conn):
+            pytest.skip("DuckDB spatial saknas")
+        duckdb_conn.execute(f"""
+            CREATE TABLE {duckdb_schema}.punkter AS
+            SELECT ST_Point(500000 + n % 10 * 10, 6500000 + n // 10 * 10) AS geometry
+            FROM generate_series(0, 99) g(n)
+        """)
+
+        points = load_centroids_from_query(duckdb_conn, duckdb_schema, "punkter")
+
+        assert len(points) == 100
+        assert all(500000 <= x < 500100 and 6500000 <= y < 6500100 for x, y in points)
+
+    def test_load_with_sample_size(self, duckdb_conn, duckdb_schema):
+        """Urvalet görs i planen och ger exakt sample_size punkter."""
+        if not _has_spatial(duckdb_conn):
+            pytest.skip("DuckDB spatial saknas")
+        duckdb_conn.execute(f"""
+            CREATE TABLE {duckdb_schema}.manga AS
+            SELECT ST_Point(500000 + n % 1000, 6500000 + n // 1000) AS geometry
+            FROM generate_series(0, 99999) g(n)
+        """)
+
+        points = load_centroids_from_query(duckdb_conn, duckdb_schema, "manga", sample_size=50)
+        plan = duckdb_conn.execute(
+            "EXPLAIN " + _centroid_query(duckdb_schema, "manga", "geometry", 50, False)
+        ).fetchall()
+
+        assert len(points) == 50
+        assert "SAMPLE" in str(plan).upper()
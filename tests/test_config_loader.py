@@ -1,8 +1,20 @@
 """Tester för config_loader.py."""
 
+import json
+import os
+from unittest.mock import MagicMock
+
+import pytest
 import yaml
 
-from g_etl.config_loader import _flatten_pipelines, load_datasets_config, load_pipelines_config
+from g_etl import config_loader
+from g_etl.config_loader import (
+    _flatten_pipelines,
+    _Loader,
+    load_dataset_types,
+    load_datasets_config,
+    load_pipelines_config,
+)
 
 
 class TestFlattenPipelines:
@@ -26,6 +38,8 @@ class TestFlattenPipelines:
         assert result[0]["id"] == "ds1"
         assert result[1]["pipeline"] == "ext_restr"
         assert result[1]["id"] == "ds2"
+        # Indata ändras inte
+        assert all("pipeline" not in ds for ds in pipelines[0]["datasets"])
 
     def test_multiple_pipelines(self):
         """Datasets från flera pipelines plattas ut i ordning."""
@@ -38,6 +52,7 @@ class TestFlattenPipelines:
         assert result[0]["pipeline"] == "p1"
         assert result[1]["pipeline"] == "p2"
         assert result[2]["pipeline"] == "p2"
+        assert pipelines[1]["datasets"] == [{"id": "ds2"}, {"id": "ds3"}]
 
     def test_empty_pipeline(self):
         """Tom pipeline ger inga datasets."""
@@ -45,6 +60,10 @@ class TestFlattenPipelines:
         result = _flatten_pipelines(pipelines)
         assert result == []
 
+    def test_pipeline_with_null_datasets(self):
+        """Pipeline med 'datasets:' utan värde ger inga datasets."""
+        assert _flatten_pipelines([{"id": "p", "datasets": None}]) == []
+
     def test_pipeline_without_datasets_key(self):
         """Pipeline utan datasets-nyckel ger inga datasets."""
         pipelines = [{"id": "broken"}]
@@ -69,7 +88,7 @@ class TestLoadDatasetsConfig:
             ]
         }
         path = tmp_path / "datasets.yml"
-        path.write_text(yaml.dump(config))
+        path.write_text(json.dumps(config))
         result = load_datasets_config(path)
         assert len(result) == 1
         assert result[0]["pipeline"] == "ext_restr"
@@ -83,7 +102,7 @@ class TestLoadDatasetsConfig:
             ]
         }
         path = tmp_path / "datasets.yml"
-        path.write_text(yaml.dump(config))
+        path.write_text(json.dumps(config))
         result = load_datasets_config(path)
         assert len(result) == 1
         assert result[0]["pipeline"] == "ext_restr"
@@ -100,6 +119,217 @@ class TestLoadDatasetsConfig:
         result = load_datasets_config(path)
         assert result == []
 
+    def test_loader_matches_safe_load(self, tmp_path):
+        """Snabbare loadern ger samma resultat som yaml.safe_load."""
+        text = (
+            "pipelines:\n"
+            "  - id: p1\n"
+            "    datasets:\n"
+            "      - {id: ds1, enabled: false, url: 'https://x', layers: [a, b], n: 1.5}\n"
+        )
+        path = tmp_path / "datasets.yml"
+        path.write_text(text)
+
+        result = load_datasets_config(path)
+
+        expected = yaml.safe_load(text)["pipelines"][0]["datasets"]
+        expected[0]["pipeline"] = "p1"
+        assert result == expected
+
+    def test_utf8_non_ascii(self, tmp_path):
+        """UTF-8 med å/ä/ö läses korrekt från bytes."""
+        path = tmp_path / "datasets.yml"
+        path.write_bytes(
+            "pipelines:\n"
+            "  - id: ext_restr\n"
+            "    name: Externa restriktioner – Länsstyrelsen\n"
+            "    datasets:\n"
+            "      - {id: ds1, name: Riksintresse för friluftsliv (Miljöbalken)}\n".encode()
+        )
+
+        datasets = load_datasets_config(path)
+        pipelines = load_pipelines_config(path)
+
+        assert datasets[0]["name"] == "Riksintresse för friluftsliv (Miljöbalken)"
+        assert pipelines[0]["name"] == "Externa restriktioner – Länsstyrelsen"
+
+    def test_yaml_syntax_anchors_and_flow_style(self, tmp_path):
+        """Riktig YAML (ankare, merge-nycklar, flow-stil) parsas, inte bara JSON."""
+        path = tmp_path / "datasets.yml"
+        path.write_text(
+            "defaults: &wfs {plugin: wfs, enabled: false}\n"
+            "pipelines:\n"
+            "  - id: p1\n"
+            "    datasets:\n"
+            "      - <<: *wfs\n"
+            "        id: ds1\n"
+            "      - {id: ds2, plugin: zip_shapefile}\n"
+        )
+
+        result = load_datasets_config(path)
+
+        assert result == [
+            {"plugin": "wfs", "enabled": False, "id": "ds1", "pipeline": "p1"},
+            {"id": "ds2", "plugin": "zip_shapefile", "pipeline": "p1"},
+        ]
+
+    def test_loader_prefers_libyaml(self):
+        """CSafeLoader används om PyYAML byggts med libyaml."""
+        assert _Loader is getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    def test_loader_rejects_python_tags(self, tmp_path):
+        """Loadern är fortfarande säker: python-taggar tolkas inte."""
+        path = tmp_path / "datasets.yml"
+        path.write_text("datasets: !!python/object/apply:os.system ['true']\n")
+        with pytest.raises(yaml.YAMLError):
+            load_datasets_config(path)
+
+
+class TestYamlCache:
+    """Tester för cachen av parsade YAML-filer."""
+
+    @pytest.fixture
+    def config_path(self, tmp_path):
+        config = {"pipelines": [{"id": "p1", "datasets": [{"id": "ds1"}]}]}
+        path = tmp_path / "datasets.yml"
+        path.write_text(json.dumps(config))
+        return path
+
+    def test_repeat_load_is_cached(self, config_path, monkeypatch):
+        """Oförändrad fil parsas bara en gång."""
+        calls = []
+        real_load = yaml.load
+
+        def counting_load(*args, **kwargs):
+            calls.append(1)
+            return real_load(*args, **kwargs)
+
+        monkeypatch.setattr(yaml, "load", counting_load)
+        config_loader._yaml_cache.clear()
+
+        first = load_datasets_config(config_path)
+        second = load_datasets_config(config_path)
+        load_pipelines_config(config_path)
+
+        assert first == second
+        assert len(calls) == 1
+
+    def test_mutation_does_not_poison_cache(self, config_path):
+        """Ändringar i returnerad data påverkar inte nästa laddning."""
+        first = load_datasets_config(config_path)
+        first[0]["id"] = "ändrad"
+        first.append({"id": "extra"})
+
+        second = load_datasets_config(config_path)
+
+        assert second == [{"id": "ds1", "pipeline": "p1"}]
+
+    def test_modified_file_is_reparsed(self, config_path):
+        """Ändrad mtime/storlek ger ny parsning."""
+        assert load_datasets_config(config_path)[0]["id"] == "ds1"
+
+        config_path.write_text(json.dumps({"datasets": [{"id": "ds2", "pipeline": "p"}]}))
+        st = config_path.stat()
+        os.utime(config_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+        assert load_datasets_config(config_path)[0]["id"] == "ds2"
+
+    def test_large_config_copies_are_independent(self, tmp_path):
+        """Med 10 000 datasets är varje anropares dicts egna (ingen djupkopia)."""
+        config = {
+            "pipelines": [
+                {"id": f"p{i}", "datasets": [{"id": f"ds{i}_{j}"} for j in range(100)]}
+                for i in range(100)
+            ]
+        }
+        path = tmp_path / "datasets.yml"
+        path.write_text(json.dumps(config))
+
+        first = load_datasets_config(path)
+        first[0]["id"] = "ändrad"
+        first[0]["extra"] = True
+        second = load_datasets_config(path)
+
+        assert len(second) == 10_000
+        assert second[0] == {"id": "ds0_0", "pipeline": "p0"}
+        assert second[0] is not first[0]
+
+    def test_cached_form_is_read_only(self, config_path):
+        """Den cachade strukturen går inte att ändra."""
+        load_datasets_config(config_path)
+        (_, _, data) = config_loader._yaml_cache[str(config_path.resolve())]
+
+        with pytest.raises(TypeError):
+            data["pipelines"][0]["datasets"][0]["id"] = "x"
+
+    def test_cache_is_bounded(self, tmp_path, monkeypatch):
+        """Cachen håller högst YAML_CACHE_MAX_SIZE filer (äldst ut först)."""
+        monkeypatch.setattr(config_loader, "YAML_CACHE_MAX_SIZE", 2)
+        config_loader._yaml_cache.clear()
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"d{i}.yml"
+            path.write_text("datasets: []\n")
+            load_datasets_config(path)
+            paths.append(str(path.resolve()))
+
+        assert list(config_loader._yaml_cache) == paths[1:]
+
+
+class TestJsonSidecar:
+    """Tester för JSON-sidecar (G_ETL_YAML_CACHE=1)."""
+
+    @pytest.fixture
+    def config_path(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(config_loader.YAML_SIDECAR_ENV, "1")
+        config = {"pipelines": [{"id": "p1", "name": "Åtgärder", "datasets": [{"id": "ds1"}]}]}
+        path = tmp_path / "datasets.yml"
+        path.write_text(json.dumps(config, ensure_ascii=False))
+        return path
+
+    def test_second_load_reads_json(self, config_path, monkeypatch):
+        """Efter första laddningen läses sidecaren istället för YAML."""
+        config_loader._yaml_cache.clear()
+        first = load_datasets_config(config_path)
+        assert (config_path.parent / "datasets.yml.cache.json").exists()
+
+        config_loader._yaml_cache.clear()
+        mock_load = MagicMock()
+        monkeypatch.setattr(yaml, "load", mock_load)
+        second = load_datasets_config(config_path)
+
+        mock_load.assert_not_called()
+        assert second == first
+
+    def test_stale_sidecar_is_ignored(self, config_path):
+        """Ändrad källfil gör sidecaren ogiltig."""
+        load_datasets_config(config_path)
+
+        config_path.write_text(json.dumps({"datasets": [{"id": "ny", "pipeline": "p"}]}))
+        st = config_path.stat()
+        os.utime(config_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        config_loader._yaml_cache.clear()
+
+        assert load_datasets_config(config_path)[0]["id"] == "ny"
+
+    def test_non_json_data_is_not_written(self, config_path):
+        """YAML med datum (ej JSON-bart) får ingen sidecar."""
+        config_path.write_text("datasets:\n  - {id: a, pipeline: p, from: 2024-01-01}\n")
+        config_loader._yaml_cache.clear()
+
+        load_datasets_config(config_path)
+
+        assert not (config_path.parent / "datasets.yml.cache.json").exists()
+
+    def test_disabled_by_default(self, config_path, monkeypatch):
+        """Utan miljövariabeln skrivs ingen sidecar."""
+        monkeypatch.delenv(config_loader.YAML_SIDECAR_ENV)
+        config_loader._yaml_cache.clear()
+
+        load_datasets_config(config_path)
+
+        assert not (config_path.parent / "datasets.yml.cache.json").exists()
+
 
 class TestLoadPipelinesConfig:
     """Tester för load_pipelines_config."""
@@ -120,7 +350,7 @@ class TestLoadPipelinesConfig:
             ]
         }
         path = tmp_path / "datasets.yml"
-        path.write_text(yaml.dump(config))
+        path.write_text(json.dumps(config))
         result = load_pipelines_config(path)
         assert len(result) == 1
         assert result[0]["id"] == "ext_restr"
@@ -132,6 +362,35 @@ class TestLoadPipelinesConfig:
         """Gammalt format returnerar tom lista."""
         config = {"datasets": [{"id": "ds1"}]}
         path = tmp_path / "datasets.yml"
-        path.write_text(yaml.dump(config))
+        path.write_text(json.dumps(config))
         result = load_pipelines_config(path)
         assert result == []
+
+
+class TestLoadDatasetTypes:
+    """Tester för load_dataset_types."""
+
+    def test_unique_sorted_types(self, tmp_path):
+        """Unika typer returneras sorterade, datasets utan typ ignoreras."""
+        config = {
+            "pipelines": [
+                {"id": "p1", "datasets": [{"id": "a", "type": "vatten"}, {"id": "b"}]},
+                {
+                    "id": "p2",
+                    "datasets": [{"id": "c", "type": "natur"}, {"id": "d", "type": "vatten"}],
+                },
+            ]
+        }
+        path = tmp_path / "datasets.yml"
+        path.write_text(json.dumps(config))
+        assert load_dataset_types(path) == ["natur", "vatten"]
+
+    def test_old_format(self, tmp_path):
+        """Gammalt format stöds."""
+        path = tmp_path / "datasets.yml"
+        path.write_text(json.dumps({"datasets": [{"id": "a", "type": "t"}]}))
+        assert load_dataset_types(path) == ["t"]
+
+    def test_missing_file(self, tmp_path):
+        """Saknad fil ger tom lista."""
+        assert load_dataset_types(tmp_path / "saknas.yml") == []
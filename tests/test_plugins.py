@@ -1,9 +1,11 @@
 """Tester för plugins."""
 
+from pathlib import Path
+
 import pytest
 
 from g_etl.plugins import PLUGINS, get_plugin
-from g_etl.plugins.base import ExtractResult, SourcePlugin
+from g_etl.plugins.base import ExtractResult, SourcePlugin, quote_identifier
 
 
 class TestExtractResult:
@@ -59,6 +61,18 @@ class ConcretePlugin(SourcePlugin):
         return ExtractResult(success=True, rows_count=1, message="OK")
 
 
+class TestQuoteIdentifier:
+    """Tester för quote_identifier."""
+
+    def test_plain_name(self):
+        """Vanliga namn citeras med dubbla citattecken."""
+        assert quote_identifier("naturreservat") == '"naturreservat"'
+
+    def test_embedded_quote_is_escaped(self):
+        """Citattecken i namnet dubbleras."""
+        assert quote_identifier('a"b') == '"a""b"'
+
+
 class TestSourcePluginBase:
     """Tester för SourcePlugin-basklassen."""
 
@@ -71,6 +85,31 @@ class TestSourcePluginBase:
         """Testa name-property."""
         assert plugin.name == "test_plugin"
 
+    def test_load_arrow_registers_and_unregisters(self, plugin):
+        """Arrow-tabellen registreras explicit och avregistreras även vid fel."""
+        from unittest.mock import MagicMock
+
+        conn = MagicMock()
+        conn.execute.side_effect = RuntimeError("fel")
+        arrow_tbl = object()
+
+        with pytest.raises(RuntimeError):
+            plugin._load_arrow_to_raw(conn, arrow_tbl, "tabell", "geom_wkb")
+
+        conn.register.assert_called_once_with("_arrow_tabell", arrow_tbl)
+        conn.unregister.assert_called_once_with("_arrow_tabell")
+        assert 'FROM "_arrow_tabell"' in conn.execute.call_args[0][0]
+
+    def test_create_raw_table_returns_row_count(self, plugin, duckdb_conn):
+        """CTAS-hjälparen citerar tabellnamnet, binder parametrar och ger radantalet."""
+        rows = plugin._create_raw_table(
+            duckdb_conn, 'it\'s "tabell"', "SELECT * FROM range(?) AS t(id)", [3]
+        )
+
+        assert rows == 3
+        count = duckdb_conn.execute('SELECT COUNT(*) FROM raw."it\'s ""tabell"""').fetchone()[0]
+        assert count == 3
+
     def test_extract_basic(self, plugin, duckdb_conn):
         """Testa grundläggande extract."""
         config = {"id": "test_table"}
@@ -129,8 +168,6 @@ class TestSourcePluginBase:
         assert result.output_path.endswith(".parquet")
 
         # Verifiera att filen skapades
-        from pathlib import Path
-
         assert Path(result.output_path).exists()
 
     def test_extract_to_parquet_creates_dir(self, plugin, temp_dir):
@@ -162,24 +199,27 @@ class TestPluginRegistry:
         assert isinstance(plugin, SourcePlugin)
         assert plugin.name == "wfs"
 
+    def test_get_plugin_caches(self):
+        """Upprepade anrop ger samma plugin-instans."""
+        assert get_plugin("wfs") is get_plugin("wfs")
+
     def test_get_plugin_invalid(self):
         """Testa get_plugin med ogiltig plugin."""
         with pytest.raises(ValueError) as excinfo:
             get_plugin("nonexistent_plugin")
         assert "Okänd plugin" in str(excinfo.value)
 
-    def test_all_plugins_have_name(self):
+    @pytest.mark.parametrize("plugin_name", sorted(PLUGINS))
+    def test_all_plugins_have_name(self, plugin_instances, plugin_name):
         """Kontrollera att alla plugins har name-property."""
-        for plugin_name, plugin_class in PLUGINS.items():
-            plugin = plugin_class()
-            assert plugin.name == plugin_name
+        assert plugin_instances[plugin_name].name == plugin_name
 
-    def test_all_plugins_implement_extract(self):
+    @pytest.mark.parametrize("plugin_name", sorted(PLUGINS))
+    def test_all_plugins_implement_extract(self, plugin_instances, plugin_name):
         """Kontrollera att alla plugins implementerar extract."""
-        for plugin_name, plugin_class in PLUGINS.items():
-            plugin = plugin_class()
-            assert hasattr(plugin, "extract")
-            assert callable(plugin.extract)
+        plugin = plugin_instances[plugin_name]
+        assert hasattr(plugin, "extract")
+        assert callable(plugin.extract)
 
 
 class FailingPlugin(SourcePlugin):
@@ -206,6 +246,24 @@ class TestPluginFailure:
         assert "Simulerat fel" in result.message
 
 
+class TestGeoParquetPlugin:
+    """Tester specifika för GeoParquetPlugin."""
+
+    def test_rows_count_from_ctas(self, duckdb_conn, temp_dir):
+        """Antal rader tas från CTAS-resultatet."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from g_etl.plugins.geoparquet import GeoParquetPlugin
+
+        path = temp_dir / "data.parquet"
+        pq.write_table(pa.table({"id": [1, 2, 3]}), path)
+        result = GeoParquetPlugin().extract({"id": "pq", "path": str(path)}, duckdb_conn)
+
+        assert result.success
+        assert result.rows_count == 3
+
+
 class TestZipGeoPackagePlugin:
     """Tester specifika för ZipGeoPackagePlugin."""
 
@@ -237,3 +295,587 @@ class TestZipGeoPackagePlugin:
         assert lock1 is lock2
         # Olika URL ska ge olika lås
         assert lock1 is not lock3
+
+    def test_clear_download_cache_clears_locks(self):
+        """Efter clear_download_cache skapas nya lås för samma URL."""
+        from g_etl.plugins.zip_geopackage import _get_url_lock, clear_download_cache
+
+        lock1 = _get_url_lock("https://example.com/1")
+        clear_download_cache()
+        lock2 = _get_url_lock("https://example.com/1")
+
+        assert lock1 is not lock2
+        assert _get_url_lock("https://example.com/1") is lock2
+
+    def test_st_layers_skipped_when_layer_given(self, temp_dir):
+        """Med 'layer' i config körs ingen st_layers-fråga."""
+        import zipfile
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_geopackage import ZipGeoPackagePlugin
+
+        zip_path = temp_dir / "data.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("data.gpkg", b"gpkg")
+
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (0,)
+        config = {"id": "test", "url": str(zip_path), "layer": "lager1"}
+        ZipGeoPackagePlugin().extract(config, conn)
+
+        queries = [c.args[0] for c in conn.execute.call_args_list]
+        assert not any("st_layers" in q for q in queries)
+        assert any("ST_Read(?, layer=?)" in q for q in queries)
+
+    def test_st_read_binds_path_and_layer(self, temp_dir):
+        """Sökväg och lager skickas som parametrar till ST_Read."""
+        import zipfile
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_geopackage import ZipGeoPackagePlugin
+
+        zip_path = temp_dir / "data.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("it's.gpkg", b"gpkg")
+
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (0,)
+        config = {"id": "test", "url": str(zip_path), "layer": "lager1"}
+        ZipGeoPackagePlugin().extract(config, conn)
+
+        st_read_calls = [c for c in conn.execute.call_args_list if "ST_Read" in c.args[0]]
+        assert len(st_read_calls) == 1
+        sql, params = st_read_calls[0].args
+        assert 'raw."test"' in sql
+        assert "it's.gpkg" not in sql
+        assert params[0].endswith("it's.gpkg")
+        assert params[1] == "lager1"
+
+    def test_rows_count_from_ctas_without_count_query(self, temp_dir):
+        """Radantalet tas från CTAS-resultatet utan extra COUNT(*)."""
+        import zipfile
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_geopackage import ZipGeoPackagePlugin
+
+        zip_path = temp_dir / "data.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("data.gpkg", b"gpkg")
+
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (42,)
+        config = {"id": "test", "url": str(zip_path), "layer": "lager1"}
+        result = ZipGeoPackagePlugin().extract(config, conn)
+
+        queries = [c.args[0] for c in conn.execute.call_args_list]
+        assert result.success is True
+        assert result.rows_count == 42
+        assert not any("COUNT(*)" in q for q in queries)
+
+    def test_same_zip_extracted_once(self, temp_dir):
+        """Samma zip-fil extraheras bara en gång och katalogen återanvänds."""
+        import zipfile
+
+        from g_etl.plugins.zip_geopackage import ZipGeoPackagePlugin, clear_download_cache
+
+        zip_path = temp_dir / "data.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("data.gpkg", b"gpkg")
+
+        plugin = ZipGeoPackagePlugin()
+        try:
+            dir1 = plugin._extract_cached(str(zip_path))
+            dir2 = plugin._extract_cached(str(zip_path))
+            assert dir1 == dir2
+
+            # Ändrad fil (annan storlek) ger ny extraktion
+            with zipfile.ZipFile(zip_path, "w") as zf:
+                zf.writestr("data.gpkg", b"gpkg med nytt innehall")
+            dir3 = plugin._extract_cached(str(zip_path))
+            assert dir3 != dir1
+        finally:
+            clear_download_cache()
+
+        assert not Path(dir1).exists()
+        assert not Path(dir3).exists()
+
+
+class TestZipShapefilePlugin:
+    """Tester specifika för ZipShapefilePlugin."""
+
+    @pytest.fixture
+    def shp_zip(self, temp_dir):
+        """Zip-fil med en (falsk) shapefile och kompanjonsfiler."""
+        import zipfile
+
+        zip_path = temp_dir / "data.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("lager.shp", b"shp")
+            zf.writestr("lager.dbf", b"dbf")
+            zf.writestr("lager.shx", b"shx")
+        return zip_path
+
+    @pytest.fixture
+    def cache_settings(self, temp_dir, monkeypatch):
+        """Lägg den persistenta cachen i en temporär data-katalog."""
+        from g_etl.settings import settings
+
+        monkeypatch.setattr(settings, "DATA_DIR", temp_dir / "data")
+        monkeypatch.setattr(settings, "SHAPEFILE_CACHE_PERSIST", True)
+        return settings
+
+    def test_download_and_extract_is_cached(self, shp_zip, cache_settings):
+        """Andra anropet för samma källa använder cachen utan ny extraktion."""
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        plugin = ZipShapefilePlugin()
+        logs = []
+        try:
+            first = plugin._download_and_extract(str(shp_zip))
+            second = plugin._download_and_extract(str(shp_zip), on_log=logs.append)
+            assert first == second
+            assert any("cachad" in msg for msg in logs)
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+    def test_extraction_persists_between_runs(self, shp_zip, cache_settings):
+        """Efter clear_shapefile_cache() återanvänds extraktionen via manifestet."""
+        from g_etl.plugins.zip_shapefile import (
+            ZipShapefilePlugin,
+            _manifest_path,
+            clear_shapefile_cache,
+        )
+
+        plugin = ZipShapefilePlugin()
+        try:
+            _, extract_dir = plugin._download_and_extract(str(shp_zip))
+            assert _manifest_path().exists()
+
+            # Simulera ny körning: in-memory-cachen töms, extraktionen ligger kvar
+            clear_shapefile_cache()
+            assert Path(extract_dir).exists()
+            assert shp_zip.exists()  # Lokal källfil ska aldrig tas bort
+
+            logs = []
+            _, second_dir = plugin._download_and_extract(str(shp_zip), on_log=logs.append)
+            assert second_dir == extract_dir
+            assert any("tidigare körning" in msg for msg in logs)
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+        assert not Path(extract_dir).exists()
+        assert not _manifest_path().exists()
+
+    def test_changed_source_is_reextracted(self, shp_zip, cache_settings):
+        """Ändrad källfil ger ny extraktion istället för cachad."""
+        import zipfile
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        plugin = ZipShapefilePlugin()
+        try:
+            _, extract_dir = plugin._download_and_extract(str(shp_zip))
+            clear_shapefile_cache()
+
+            with zipfile.ZipFile(shp_zip, "w") as zf:
+                zf.writestr("nytt.shp", b"nytt innehall")
+
+            logs = []
+            _, second_dir = plugin._download_and_extract(str(shp_zip), on_log=logs.append)
+            assert not any("tidigare körning" in msg for msg in logs)
+            assert (Path(second_dir) / "nytt.shp").exists()
+            assert not (Path(second_dir) / "lager.shp").exists()
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+    def test_persistence_disabled(self, shp_zip, cache_settings, monkeypatch):
+        """Med SHAPEFILE_CACHE_PERSIST=False tas extraktionen bort vid rensning."""
+        from g_etl.plugins.zip_shapefile import (
+            ZipShapefilePlugin,
+            _manifest_path,
+            clear_shapefile_cache,
+        )
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_PERSIST", False)
+        plugin = ZipShapefilePlugin()
+        _, extract_dir = plugin._download_and_extract(str(shp_zip))
+        clear_shapefile_cache()
+
+        assert not Path(extract_dir).exists()
+        assert not _manifest_path().exists()
+        assert shp_zip.exists()
+
+    def test_only_wanted_shapefile_is_extracted(self, temp_dir, cache_settings):
+        """Med shp_filename extraheras bara den shapefilens filer."""
+        import zipfile
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        zip_path = temp_dir / "flera.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            for stem in ("vagar", "sjoar"):
+                for ext in (".shp", ".dbf", ".shx", ".prj"):
+                    zf.writestr(f"data/{stem}{ext}", stem.encode())
+            zf.writestr("readme.pdf", b"pdf")
+
+        plugin = ZipShapefilePlugin()
+        try:
+            _, vagar_dir = plugin._download_and_extract(str(zip_path), wanted_basename="vagar.shp")
+            names = sorted(p.name for p in Path(vagar_dir).rglob("*") if p.is_file())
+            assert names == ["vagar.dbf", "vagar.prj", "vagar.shp", "vagar.shx"]
+
+            # Annan shapefile ur samma arkiv får en egen extraktion
+            _, sjoar_dir = plugin._download_and_extract(str(zip_path), wanted_basename="sjoar.shp")
+            assert sjoar_dir != vagar_dir
+            assert (Path(sjoar_dir) / "data" / "sjoar.shp").exists()
+
+            # Okänt namn ger full extraktion
+            _, all_dir = plugin._download_and_extract(str(zip_path), wanted_basename="saknas.shp")
+            assert (Path(all_dir) / "readme.pdf").exists()
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+    def test_small_archive_extracted_to_ram(self, shp_zip, cache_settings, monkeypatch):
+        """Små arkiv extraheras till RAM-katalogen, stora till vanlig temp."""
+        from g_etl.plugins import zip_shapefile
+
+        ram_dir = shp_zip.parent / "shm"
+        ram_dir.mkdir()
+        monkeypatch.setattr(zip_shapefile, "RAM_TEMP_DIR", ram_dir)
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_PERSIST", False)
+        plugin = zip_shapefile.ZipShapefilePlugin()
+        try:
+            _, extract_dir = plugin._download_and_extract(str(shp_zip))
+            assert Path(extract_dir).parent == ram_dir
+            zip_shapefile.clear_shapefile_cache()
+
+            monkeypatch.setattr(cache_settings, "SHAPEFILE_RAM_EXTRACT_MAX_MB", 0)
+            _, extract_dir = plugin._download_and_extract(str(shp_zip))
+            assert Path(extract_dir).parent != ram_dir
+        finally:
+            zip_shapefile.clear_shapefile_cache()
+
+    def test_pyogrio_fallback_quotes_identifiers(self, temp_dir):
+        """Pyogrio-vägen citerar tabell- och geometrikolumnnamn i SQL."""
+        from unittest.mock import MagicMock, patch
+
+        import pyarrow as pa
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin
+
+        arrow_tbl = pa.table({"id": [1], 'geo"m': [b""]})
+        conn = MagicMock()
+        with patch(
+            "pyogrio.read_arrow",
+            return_value=({"geometry_columns": ['geo"m']}, arrow_tbl),
+        ):
+            rows = ZipShapefilePlugin()._read_with_pyogrio(
+                conn, temp_dir / "x.shp", "min-tabell", "LATIN1"
+            )
+
+        assert rows == 1
+        sql = conn.execute.call_args[0][0]
+        assert 'CREATE OR REPLACE TABLE raw."min-tabell"' in sql
+        assert 'ST_GeomFromWKB("geo""m")' in sql
+
+    def test_extract_creates_rtree_index(self, shp_zip, cache_settings, monkeypatch):
+        """Efter laddning skapas R-tree-index, om SHAPEFILE_AUTO_INDEX är på."""
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        config = {"url": str(shp_zip), "id": "lager"}
+        try:
+            conn = MagicMock()
+            conn.execute.return_value.fetchone.return_value = (3,)
+            result = ZipShapefilePlugin().extract(config, conn)
+            assert result.success
+            sqls = [c[0][0] for c in conn.execute.call_args_list]
+            assert any("USING RTREE (geom)" in sql for sql in sqls)
+
+            monkeypatch.setattr(cache_settings, "SHAPEFILE_AUTO_INDEX", False)
+            conn = MagicMock()
+            conn.execute.return_value.fetchone.return_value = (3,)
+            ZipShapefilePlugin().extract(config, conn)
+            sqls = [c[0][0] for c in conn.execute.call_args_list]
+            assert not any("RTREE" in sql for sql in sqls)
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+    def test_prefetch_downloads_once(self, shp_zip, cache_settings, monkeypatch):
+        """Förhämtad zip återanvänds av extract utan ny nedladdning."""
+        import shutil
+        from unittest.mock import patch
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_PERSIST", False)
+        url = "https://example.com/data.zip"
+
+        def fake_download(**kwargs):
+            target = shp_zip.parent / "nedladdad.zip"
+            shutil.copy(shp_zip, target)
+            return target
+
+        plugin = ZipShapefilePlugin()
+        try:
+            with patch(
+                "g_etl.plugins.zip_shapefile.download_file_streaming", side_effect=fake_download
+            ) as download:
+                plugin.prefetch({"url": url})
+                _, extract_dir = plugin._download_and_extract(url)
+
+            assert download.call_count == 1
+            assert (Path(extract_dir) / "lager.shp").exists()
+        finally:
+            clear_shapefile_cache()
+
+        assert not (shp_zip.parent / "nedladdad.zip").exists()
+
+    def test_extract_selects_configured_columns(self, shp_zip, cache_settings):
+        """Med columns i config läser ST_Read bara de kolumnerna plus geom."""
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        config = {"url": str(shp_zip), "id": "lager", "columns": ["namn", "typ"]}
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (3,)
+        try:
+            ZipShapefilePlugin().extract(config, conn)
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+        sql = conn.execute.call_args_list[0][0][0]
+        assert 'SELECT "namn", "typ", "geom" FROM ST_Read(?)' in sql
+
+    def test_extract_cache_evicts_least_recently_used(self, temp_dir, cache_settings, monkeypatch):
+        """Äldsta posten och dess katalog tas bort när cachen är full."""
+        from g_etl.plugins.zip_shapefile import _extract_cache, clear_shapefile_cache
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_MAX_ENTRIES", 2)
+        dirs = []
+        for i in range(3):
+            d = temp_dir / f"ext{i}"
+            d.mkdir()
+            dirs.append(d)
+        try:
+            _extract_cache["a"] = ("", str(dirs[0]))
+            _extract_cache["b"] = ("", str(dirs[1]))
+            _extract_cache.get("a")  # a blir senast använd
+            _extract_cache["c"] = ("", str(dirs[2]))
+
+            assert _extract_cache.get("b") is None
+            assert not dirs[1].exists()
+            assert _extract_cache.get("a") == ("", str(dirs[0]))
+            assert len(_extract_cache) == 2
+        finally:
+            clear_shapefile_cache()
+
+    def test_extract_cache_ttl(self, temp_dir, cache_settings, monkeypatch):
+        """Poster äldre än TTL räknas som saknade."""
+        from g_etl.plugins import zip_shapefile
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_TTL_SECONDS", 10)
+        now = [1000.0]
+        monkeypatch.setattr(zip_shapefile.time, "monotonic", lambda: now[0])
+        extract_dir = temp_dir / "ext"
+        extract_dir.mkdir()
+        try:
+            zip_shapefile._extract_cache["a"] = ("", str(extract_dir))
+            assert zip_shapefile._extract_cache.get("a") is not None
+            now[0] += 11
+            assert zip_shapefile._extract_cache.get("a") is None
+            assert not extract_dir.exists()
+        finally:
+            zip_shapefile.clear_shapefile_cache()
+
+    def test_extract_cache_skips_pinned_on_eviction(self, temp_dir, cache_settings, monkeypatch):
+        """En pinnad post kastas inte ut, den äldsta opinnade tas istället."""
+        from g_etl.plugins.zip_shapefile import _extract_cache, clear_shapefile_cache
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_MAX_ENTRIES", 2)
+        dirs = []
+        for i in range(3):
+            d = temp_dir / f"ext{i}"
+            d.mkdir()
+            dirs.append(d)
+        try:
+            _extract_cache.put("a", ("", str(dirs[0])), pin=True)
+            _extract_cache["b"] = ("", str(dirs[1]))
+            _extract_cache["c"] = ("", str(dirs[2]))
+
+            assert dirs[0].exists()
+            assert not dirs[1].exists()
+            assert _extract_cache.get("a") == ("", str(dirs[0]))
+        finally:
+            _extract_cache.release(("", str(dirs[0])))
+            clear_shapefile_cache()
+
+    def test_extract_cache_defers_delete_until_release(self, temp_dir, cache_settings, monkeypatch):
+        """En pinnad post som passerat TTL tas bort först vid release."""
+        from g_etl.plugins import zip_shapefile
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_CACHE_TTL_SECONDS", 10)
+        now = [1000.0]
+        monkeypatch.setattr(zip_shapefile.time, "monotonic", lambda: now[0])
+        extract_dir = temp_dir / "ext"
+        extract_dir.mkdir()
+        entry = ("", str(extract_dir))
+        try:
+            zip_shapefile._extract_cache.put("a", entry, pin=True)
+            now[0] += 11
+            assert zip_shapefile._extract_cache.get("a") is None
+            assert extract_dir.exists()
+
+            zip_shapefile._extract_cache.release(entry)
+            assert not extract_dir.exists()
+        finally:
+            zip_shapefile.clear_shapefile_cache()
+
+    def test_clear_deletes_outside_lock(self, temp_dir, monkeypatch):
+        """Kataloger tas bort efter att det globala låset släppts."""
+        from g_etl.plugins import zip_shapefile
+
+        extract_dir = temp_dir / "ext"
+        extract_dir.mkdir()
+        zip_shapefile._extract_cache["a"] = ("", str(extract_dir))
+
+        locked_during_rmtree = []
+        real_rmtree = zip_shapefile.shutil.rmtree
+
+        def spy_rmtree(path, *args, **kwargs):
+            locked_during_rmtree.append(zip_shapefile._global_lock.locked())
+            real_rmtree(path, *args, **kwargs)
+
+        monkeypatch.setattr(zip_shapefile.shutil, "rmtree", spy_rmtree)
+        zip_shapefile.clear_shapefile_cache()
+
+        assert locked_during_rmtree == [False]
+        assert not extract_dir.exists()
+        assert len(zip_shapefile._extract_cache) == 0
+
+    def test_extract_warns_about_missing_companions(self, temp_dir, cache_settings):
+        """Saknade .dbf/.shx loggas som varning."""
+        import zipfile
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_shapefile import (
+            ZipShapefilePlugin,
+            _extract_cache,
+            clear_shapefile_cache,
+        )
+
+        zip_path = temp_dir / "utan_shx.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("lager.shp", b"shp")
+            zf.writestr("lager.dbf", b"dbf")
+
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (1,)
+        logs = []
+        try:
+            ZipShapefilePlugin().extract({"url": str(zip_path), "id": "lager"}, conn, logs.append)
+            # Pinnen släpps när läsningen är klar
+            assert not _extract_cache._pins
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+        assert "Varning: saknar kompanjonsfiler: ['.shx']" in logs
+
+    def test_extract_unknown_shp_filename(self, temp_dir, cache_settings):
+        """Okänt shp_filename ger fel som listar tillgängliga shapefiles."""
+        import zipfile
+        from unittest.mock import MagicMock
+
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin, clear_shapefile_cache
+
+        zip_path = temp_dir / "flera.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            for name in ("a/vagar.shp", "sjoar.shp"):
+                zf.writestr(name, b"shp")
+
+        config = {"url": str(zip_path), "id": "x", "shp_filename": "saknas.shp"}
+        try:
+            result = ZipShapefilePlugin().extract(config, MagicMock())
+            assert not result.success
+            assert result.message == (
+                "Shapefile 'saknas.shp' finns inte. Tillgängliga: vagar.shp, sjoar.shp"
+            )
+
+            # Sökväg i shp_filename matchas på filnamnet
+            conn = MagicMock()
+            conn.execute.return_value.fetchone.return_value = (1,)
+            config["shp_filename"] = "a/vagar.shp"
+            result = ZipShapefilePlugin().extract(config, conn)
+            assert result.success
+            assert "vagar.shp" in result.message
+        finally:
+            clear_shapefile_cache(include_persistent=True)
+
+    def test_dir_exists_is_cached(self, temp_dir, monkeypatch):
+        """Positiva existenskontroller återanvänds inom TTL."""
+        import shutil
+
+        from g_etl.plugins import zip_shapefile
+
+        now = [1000.0]
+        monkeypatch.setattr(zip_shapefile.time, "monotonic", lambda: now[0])
+        extract_dir = temp_dir / "ext"
+        extract_dir.mkdir()
+        path = str(extract_dir)
+
+        assert zip_shapefile._dir_exists(path)
+        shutil.rmtree(extract_dir)
+        assert zip_shapefile._dir_exists(path)  # Inom TTL, ingen ny kontroll
+
+        now[0] += zip_shapefile.EXISTS_CHECK_TTL_SECONDS
+        assert not zip_shapefile._dir_exists(path)
+
+    def test_choose_extract_strategy(self, temp_dir, cache_settings, monkeypatch):
+        """Strategin väljs utifrån storlek, antal filer och RAM-utrymme."""
+        from g_etl.plugins import zip_shapefile
+        from g_etl.plugins.zip_shapefile import ExtractStrategy, _choose_extract_strategy
+
+        monkeypatch.setattr(zip_shapefile, "RAM_TEMP_DIR", temp_dir)
+        large = zip_shapefile.PARALLEL_EXTRACT_MIN_BYTES
+
+        assert _choose_extract_strategy(1000, 3) == ExtractStrategy.RAM
+        assert _choose_extract_strategy(1000, 3, allow_ram=False) == ExtractStrategy.DISK
+        assert _choose_extract_strategy(large, 3, allow_ram=False) == (
+            ExtractStrategy.DISK_PARALLEL
+        )
+        assert _choose_extract_strategy(large, 1, allow_ram=False) == ExtractStrategy.DISK
+
+        monkeypatch.setattr(cache_settings, "SHAPEFILE_RAM_EXTRACT_MAX_MB", 0)
+        assert _choose_extract_strategy(1000, 3) == ExtractStrategy.DISK
+
+    def test_list_shapefiles_recursive(self, temp_dir):
+        """Shapefiles hittas i underkataloger och returneras sorterade."""
+        from g_etl.plugins.zip_shapefile import ZipShapefilePlugin
+
+        (temp_dir / "b" / "c").mkdir(parents=True)
+        for rel in ("b/c/z.shp", "a.shp", "b/m.shp", "b/m.dbf", "readme.txt"):
+            (temp_dir / rel).write_bytes(b"")
+
+        found = ZipShapefilePlugin()._list_shapefiles(str(temp_dir))
+
+        assert found == sorted(temp_dir / rel for rel in ("a.shp", "b/m.shp", "b/c/z.shp"))
+
+    def test_get_url_lock_same_url(self):
+        """Samma URL ger samma lås."""
+        from g_etl.plugins.zip_shapefile import _get_url_lock
+
+        assert _get_url_lock("https://example.com/a.zip") is _get_url_lock(
+            "https://example.com/a.zip"
+        )
+
+    def test_url_locks_are_per_url(self):
+        """Olika URL:er delar aldrig lås (en nedladdning blockerar inte en annan)."""
+        from g_etl.plugins.zip_shapefile import _get_url_lock, clear_shapefile_cache
+
+        try:
+            locks = {id(_get_url_lock(f"https://example.com/{i}.zip")) for i in range(200)}
+            assert len(locks) == 200
+        finally:
+            clear_shapefile_cache()
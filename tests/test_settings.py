@@ -3,10 +3,37 @@
 import os
 from pathlib import Path
 
+import pytest
 import yaml
 
 from g_etl.settings import Settings, _load_config, settings
 
+# libyaml-dumpern om den finns, annars ren Python
+_Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Förväntade standardvärden i settings-singletonen
+EXPECTED_SETTINGS = {
+    "DB_PREFIX": "warehouse",
+    "DB_EXTENSION": ".duckdb",
+    "DB_KEEP_COUNT": 3,
+    "H3_RESOLUTION": 13,
+    "H3_POLYFILL_RESOLUTION": 11,
+    "H3_LINE_RESOLUTION": 12,
+    "H3_POINT_RESOLUTION": 13,
+    "H3_LINE_BUFFER_METERS": 10,
+    "EXTRACT_TIMEOUT_SECONDS": 300,
+    "SHAPEFILE_CACHE_PERSIST": False,
+    "SOURCE_CRS": "EPSG:3006",
+    "TARGET_CRS": "EPSG:4326",
+    "datasets_path": Path("config/datasets.yml"),
+}
+
+
+@pytest.fixture(scope="session")
+def settings_snapshot():
+    """Ögonblicksbild av singletonens värden, läses en gång per session."""
+    return {name: getattr(settings, name) for name in EXPECTED_SETTINGS}
+
 
 class TestSettings:
     """Tester för Settings-klassen."""
@@ -25,30 +52,17 @@ class TestSettings:
         assert s.LOG_SQL_DIR == Path("data/log_sql")
         assert s.SQL_DIR == Path("sql")
 
-    def test_db_settings(self):
-        """Kontrollera databas-inställningar."""
-        assert settings.DB_PREFIX == "warehouse"
-        assert settings.DB_EXTENSION == ".duckdb"
-        assert settings.DB_KEEP_COUNT == 3
-
-    def test_h3_settings(self):
-        """Kontrollera H3-inställningar."""
-        assert settings.H3_RESOLUTION == 13
-        assert settings.H3_POLYFILL_RESOLUTION == 11
-        assert settings.H3_LINE_RESOLUTION == 12
-        assert settings.H3_POINT_RESOLUTION == 13
-        assert settings.H3_LINE_BUFFER_METERS == 10
+    def test_singleton_values(self, settings_snapshot):
+        """Kontrollera exakta standardvärden i singleton-instansen."""
+        assert settings_snapshot == EXPECTED_SETTINGS
 
     def test_pipeline_settings(self):
         """Kontrollera pipeline-inställningar."""
         assert settings.MAX_CONCURRENT_EXTRACTS >= 1
         assert settings.MAX_CONCURRENT_SQL >= 2
-        assert settings.EXTRACT_TIMEOUT_SECONDS == 300
 
     def test_crs_settings(self):
-        """Kontrollera koordinatsystem-inställningar."""
-        assert settings.SOURCE_CRS == "EPSG:3006"
-        assert settings.TARGET_CRS == "EPSG:4326"
+        """Kontrollera proj4-strängar för koordinatsystemen."""
         assert "utm" in settings.PROJ4_SWEREF99_TM.lower()
         assert "wgs84" in settings.PROJ4_WGS84.lower()
 
@@ -68,10 +82,6 @@ class TestSettings:
         for schema in required:
             assert schema in settings.DUCKDB_SCHEMAS
 
-    def test_datasets_path(self):
-        """Kontrollera sökväg till datasets.yml."""
-        assert settings.datasets_path == Path("config/datasets.yml")
-
     def test_get_db_path_with_name(self, temp_dir):
         """Testa get_db_path med specifikt namn."""
         test_settings = Settings(config_path=Path("nonexistent.yml"))
@@ -190,7 +200,7 @@ class TestConfigLoading:
             "logs_dir": "/var/log/g-etl",
         }
         config_file = tmp_path / "config.yml"
-        config_file.write_text(yaml.dump(config))
+        config_file.write_text(yaml.dump(config, Dumper=_Dumper))
 
         s = Settings(config_path=config_file)
 
@@ -214,7 +224,7 @@ class TestConfigLoading:
         """Miljövariabel G_ETL_DATA_DIR har högre prioritet än YAML."""
         config = {"data_dir": "/from/yaml"}
         config_file = tmp_path / "config.yml"
-        config_file.write_text(yaml.dump(config))
+        config_file.write_text(yaml.dump(config, Dumper=_Dumper))
 
         monkeypatch.setenv("G_ETL_DATA_DIR", "/from/env")
         s = Settings(config_path=config_file)
@@ -226,7 +236,7 @@ class TestConfigLoading:
         """Partiell config - bara H3-sektion, övriga får defaults."""
         config = {"h3": {"resolution": 10}}
         config_file = tmp_path / "config.yml"
-        config_file.write_text(yaml.dump(config))
+        config_file.write_text(yaml.dump(config, Dumper=_Dumper))
 
         s = Settings(config_path=config_file)
 
@@ -261,6 +271,16 @@ class TestConfigLoading:
         assert s.SQL_DIR == Path("sql")
         assert s.CONFIG_DIR == Path("config")
 
+    def test_slots_reject_unknown_attributes(self):
+        """Kända inställningar kan pekas om, felstavade attribut ger fel."""
+        s = Settings(config_path=Path("nonexistent.yml"))
+        s.CONFIG_DIR = Path("annan/config")
+        assert s.CONFIG_DIR == Path("annan/config")
+        assert not hasattr(s, "__dict__")
+
+        with pytest.raises(AttributeError):
+            s.DATA_DRI = Path("fel")
+
 
 class TestCpuCount:
     """Tester för CPU-räkning."""
@@ -284,5 +304,28 @@ class TestCpuCount:
         # Importera _cpu_count-funktionen direkt
         from g_etl.settings import _cpu_count
 
-        result = _cpu_count()
-        assert result == 4
+        _cpu_count.cache_clear()
+        try:
+            result = _cpu_count()
+            assert result == 4
+        finally:
+            _cpu_count.cache_clear()
+
+    def test_cpu_count_is_cached(self, monkeypatch):
+        """os.cpu_count() anropas bara en gång."""
+        from g_etl.settings import _cpu_count
+
+        calls = []
+
+        def mock_cpu_count():
+            calls.append(1)
+            return 8
+
+        monkeypatch.setattr(os, "cpu_count", mock_cpu_count)
+        _cpu_count.cache_clear()
+        try:
+            assert _cpu_count() == 8
+            assert _cpu_count() == 8
+            assert len(calls) == 1
+        finally:
+            _cpu_count.cache_clear()
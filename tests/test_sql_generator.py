@@ -1,16 +1,31 @@
 """Tester för sql_generator.py med multi-pipeline-stöd."""
 
+import dataclasses
+
 import pytest
 
 from g_etl.sql_generator import (
     DatasetConfig,
     SQLGenerator,
     TemplateInfo,
+    TemplateKind,
+    _schema_name,
+    _value_expr,
     get_generator,
     list_templates,
+    reset_generator,
 )
 
 
+@pytest.fixture(scope="module")
+def generator():
+    """Delad SQLGenerator-singleton (migrationsindexet byggs en gång per modul).
+
+    Tester som fyller cacharna skapar egna instanser mot temp_sql_dir.
+    """
+    return get_generator()
+
+
 class TestDatasetConfig:
     """Tester för DatasetConfig."""
 
@@ -26,6 +41,15 @@ class TestDatasetConfig:
         assert config.h3_point_resolution == 13
         assert config.h3_line_buffer_meters == 10
 
+    def test_is_frozen_with_slots(self):
+        """DatasetConfig är oföränderlig och saknar __dict__."""
+        config = DatasetConfig(dataset_id="test")
+
+        assert not hasattr(config, "__dict__")
+        assert config.data_mappings is None
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            config.dataset_id = "annat"  # type: ignore[misc]
+
     def test_from_dataset_yml(self, sample_dataset_config):
         """Testa skapande från datasets.yml-format."""
         config = DatasetConfig.from_dataset_yml("test_dataset", sample_dataset_config)
@@ -74,11 +98,6 @@ class TestDatasetConfig:
 class TestSQLGenerator:
     """Tester för SQLGenerator."""
 
-    @pytest.fixture
-    def generator(self):
-        """Skapa en SQLGenerator-instans."""
-        return SQLGenerator()
-
     @pytest.fixture
     def temp_sql_dir(self, temp_dir):
         """Skapa temporär SQL-katalog med testmallar."""
@@ -123,6 +142,13 @@ DROP TABLE IF EXISTS staging.{{ dataset_id }};
         assert generator._get_column_name("$column_name") == "column_name"
         assert generator._get_column_name("literal") == "literal"
 
+    def test_value_expr(self):
+        """Kolumnreferens, literal och tomt värde ger rätt SQL-uttryck."""
+        assert _value_expr("$kolumn") == "COALESCE(s.kolumn::VARCHAR, '')"
+        assert _value_expr("literal") == "'literal'"
+        assert _value_expr("") == "''"
+        assert _value_expr(None) == "''"
+
     def test_build_variables_basic(self, generator, sample_dataset_config):
         """Testa grundläggande variabelbyggande."""
         config = DatasetConfig.from_dataset_yml("test", sample_dataset_config)
@@ -172,6 +198,76 @@ DROP TABLE IF EXISTS staging.{{ dataset_id }};
         result = generator._substitute(template, variables)
         assert result == "SELECT * FROM test"
 
+    def test_substitute_keeps_unknown_placeholders(self, generator):
+        """Okända platshållare lämnas orörda."""
+        template = "SELECT {{ a }}, {{b}}, {{ okand }} FROM t"
+
+        result = generator._substitute(template, {"a": "1", "b": "2"})
+        assert result == "SELECT 1, 2, {{ okand }} FROM t"
+
+    def test_compiled_template_is_cached(self, temp_sql_dir):
+        """Templates kompileras en gång och återanvänds."""
+        generator = SQLGenerator(sql_path=temp_sql_dir)
+
+        first = generator._load_compiled("004_test_template.sql")
+        second = generator._load_compiled("004_test_template.sql")
+
+        assert first is second
+        statics, placeholders = first
+        assert len(statics) == len(placeholders) + 1
+
+    def test_render_template_does_not_mutate_config(self, temp_sql_dir):
+        """render_template med DatasetConfig använder dataset_id utan att ändra objektet."""
+        generator = SQLGenerator(sql_path=temp_sql_dir)
+        config = DatasetConfig(dataset_id="original", klass="k")
+
+        sql = generator.render_template("004_test_template.sql", "nytt", config)
+
+        assert "staging.nytt" in sql
+        assert config.dataset_id == "original"
+
+    def test_render_is_deterministic(self, temp_sql_dir):
+        """Samma variabler ger samma SQL, andra variabler ger annan SQL."""
+        generator = SQLGenerator(sql_path=temp_sql_dir)
+
+        first = generator.render_template("004_test_template.sql", "ds1")
+        second = generator.render_template("004_test_template.sql", "ds1")
+        other = generator.render_template("004_test_template.sql", "ds2")
+
+        assert first == second
+        assert "staging.ds1" in first
+        assert "staging.ds2" in other
+
+    def test_render_matches_build_variables(self, temp_sql_dir):
+        """Rendering med on-demand-variabler ger samma SQL som full variabel-dict."""
+        placeholders = " ".join(
+            "{{ " + name + " }}"
+            for name in [
+                *SQLGenerator()._build_variables(DatasetConfig()),
+                "egen_expr",
+                "okand",
+            ]
+        )
+        (temp_sql_dir / "migrations" / "010_all_vars_template.sql").write_text(
+            f"-- migrate:up\nSELECT {placeholders};\n"
+        )
+        generator = SQLGenerator(sql_path=temp_sql_dir)
+        config = DatasetConfig(
+            dataset_id="ds",
+            source_id_column="$id",
+            grupp="$kat",
+            typ="t",
+            data_mappings={"data_2": "$kol", "egen": "x", "grupp": "överstyrd"},
+        )
+        path = "010_all_vars_template.sql"
+
+        sql = generator.render_template(path, "ds", config)
+        variables = generator._build_variables(config, path)
+
+        assert sql == generator._substitute(generator._load_template(path), variables)
+        assert "{{ okand }}" in sql
+        assert "'överstyrd'" in sql
+
     def test_render_template(self, temp_sql_dir):
         """Testa rendering av template."""
         generator = SQLGenerator(sql_path=temp_sql_dir)
@@ -298,12 +394,83 @@ class TestSQLGeneratorPipeline:
         assert templates[1].relative_path == "aab_ext_restr/001_staging_normalisering_template.sql"
         assert templates[2].pipeline == "ext_restr"
 
+    def test_render_all_templates_keeps_order(self, pipeline_sql_dir):
+        """render_all_templates returnerar templates i körningsordning."""
+        gen = SQLGenerator(sql_path=pipeline_sql_dir)
+
+        results = gen.render_all_templates("ds", {}, pipeline="ext_restr")
+
+        assert [path for path, _ in results] == [
+            t.relative_path for t in gen.list_templates(pipeline="ext_restr")
+        ]
+        assert "staging_ext_restr_001.ds" in results[1][1]
+
+    def test_migrations_index_is_built_once(self, pipeline_sql_dir):
+        """Katalogen läses en gång; indexet byggs om när sql_path ändras."""
+        gen = SQLGenerator(sql_path=pipeline_sql_dir)
+        assert len(gen.list_templates(pipeline="ext_restr")) == 3
+
+        (pipeline_sql_dir / "migrations" / "005_extra_template.sql").write_text("SELECT 1;")
+        assert len(gen.list_templates(pipeline="ext_restr")) == 3
+
+        gen.sql_path = pipeline_sql_dir / "saknas"
+        assert gen.list_templates(pipeline="ext_restr") == []
+        assert gen.list_pipeline_dirs() == []
+
+    def test_preload(self, pipeline_sql_dir):
+        """preload läser och kompilerar alla templates för pipelinen."""
+        gen = SQLGenerator(sql_path=pipeline_sql_dir)
+        gen.preload("ext_restr")
+
+        assert set(gen._compiled_cache) == {
+            "004_staging_transform_template.sql",
+            "aab_ext_restr/001_staging_normalisering_template.sql",
+            "aab_ext_restr/002_mart_h3_cells_template.sql",
+        }
+        assert "{{ prev_schema }}" in gen._load_template(
+            "aab_ext_restr/001_staging_normalisering_template.sql"
+        )
+
     def test_schema_name_root(self):
         """Testa schema-generering för root-templates."""
         gen = SQLGenerator()
         assert gen._get_schema_name("004_staging_transform_template.sql") == "staging_004"
         assert gen._get_schema_name("006_mart_h3_cells_template.sql") == "mart"
 
+    def test_schema_helpers_are_memoized(self):
+        """Schema-hjälparna räknas ut en gång per (template, pipeline)."""
+        _schema_name.cache_clear()
+        gen = SQLGenerator()
+        for _ in range(3):
+            gen._get_schema_name("004_staging_transform_template.sql")
+
+        info = _schema_name.cache_info()
+        assert (info.misses, info.hits) == (1, 2)
+
+    def test_template_info_kind(self):
+        """TemplateInfo får typ (staging/mart/övrig) ur filnamnet."""
+        staging = TemplateInfo("001_Staging_a_template.sql", "001", None, None, "001")
+        mart = TemplateInfo("002_mart_b_template.sql", "002", None, None, "002")
+        other = TemplateInfo("003_index_template.sql", "003", None, None, "003")
+
+        assert staging.kind == TemplateKind.STAGING
+        assert mart.kind == TemplateKind.MART
+        assert other.kind == TemplateKind.OTHER
+
+    def test_prev_schema_mart_uses_pipeline_templates(self):
+        """Mart i pipeline slås upp i pipeline_templates även när cachad."""
+        gen = SQLGenerator()
+        templates = [
+            TemplateInfo(
+                "001_staging_a_template.sql", "p/001", "ext_restr", "aab_ext_restr", "001"
+            ),
+            TemplateInfo("002_mart_b_template.sql", "p/002", "ext_restr", "aab_ext_restr", "002"),
+        ]
+        mart = "002_mart_b_template.sql"
+
+        assert gen._get_prev_schema_name(mart, "ext_restr", templates) == "staging_ext_restr_001"
+        assert gen._get_prev_schema_name(mart, "ext_restr", templates[1:]) == "staging_004"
+
     def test_schema_name_with_pipeline(self):
         """Testa pipeline-scopade scheman."""
         gen = SQLGenerator()
@@ -419,6 +586,20 @@ class TestModuleFunctions:
         gen2 = get_generator()
         assert gen1 is gen2
 
+    def test_reset_generator(self, monkeypatch, temp_dir):
+        """reset_generator ger en ny instans som följer aktuell settings.SQL_DIR."""
+        original = get_generator()
+        monkeypatch.setattr("g_etl.sql_generator.settings.SQL_DIR", temp_dir)
+        try:
+            fresh = reset_generator()
+
+            assert fresh is not original
+            assert get_generator() is fresh
+            assert fresh.sql_path == temp_dir
+        finally:
+            monkeypatch.undo()
+            reset_generator()
+
     def test_list_templates_function(self):
         """Testa list_templates-funktionen."""
         templates = list_templates()
@@ -459,6 +640,12 @@ class TestSQLGeneratorEdgeCases:
         # data_3-5 ska vara tomma
         assert variables["data_3_expr"] == "''"
 
+    def test_data_exprs_without_mappings(self):
+        """Utan data_mappings finns ändå data_1..data_5, alla tomma."""
+        variables = SQLGenerator()._build_variables(DatasetConfig(dataset_id="test"))
+
+        assert [variables[f"data_{i}_expr"] for i in range(1, 6)] == ["''"] * 5
+
     def test_none_typ(self):
         """Testa med None som typ."""
         config = DatasetConfig(dataset_id="test", typ=None)
@@ -467,6 +654,21 @@ class TestSQLGeneratorEdgeCases:
 
         assert variables["typ_expr"] == "''"
 
+    def test_load_template_markers(self, temp_dir):
+        """Bara up-sektionen läses, med eller utan markörer, som UTF-8."""
+        migrations_dir = temp_dir / "migrations"
+        migrations_dir.mkdir()
+        (migrations_dir / "a.sql").write_text("-- migrate:up\nSELECT 'å';\n-- migrate:down\nDROP;")
+        (migrations_dir / "b.sql").write_text("SELECT 1;\n-- migrate:down\nDROP;")
+        (migrations_dir / "c.sql").write_text("  SELECT 2;  \n")
+
+        generator = SQLGenerator(sql_path=temp_dir)
+
+        assert generator._load_template("a.sql") == "SELECT 'å';"
+        assert generator._load_template("b.sql") == "SELECT 1;"
+        assert generator._load_template("c.sql") == "SELECT 2;"
+        assert generator._load_template("saknas.sql") == ""
+
     def test_template_caching(self, temp_dir):
         """Testa att templates cachas."""
         # Skapa temp SQL-struktur
@@ -0,0 +1,157 @@
+"""Tester för zip-extrahering."""
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from g_etl.utils.archive import (
+    COPY_BUFFER_SIZE,
+    _acquire_buffer,
+    _buffer_pool,
+    _release_buffer,
+    _split_members,
+    extract_zip,
+)
+
+
+@pytest.fixture
+def sample_zip(tmp_path: Path) -> Path:
+    """Skapa ett zip-arkiv med filer i nästlade kataloger."""
+    zip_path = tmp_path / "data.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("root.txt", "rot")
+        zf.writestr("a/b/c/deep.shp", b"\x00" * 1000)
+        zf.writestr("a/b/c/deep.dbf", b"dbf")
+        zf.writestr("empty_dir/", "")
+    return zip_path
+
+
+class TestExtractZip:
+    """Tester för extract_zip."""
+
+    def test_extracts_all_files(self, sample_zip: Path, tmp_path: Path):
+        """Alla filer extraheras med korrekt innehåll."""
+        out = tmp_path / "out"
+        extract_zip(sample_zip, out)
+
+        assert (out / "root.txt").read_text() == "rot"
+        assert (out / "a" / "b" / "c" / "deep.shp").read_bytes() == b"\x00" * 1000
+        assert (out / "a" / "b" / "c" / "deep.dbf").read_bytes() == b"dbf"
+
+    def test_creates_empty_directories(self, sample_zip: Path, tmp_path: Path):
+        """Kataloger utan filer skapas också."""
+        out = tmp_path / "out"
+        extract_zip(sample_zip, out)
+
+        assert (out / "empty_dir").is_dir()
+
+    def test_returns_extracted_files(self, sample_zip: Path, tmp_path: Path):
+        """Returnerar sökvägar till extraherade filer (inte kataloger)."""
+        out = tmp_path / "out"
+        files = extract_zip(sample_zip, out)
+
+        assert sorted(f.name for f in files) == ["deep.dbf", "deep.shp", "root.txt"]
+
+    def test_path_traversal_is_sanitized(self, tmp_path: Path):
+        """Medlemmar med '..' hamnar inte utanför målkatalogen."""
+        zip_path = tmp_path / "evil.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("../../escape.txt", "x")
+            zf.writestr("/abs/file.txt", "y")
+
+        out = tmp_path / "out"
+        extract_zip(zip_path, out)
+
+        assert (out / "escape.txt").read_text() == "x"
+        assert (out / "abs" / "file.txt").read_text() == "y"
+        assert not (tmp_path.parent / "escape.txt").exists()
+
+    def test_member_filter(self, sample_zip: Path, tmp_path: Path):
+        """Med member_filter extraheras bara valda filer och deras kataloger."""
+        out = tmp_path / "out"
+        files = extract_zip(sample_zip, out, member_filter=lambda name: name.endswith(".shp"))
+
+        assert [f.name for f in files] == ["deep.shp"]
+        assert not (out / "root.txt").exists()
+        assert not (out / "empty_dir").exists()
+
+    def test_bad_zip_raises(self, tmp_path: Path):
+        """Ogiltig zip-fil ger BadZipFile."""
+        bad = tmp_path / "bad.zip"
+        bad.write_bytes(b"inte en zip")
+
+        with pytest.raises(zipfile.BadZipFile):
+            extract_zip(bad, tmp_path / "out")
+
+    def test_large_member_spans_several_buffers(self, tmp_path: Path):
+        """Filer större än kopieringsbufferten kopieras korrekt."""
+        payload = bytes(range(256)) * ((COPY_BUFFER_SIZE * 2 + 1234) // 256)
+        zip_path = tmp_path / "large.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("big.gpkg", payload)
+
+        out = tmp_path / "out"
+        extract_zip(zip_path, out)
+
+        assert (out / "big.gpkg").read_bytes() == payload
+
+
+class TestBufferPool:
+    """Tester för buffertpoolen."""
+
+    def test_buffers_are_reused(self):
+        """En återlämnad buffert hämtas igen istället för att allokeras."""
+        while not _buffer_pool.empty():
+            _buffer_pool.get_nowait()
+
+        buf = _acquire_buffer()
+        _release_buffer(buf)
+
+        assert _acquire_buffer() is buf
+
+    def test_buffer_size(self):
+        """Buffertar har COPY_BUFFER_SIZE bytes."""
+        buf = _acquire_buffer()
+        assert len(buf) == COPY_BUFFER_SIZE
+        _release_buffer(buf)
+
+
+class TestParallelExtract:
+    """Tester för parallell extrahering."""
+
+    def test_parallel_matches_serial(self, tmp_path: Path):
+        """Parallell extrahering ger samma filer som sekventiell."""
+        zip_path = tmp_path / "many.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(20):
+                zf.writestr(f"dir{i % 3}/file{i}.dbf", f"innehall {i}" * (i + 1))
+
+        serial = tmp_path / "serial"
+        parallel = tmp_path / "parallel"
+        extract_zip(zip_path, serial)
+        files = extract_zip(zip_path, parallel, max_workers=4)
+
+        assert len(files) == 20
+        for i in range(20):
+            rel = Path(f"dir{i % 3}") / f"file{i}.dbf"
+            assert (parallel / rel).read_bytes() == (serial / rel).read_bytes()
+
+    def test_split_members_balances_size(self, tmp_path: Path):
+        """Medlemmar fördelas så att alla workers får arbete."""
+        members = []
+        for size in [100, 90, 10, 10, 5]:
+            info = zipfile.ZipInfo(f"f{size}")
+            info.file_size = size
+            members.append((info, tmp_path / info.filename))
+
+        batches = _split_members(members, 2)
+
+        assert len(batches) == 2
+        assert sorted(len(b) for b in batches) == [2, 3]
+        assert sum(len(b) for b in batches) == 5
+
+    def test_more_workers_than_members(self, sample_zip: Path, tmp_path: Path):
+        """Fler workers än filer fungerar."""
+        files = extract_zip(sample_zip, tmp_path / "out", max_workers=32)
+        assert len(files) == 3
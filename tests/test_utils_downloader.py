@@ -1,12 +1,17 @@
 """Tester för centraliserad downloader."""
 
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
+import urllib3
 
 from g_etl.utils.downloader import (
     CHUNK_SIZE,
-    PROGRESS_REPORT_INTERVAL,
+    PROGRESS_REPORT_BYTES,
     download_file_streaming,
     is_url,
 )
@@ -48,17 +53,52 @@ class TestIsUrl:
         assert is_url("https://api.example.com/data?format=zip&v=2") is True
 
 
+def _mock_response(body=b"", headers=None, chunks=None, status=200):
+    """Skapa ett mockat requests-svar med body (rå-ström) och chunks (iter_content)."""
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers if headers is not None else {}
+    response.raw.read = io.BytesIO(body).read
+    response.iter_content.return_value = chunks if chunks is not None else [body]
+    if status >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(f"{status} Client Error")
+    return response
+
+
+@pytest.fixture
+def http_server():
+    """Lokal HTTP-server som serverar /data.bin (med content-length) och 404 annars."""
+    payload = bytes(range(256)) * 5000
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # Via proxy kommer hela URL:en i request-raden
+            if not self.path.endswith("/data.bin"):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", payload
+    server.shutdown()
+    server.server_close()
+
+
 class TestDownloadFileStreaming:
     """Tester för download_file_streaming-funktionen."""
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_downloads_file_to_temp(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_downloads_file_to_temp(self, mock_session):
         """Laddar ner fil till temporär sökväg."""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "100"}
-        mock_response.iter_content.return_value = [b"test data"]
-        mock_get.return_value = mock_response
+        mock_session.get.return_value = _mock_response(b"test data", {"content-length": "9"})
 
         result = download_file_streaming("https://example.com/test.zip", suffix=".zip")
 
@@ -69,27 +109,22 @@ class TestDownloadFileStreaming:
         # Cleanup
         result.unlink()
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_uses_correct_timeout(self, mock_get):
-        """Använder specificerad timeout."""
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "0"}
-        mock_response.iter_content.return_value = []
-        mock_get.return_value = mock_response
+    @patch("g_etl.utils.downloader._session")
+    def test_uses_correct_timeout(self, mock_session):
+        """Använder specificerad timeout och streamar svaret."""
+        mock_session.get.return_value = _mock_response()
 
         download_file_streaming("https://example.com/test.zip", timeout=600)
 
-        mock_get.assert_called_once()
-        call_kwargs = mock_get.call_args[1]
+        mock_session.get.assert_called_once()
+        call_kwargs = mock_session.get.call_args[1]
         assert call_kwargs["timeout"] == 600
+        assert call_kwargs["stream"] is True
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_calls_on_log(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_calls_on_log(self, mock_session):
         """Anropar on_log callback med nedladdningsmeddelande."""
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "0"}
-        mock_response.iter_content.return_value = []
-        mock_get.return_value = mock_response
+        mock_session.get.return_value = _mock_response()
 
         log_messages = []
         download_file_streaming(
@@ -100,13 +135,10 @@ class TestDownloadFileStreaming:
         assert len(log_messages) == 1
         assert "https://example.com/test.zip" in log_messages[0]
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_calls_on_progress_initially(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_calls_on_progress_initially(self, mock_session):
         """Anropar on_progress med 0.0 initialt."""
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "0"}
-        mock_response.iter_content.return_value = []
-        mock_get.return_value = mock_response
+        mock_session.get.return_value = _mock_response()
 
         progress_calls = []
         download_file_streaming(
@@ -117,44 +149,36 @@ class TestDownloadFileStreaming:
         assert len(progress_calls) >= 1
         assert progress_calls[0] == (0.0, "Ansluter...")
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_progress_with_known_size(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_progress_with_known_size(self, mock_session):
         """Rapporterar progress korrekt när filstorlek är känd."""
-        mock_response = MagicMock()
-        total_size = CHUNK_SIZE * PROGRESS_REPORT_INTERVAL * 2  # 2 progress updates
-        mock_response.headers = {"content-length": str(total_size)}
-
-        # Generera tillräckligt många chunks för att trigga progress
-        chunks = [b"x" * CHUNK_SIZE] * (PROGRESS_REPORT_INTERVAL * 2)
-        mock_response.iter_content.return_value = chunks
-        mock_get.return_value = mock_response
+        total_size = PROGRESS_REPORT_BYTES * 2  # 2 progress updates
+        chunks = [b"x" * CHUNK_SIZE] * (total_size // CHUNK_SIZE)
+        mock_session.get.return_value = _mock_response(
+            headers={"content-length": str(total_size)}, chunks=chunks
+        )
 
         progress_calls = []
-        download_file_streaming(
+        result = download_file_streaming(
             "https://example.com/test.zip",
             on_progress=lambda p, m: progress_calls.append((p, m)),
             progress_weight=0.5,
         )
 
-        # Ska ha initial + minst en progress-rapportering
-        assert len(progress_calls) >= 2
-
-        # Cleanup
-        # (filen skapas men vi behöver inte ta bort den i detta test)
+        # Initial + en rapport per passerad tröskel, sista = hela vikten
+        assert len(progress_calls) == 3
+        assert progress_calls[-1][0] == 0.5
+        assert result.stat().st_size == total_size
+        result.unlink()
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_progress_with_unknown_size(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_progress_with_unknown_size(self, mock_session):
         """Rapporterar progress även utan content-length."""
-        mock_response = MagicMock()
-        mock_response.headers = {}  # Ingen content-length
-
-        # Generera chunks
-        chunks = [b"x" * CHUNK_SIZE] * (PROGRESS_REPORT_INTERVAL + 1)
-        mock_response.iter_content.return_value = chunks
-        mock_get.return_value = mock_response
+        chunks = [b"x" * CHUNK_SIZE] * (PROGRESS_REPORT_BYTES // CHUNK_SIZE + 1)
+        mock_session.get.return_value = _mock_response(chunks=chunks)
 
         progress_calls = []
-        download_file_streaming(
+        result = download_file_streaming(
             "https://example.com/test.zip",
             on_progress=lambda p, m: progress_calls.append((p, m)),
         )
@@ -163,56 +187,132 @@ class TestDownloadFileStreaming:
         assert len(progress_calls) >= 2
         # Vid okänd storlek används progress_weight / 2
         assert any("MB" in msg for _, msg in progress_calls)
+        result.unlink()
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_raises_on_http_error(self, mock_get):
-        """Kastar exception vid HTTP-fel."""
-        import requests
+    @patch("g_etl.utils.downloader._session")
+    def test_progress_is_reported_per_byte_threshold(self, mock_session):
+        """Progress rapporteras per PROGRESS_REPORT_BYTES, inte per chunk."""
+        mock_session.get.return_value = _mock_response(
+            headers={"content-length": str(PROGRESS_REPORT_BYTES * 3)},
+            chunks=[b"x" * (PROGRESS_REPORT_BYTES // 4)] * 12,
+        )
 
-        mock_response = MagicMock()
-        mock_response.raise_for_status.side_effect = requests.HTTPError("404 Not Found")
-        mock_get.return_value = mock_response
+        progress_calls = []
+        result = download_file_streaming(
+            "https://example.com/test.zip",
+            on_progress=lambda p, m: progress_calls.append((p, m)),
+        )
 
-        with pytest.raises(requests.HTTPError):
+        # Initial + en rapport per passerad tröskel
+        assert len(progress_calls) == 1 + 3
+        result.unlink()
+
+    @patch("g_etl.utils.downloader._session")
+    def test_streams_with_correct_chunk_size(self, mock_session):
+        """Använder korrekt chunk-storlek för streaming."""
+        response = _mock_response()
+        mock_session.get.return_value = response
+
+        download_file_streaming("https://example.com/test.zip", on_progress=lambda p, m: None)
+
+        response.iter_content.assert_called_once_with(CHUNK_SIZE)
+
+    @patch("g_etl.utils.downloader._session")
+    def test_without_progress_copies_stream(self, mock_session):
+        """Utan on_progress kopieras svaret direkt (ingen chunk-loop)."""
+        response = _mock_response(b"x" * (CHUNK_SIZE + 10))
+        mock_session.get.return_value = response
+
+        result = download_file_streaming("https://example.com/test.zip")
+
+        assert result.stat().st_size == CHUNK_SIZE + 10
+        response.iter_content.assert_not_called()
+        response.close.assert_called_once()
+        result.unlink()
+
+    @patch("g_etl.utils.downloader._session")
+    def test_preallocation_is_trimmed(self, mock_session):
+        """Förallokerad plats klipps bort om svaret är kortare än content-length."""
+        mock_session.get.return_value = _mock_response(b"kort", {"content-length": "4096"})
+
+        result = download_file_streaming("https://example.com/test.zip")
+
+        assert result.read_bytes() == b"kort"
+        result.unlink()
+
+    @patch("g_etl.utils.downloader._session")
+    def test_raises_on_http_error(self, mock_session):
+        """Kastar requests.HTTPError vid HTTP-fel."""
+        mock_session.get.return_value = _mock_response(status=404)
+
+        with pytest.raises(requests.HTTPError, match="404"):
             download_file_streaming("https://example.com/notfound.zip")
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_default_suffix(self, mock_get):
+    @patch("g_etl.utils.downloader._session")
+    def test_raises_on_connection_error(self, mock_session):
+        """Nätverksfel från urllib3 under läsningen blir requests.ConnectionError."""
+        response = _mock_response()
+        response.raw.read = MagicMock(side_effect=urllib3.exceptions.ProtocolError("avbruten"))
+        mock_session.get.return_value = response
+
+        with pytest.raises(requests.ConnectionError):
+            download_file_streaming("https://example.com/test.zip")
+
+    @patch("g_etl.utils.downloader._session")
+    def test_default_suffix(self, mock_session):
         """Använder .bin som default suffix."""
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "0"}
-        mock_response.iter_content.return_value = []
-        mock_get.return_value = mock_response
+        mock_session.get.return_value = _mock_response()
 
         result = download_file_streaming("https://example.com/test")
 
         assert result.suffix == ".bin"
 
-    @patch("g_etl.utils.downloader.requests.get")
-    def test_streams_with_correct_chunk_size(self, mock_get):
-        """Använder korrekt chunk-storlek för streaming."""
-        mock_response = MagicMock()
-        mock_response.headers = {"content-length": "0"}
-        mock_response.iter_content.return_value = []
-        mock_get.return_value = mock_response
+    def test_real_http_download(self, http_server):
+        """Hela kedjan mot en lokal HTTP-server, med och utan progress."""
+        base_url, payload = http_server
+
+        plain = download_file_streaming(f"{base_url}/data.bin")
+        with_progress = download_file_streaming(
+            f"{base_url}/data.bin", on_progress=lambda p, m: None
+        )
+
+        assert plain.read_bytes() == payload
+        assert with_progress.read_bytes() == payload
+        plain.unlink()
+        with_progress.unlink()
 
-        download_file_streaming("https://example.com/test.zip")
+    def test_respects_proxy_environment(self, http_server, monkeypatch):
+        """HTTP_PROXY från miljön används, som med requests.get."""
+        base_url, payload = http_server
+        for var in ("NO_PROXY", "no_proxy", "HTTP_PROXY", "http_proxy"):
+            monkeypatch.delenv(var, raising=False)
+        monkeypatch.setenv("HTTP_PROXY", base_url)
 
-        mock_response.iter_content.assert_called_once_with(chunk_size=CHUNK_SIZE)
+        # Värden finns inte - bara proxyn (testservern) kan svara
+        result = download_file_streaming("http://g-etl.invalid/data.bin")
+
+        assert result.read_bytes() == payload
+        result.unlink()
+
+    def test_real_http_404(self, http_server):
+        """HTTP 404 från servern ger requests.HTTPError."""
+        base_url, _ = http_server
+
+        with pytest.raises(requests.HTTPError):
+            download_file_streaming(f"{base_url}/saknas.bin")
 
 
 class TestDownloaderConstants:
     """Tester för modulkonstanter."""
 
     def test_chunk_size_is_reasonable(self):
-        """CHUNK_SIZE är rimlig (mellan 1KB och 1MB)."""
-        assert 1024 <= CHUNK_SIZE <= 1024 * 1024
+        """CHUNK_SIZE är rimlig (mellan 64KB och 1MB)."""
+        assert 64 * 1024 <= CHUNK_SIZE <= 1024 * 1024
 
     def test_progress_interval_is_reasonable(self):
-        """PROGRESS_REPORT_INTERVAL ger uppdateringar varje ~100KB-1MB."""
-        bytes_per_report = CHUNK_SIZE * PROGRESS_REPORT_INTERVAL
-        # Ska vara mellan 100KB och 10MB
-        assert 100 * 1024 <= bytes_per_report <= 10 * 1024 * 1024
+        """PROGRESS_REPORT_BYTES ger uppdateringar varje 1-10MB."""
+        assert CHUNK_SIZE <= PROGRESS_REPORT_BYTES
+        assert 1024 * 1024 <= PROGRESS_REPORT_BYTES <= 10 * 1024 * 1024
 
 
 class TestDownloaderImports:
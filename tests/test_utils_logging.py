@@ -1,6 +1,7 @@
 """Tester för centraliserad FileLogger."""
 
 import re
+import time
 from pathlib import Path
 
 from g_etl.utils.logging import DEFAULT_MAX_LOG_FILES, FileLogger
@@ -45,6 +46,64 @@ class TestFileLogger:
         assert re.search(r"\[\d{2}:\d{2}:\d{2}\] Test meddelande 1", content)
         assert re.search(r"\[\d{2}:\d{2}:\d{2}\] Test meddelande 2", content)
 
+    def test_log_is_buffered_until_flush_interval(self, tmp_path: Path):
+        """Rader buffras inom flush_interval och skrivs vid flush()."""
+        logger = FileLogger(logs_dir=tmp_path, prefix="test", flush_interval=3600)
+        log_file = logger.start()
+        logger.log("Buffrad rad")
+
+        assert "Buffrad rad" not in log_file.read_text()
+
+        logger.flush()
+        assert "Buffrad rad" in log_file.read_text()
+        logger.close()
+
+    def test_flush_interval_zero_flushes_every_line(self, tmp_path: Path):
+        """Med flush_interval=0 hamnar varje rad direkt i filen."""
+        logger = FileLogger(logs_dir=tmp_path, prefix="test", flush_interval=0)
+        log_file = logger.start()
+        logger.log("Direkt rad")
+
+        assert "Direkt rad" in log_file.read_text()
+        logger.close()
+
+    def test_error_lines_are_flushed_immediately(self, tmp_path: Path):
+        """Rader med felmarkör flushas direkt, tillsammans med buffrade rader."""
+        logger = FileLogger(logs_dir=tmp_path, prefix="test", flush_interval=3600)
+        log_file = logger.start()
+        logger.log("Buffrad rad")
+        logger.log("  ✗ ds1: FEL - något gick snett")
+
+        content = log_file.read_text()
+        assert "Buffrad rad" in content
+        assert "✗ ds1: FEL" in content
+        logger.close()
+
+    def test_timestamp_is_formatted_once_per_second(self, tmp_path: Path, monkeypatch):
+        """Tidsstämpeln formateras bara om när sekunden ändras."""
+        now = [1_700_000_000.2]
+        monkeypatch.setattr("g_etl.utils.logging.time.time", lambda: now[0])
+        calls = []
+        real_strftime = time.strftime
+        monkeypatch.setattr(
+            "g_etl.utils.logging.time.strftime",
+            lambda fmt, t: calls.append(t) or real_strftime(fmt, t),
+        )
+
+        logger = FileLogger(logs_dir=tmp_path, prefix="test")
+        logger.start()
+        calls.clear()
+        logger.log("a")
+        now[0] += 0.5
+        logger.log("b")
+        now[0] += 1.0
+        logger.log("c")
+        logger.close()
+
+        assert len(calls) == 2
+        expected = real_strftime("%H:%M:%S", time.localtime(1_700_000_001))
+        assert f"[{expected}] c" in logger.log_file.read_text()
+
     def test_close_writes_footer(self, tmp_path: Path):
         """Close skriver footer med avslutnings-timestamp."""
         logger = FileLogger(logs_dir=tmp_path, prefix="test")
@@ -91,6 +150,20 @@ class TestFileLogger:
         log_files = list(tmp_path.glob("test_*.log"))
         assert len(log_files) == 3
 
+    def test_cleanup_uses_filename_order(self, tmp_path: Path):
+        """Äldst enligt tidsstämpeln i filnamnet tas bort, oavsett mtime."""
+        old = tmp_path / "test_2024-01-01_120000.log"
+        newer = tmp_path / "test_2024-06-01_120000.log"
+        newer.write_text("nyare")
+        old.write_text("äldre")  # Skrivs sist → senast mtime
+
+        logger = FileLogger(logs_dir=tmp_path, prefix="test", max_log_files=2)
+        logger.start()
+        logger.close()
+
+        assert newer.exists()
+        assert not old.exists()
+
     def test_no_cleanup_when_disabled(self, tmp_path: Path):
         """Ingen cleanup när max_log_files=None."""
         # Skapa 5 "gamla" loggfiler
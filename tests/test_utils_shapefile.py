@@ -0,0 +1,97 @@
+"""Tester för den inbyggda Shapefile-läsaren."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+import shapely
+from pyogrio.raw import write
+
+from g_etl.utils.shapefile import GEOMETRY_COLUMN, read_shapefile
+
+
+def _write_shapefile(path: Path, geoms: list, fields: dict, geometry_type: str) -> Path:
+    """Skriv en Shapefile med GDAL (via pyogrio) som referens."""
+    write(
+        str(path),
+        np.array(shapely.to_wkb(geoms), dtype=object),
+        list(fields.values()),
+        list(fields.keys()),
+        geometry_type=geometry_type,
+        driver="ESRI Shapefile",
+        encoding="LATIN1",
+        crs="EPSG:3006",
+    )
+    return path
+
+
+class TestReadShapefile:
+    """Tester för read_shapefile."""
+
+    @pytest.fixture
+    def polygons(self):
+        return [
+            shapely.Polygon(
+                [(0, 0), (0, 10), (10, 10), (10, 0)], [[(2, 2), (4, 2), (4, 4), (2, 4)]]
+            ),
+            shapely.MultiPolygon([shapely.box(20, 20, 21, 21), shapely.box(30, 30, 31, 31)]),
+        ]
+
+    def test_polygons_and_attributes(self, tmp_path: Path, polygons):
+        """Polygoner med hål, multipolygoner och attribut läses korrekt."""
+        shp = _write_shapefile(
+            tmp_path / "ytor.shp",
+            polygons,
+            {
+                "namn": np.array(["Åsele", "Göteborg"], dtype=object),
+                "antal": np.array([1, 2]),
+                "andel": np.array([1.5, np.nan]),
+            },
+            "MultiPolygon",
+        )
+
+        table = read_shapefile(shp, encoding="LATIN1")
+
+        assert table.column("namn").to_pylist() == ["Åsele", "Göteborg"]
+        assert table.column("antal").to_pylist() == [1, 2]
+        assert table.column("andel").to_pylist() == [1.5, None]
+        for expected, wkb in zip(polygons, table.column(GEOMETRY_COLUMN).to_pylist(), strict=True):
+            assert shapely.from_wkb(wkb).equals(expected)
+
+    def test_column_pruning(self, tmp_path: Path, polygons):
+        """Med columns läses bara valda attribut (plus geometri)."""
+        shp = _write_shapefile(
+            tmp_path / "ytor.shp",
+            polygons,
+            {"namn": np.array(["a", "b"], dtype=object), "antal": np.array([1, 2])},
+            "MultiPolygon",
+        )
+
+        table = read_shapefile(shp, columns=["antal"])
+
+        assert table.column_names == ["antal", GEOMETRY_COLUMN]
+
+    def test_lines(self, tmp_path: Path):
+        """Linjer och multilinjer läses korrekt."""
+        lines = [
+            shapely.LineString([(0, 0), (1, 1)]),
+            shapely.MultiLineString([[(0, 0), (1, 1)], [(2, 2), (3, 3)]]),
+        ]
+        shp = _write_shapefile(
+            tmp_path / "vagar.shp", lines, {"id": np.array([1, 2])}, "MultiLineString"
+        )
+
+        wkbs = read_shapefile(shp).column(GEOMETRY_COLUMN).to_pylist()
+
+        assert shapely.from_wkb(wkbs[0]).equals(lines[0])
+        assert shapely.from_wkb(wkbs[1]).equals(lines[1])
+
+    def test_points_without_shx(self, tmp_path: Path):
+        """Utan .shx stegas .shp igenom post för post."""
+        points = [shapely.Point(1, 2), shapely.Point(3, 4)]
+        shp = _write_shapefile(tmp_path / "punkter.shp", points, {"id": np.array([1, 2])}, "Point")
+        shp.with_suffix(".shx").unlink()
+
+        wkbs = read_shapefile(shp).column(GEOMETRY_COLUMN).to_pylist()
+
+        assert [shapely.from_wkb(w).wkt for w in wkbs] == ["POINT (1 2)", "POINT (3 4)"]